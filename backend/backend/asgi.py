@@ -3,6 +3,14 @@ ASGI config for backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The busiest endpoints have async variants under /async/ (product list and detail, star_eight, cart read and add,
+login; see the async_views module of each app). Served by an ASGI server, e.g.
+``gunicorn backend.asgi:application -k uvicorn.workers.UvicornWorker``, they wait on the database, Redis and slow
+clients without holding a thread, so a few workers serve many concurrent requests. Every other endpoint is a
+synchronous DRF view, which Django runs in a thread under ASGI, as it would under WSGI.
+
+The benchmark_endpoints command compares both paths: with ``--asgi`` its requests go through Django's ASGI handler.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 """
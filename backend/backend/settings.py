@@ -45,7 +45,10 @@ INSTALLED_APPS = [
 # Middleware configuration
 # Middlewares are used to process requests and responses.
 MIDDLEWARE = [
-    'django_user_agents.middleware.UserAgentMiddleware',
+    # First, so that the recorded latency includes every other middleware (see custom_admin/middleware.py)
+    'custom_admin.middleware.RequestMetricsMiddleware',
+    # django_user_agents' middleware, async capable (see custom_admin/middleware.py)
+    'custom_admin.middleware.UserAgentMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -96,7 +99,9 @@ DATABASES = {
 # Used for caching purposes.
 CACHES = {
     "default": {
-        "BACKEND": "django_redis.cache.RedisCache",
+        # django_redis RedisCache counting hits and misses for the metrics endpoint, with an in-process tier
+        # for the LOCAL_CACHE_NAMESPACES keys
+        "BACKEND": "custom_admin.cache_backends.TwoTierRedisCache",
         "LOCATION": "redis://127.0.0.1:6379/1",
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
@@ -104,6 +109,35 @@ CACHES = {
     }
 }
 
+# In-process cache tier (see custom_admin/cache_backends.py). Keys of these namespaces (the leading word of the key)
+# are also kept in every process for up to the given number of seconds, and dropped everywhere as soon as they
+# are written through the LOCAL_CACHE_CHANNEL pub/sub channel. The lifetime bounds staleness should a message be
+# lost. Only list namespaces that are read far more often than written.
+LOCAL_CACHE_NAMESPACES = {
+    'catalog': 60,  # Catalog version, catalog responses and the homepage payload
+    'user': 60,  # user_<id>_details
+}
+LOCAL_CACHE_MAX_ENTRIES = 1000
+LOCAL_CACHE_CHANNEL = 'cache:invalidations'
+
+# Catalog response caching (see products/cache.py)
+# Cached catalog responses live this many seconds, and a rebuild lock is held at most this many seconds.
+CATALOG_CACHE_TIMEOUT = 60 * 60
+CATALOG_CACHE_LOCK_TIMEOUT = 5
+# The precomputed homepage payload (see products/homepage.py) is rebuilt on every catalog change. The timeout only
+# bounds how long it can stay stale if a rebuild is lost.
+HOMEPAGE_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Upper bounds of the price ranges counted by the product list facets (see products/facets.py).
+# (5, 10) gives the ranges [0, 5), [5, 10) and [10, and above).
+PRODUCT_PRICE_FACET_BOUNDS = (5, 10, 20, 50, 100)
+
+# Lifetime in seconds of a cached, serialized user cart (see cart/cache.py)
+CART_CACHE_TIMEOUT = 60 * 60 * 24
+
+# How a guest cart merges into the user's cart at login when the client does not say: 'sum', 'max' or 'overwrite'
+CART_MERGE_STRATEGY = 'sum'
+
 # REST framework configuration
 # Setting up default permission classes and authentication classes.
 REST_FRAMEWORK = {
@@ -112,7 +146,9 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'user.authenticate.AllowAll',
-        'user.authenticate.CustomAuthentication',
+        # CustomAuthentication refusing revoked tokens (see user/revocation.py), with the user built from the
+        # cached user details rather than loaded (see user/claims.py)
+        'user.claims.ClaimsAuthentication',
     ),
 }
 
@@ -231,9 +267,6 @@ AWS_STORAGE_BUCKET_NAME = config('AWS_STORAGE_BUCKET_NAME')
 AWS_S3_REGION_NAME = config('AWS_S3_REGION_NAME')
 
 AWS_S3_CUSTOM_DOMAIN = '%s.s3.amazonaws.com' % AWS_STORAGE_BUCKET_NAME
-AWS_S3_OBJECT_PARAMETERS = {
-    'CacheControl': 'max-age=86400',
-}
 AWS_LOCATION = 'media'
 
 # Activity and Error log settings for AWS CloudWatch
@@ -242,10 +275,54 @@ INTENDED_ACTIVITY_LOG_STREAMS = config('INTENDED_ACTIVITY_LOG_STREAMS').split(',
 ERROR_LOG_GROUP_NAME = config('ERROR_LOG_GROUP_NAME')
 INTENDED_ERROR_LOG_STREAMS = config('INTENDED_ERROR_LOG_STREAMS').split(',')
 
+# Log events are shipped to CloudWatch in the background (see custom_admin/AWS/cloudwatch_shipper.py).
+# Pending events are sent every CLOUDWATCH_FLUSH_INTERVAL seconds, and at most CLOUDWATCH_MAX_QUEUE_SIZE
+# events wait in memory before new ones are dropped.
+CLOUDWATCH_FLUSH_INTERVAL = 5
+CLOUDWATCH_MAX_QUEUE_SIZE = 10000
+
+# Destination of the activity and error log events (see custom_admin/log_sinks.py):
+# 'cloudwatch', 'file' (rotating JSON Lines file), 'stdout' or 'memory'. Set ACTIVITY_LOG_SINK / ERROR_LOG_SINK
+# to 'file' or 'stdout' in development so that logging needs no network access. The file sink writes to
+# logs/<name>-<pid>.jsonl unless OPTIONS gives a 'path'.
+LOG_SINKS = {
+    'activity': {
+        'BACKEND': config('ACTIVITY_LOG_SINK', default='cloudwatch'),
+        'OPTIONS': {},
+    },
+    'error': {
+        'BACKEND': config('ERROR_LOG_SINK', default='cloudwatch'),
+        'OPTIONS': {},
+    },
+}
+
+# Denied admin accesses of a user on a view within this many seconds of the first one are logged as a single event
+# with their count (see custom_admin/permissions.py).
+ADMIN_DENIAL_LOG_WINDOW = 60
+
+# Bearer token the Prometheus scraper sends to /metrics. The endpoint is disabled (404) while unset.
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
 # Default file storage using AWS S3
 DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
 MEDIA_URL = 'https://%s/%s/' % (AWS_S3_CUSTOM_DOMAIN, AWS_LOCATION)
 
+# Product images (see products/images.py). Uploads are stored in PRODUCT_IMAGE_STORAGE, S3 by default, with a
+# Cache-Control header marking them immutable (see products/storage.py). Set it to
+# 'django.core.files.storage.FileSystemStorage' to keep them under MEDIA_ROOT in development.
+# Every upload is resized to each of PRODUCT_IMAGE_RENDITIONS (name: bounding box in pixels) in the background,
+# in PRODUCT_IMAGE_FORMAT ('WEBP' or 'JPEG'), by a pool of PRODUCT_IMAGE_PROCESSES processes (0 uses threads).
+PRODUCT_IMAGE_STORAGE = config('PRODUCT_IMAGE_STORAGE', default='products.storage.ProductImageStorage')
+PRODUCT_IMAGE_RENDITIONS = {
+    'thumbnail': (160, 160),
+    'grid': (480, 480),
+    'detail': (1200, 1200),
+}
+PRODUCT_IMAGE_FORMAT = config('PRODUCT_IMAGE_FORMAT', default='WEBP')
+PRODUCT_IMAGE_QUALITY = 82
+PRODUCT_IMAGE_PROCESSES = config('PRODUCT_IMAGE_PROCESSES', default=3, cast=int)
+PRODUCT_IMAGE_MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+
 # Google OAuth API configuration
 GOOGLE_CLIENT_ID = config('GOOGLE_CLIENT_ID')
 GOOGLE_CLIENT_SECRET = config('GOOGLE_CLIENT_SECRET')
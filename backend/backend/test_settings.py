@@ -0,0 +1,51 @@
+# Settings for running the test suite offline:
+#     python manage.py test --settings=backend.test_settings
+#
+# SQLite instead of MySQL, a local memory cache instead of Redis, log events kept in memory instead of being
+# shipped to CloudWatch, files stored on disk instead of S3, and placeholder values for every credential the
+# main settings read from the environment. Nothing here needs a network connection.
+import os
+import tempfile
+
+for name in (
+    'SECRET_KEY', 'DATABASE_NAME', 'DATABASE_USER', 'DATABASE_PASSWORD', 'DATABASE_HOST', 'DATABASE_PORT',
+    'AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY', 'AWS_STORAGE_BUCKET_NAME', 'AWS_S3_REGION_NAME',
+    'ACTIVITY_LOG_GROUP_NAME', 'ERROR_LOG_GROUP_NAME', 'GOOGLE_CLIENT_ID', 'GOOGLE_CLIENT_SECRET',
+):
+    os.environ.setdefault(name, 'test')
+os.environ.setdefault('INTENDED_ACTIVITY_LOG_STREAMS', 'Admin Actions,User Creation,Order Transactions')
+os.environ.setdefault('INTENDED_ERROR_LOG_STREAMS', 'Authentication Issues,Critical Errors')
+
+from .settings import *  # noqa: E402,F401,F403
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+LOG_SINKS = {
+    'activity': {'BACKEND': 'memory', 'OPTIONS': {}},
+    'error': {'BACKEND': 'memory', 'OPTIONS': {}},
+}
+
+DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
+MEDIA_ROOT = os.path.join(tempfile.gettempdir(), 'bdafricanmarket-test-media')
+PRODUCT_IMAGE_STORAGE = DEFAULT_FILE_STORAGE
+# Renditions are rendered in threads: spawning a process pool would dominate the run time of the image tests
+PRODUCT_IMAGE_PROCESSES = 0
+
+# Tests talk plain HTTP to the test client
+SECURE_SSL_REDIRECT = False
+
+# Much faster than the default hasher, and the strength of test passwords does not matter
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+CELERY_TASK_ALWAYS_EAGER = True
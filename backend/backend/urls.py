@@ -4,6 +4,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from custom_admin.views import metrics_view
 
 urlpatterns = [
     # Admin URL for Django's default admin interface. changed it because i wanted to use the "admin" url
@@ -20,6 +21,14 @@ urlpatterns = [
 
     # URL patterns for shopping cart functionalities
     path('cart/', include('cart.urls')),
+
+    # Async variants of the busiest endpoints, for the ASGI deployment (see backend/asgi.py)
+    path('async/user/', include('user.async_urls')),
+    path('async/products/', include('products.async_urls')),
+    path('async/cart/', include('cart.async_urls')),
+
+    # Prometheus metrics of the serving process (see custom_admin/metrics.py)
+    path('metrics', metrics_view, name='metrics'),
 ]
 
 # Static media URL patterns
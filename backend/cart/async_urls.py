@@ -0,0 +1,8 @@
+from django.urls import path
+from . import async_views
+
+# Async variants of the cart read and add endpoints, same paths as the router's under /async/cart/
+urlpatterns = [
+    path('cart_operations/', async_views.cart, name='async-cart-list'),
+    path('cart_operations/add-item-to-cart/', async_views.add_item_to_cart, name='async-cart-add-item-to-cart'),
+]
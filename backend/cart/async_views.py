@@ -0,0 +1,72 @@
+"""
+Async variants of the cart read and add endpoints, for the ASGI deployment (see backend/asgi.py).
+
+They answer exactly like CartAPIView.list and CartAPIView.add_item_to_cart and go through the same cart cache
+(see cart/cache.py), with the async ORM and cache. Mounted under /async/cart/ (see cart/async_urls.py).
+"""
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.utils import IntegrityError
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from custom_admin.utils import async_api_view, json_response
+from products.models import Product
+from user.claims import aauthenticate
+from .cache import afinish_cart_update, aget_cart, start_cart_update
+from .serializers import CartItemSerializer
+from .services import increment_cart_item
+
+
+@async_api_view(['GET', 'HEAD'], authenticate=aauthenticate)
+async def cart(request):
+    """
+    Async variant of CartAPIView.list: the user's serialized cart, without any SQL query when it is cached.
+    """
+    return json_response(await aget_cart(request.user.id))
+
+
+@async_api_view(['POST'], authenticate=aauthenticate)
+async def add_item_to_cart(request):
+    """
+    Async variant of CartAPIView.add_item_to_cart. Takes the same JSON or form data.
+    """
+    item_data = Request(request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES]).data
+    quantity = item_data.get('quantity', 1)
+
+    if 'product_identifier' not in item_data:
+        return json_response({'error': 'Product identifier missing'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        quantity = int(quantity)
+    except (TypeError, ValueError):
+        return json_response({'error': 'Invalid quantity'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        product_fields = Product.objects.only('product_identifier', 'name', 'price', 'image_url')
+        product = await product_fields.aget(product_identifier=item_data['product_identifier'])
+    except Exception:
+        return json_response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        # The upsert uses raw SQL and possibly a transaction, which the async ORM does not offer
+        cart_item, sequence = await sync_to_async(_increment_cart_item)(request.user.id, product.product_identifier, quantity)
+        cart_item.product = product
+    except IntegrityError:
+        return json_response({'error': 'Database integrity error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    except Exception:
+        return json_response({'error': 'Unknown error occurred while adding to cart'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    data = CartItemSerializer(cart_item).data
+    # Committed by now, so the cached cart is updated right away
+    await afinish_cart_update(request.user.id, sequence, items=[data])
+    return json_response(data, status=status.HTTP_200_OK)
+
+
+def _increment_cart_item(user_id, product_identifier, quantity):
+    # The upsert, numbered for the cart cache before it commits (see cart.cache.update_cart)
+    with transaction.atomic():
+        cart_item = increment_cart_item(user_id, product_identifier, quantity)
+        sequence = start_cart_update(user_id)
+    return cart_item, sequence
@@ -0,0 +1,327 @@
+"""
+Per-user cache of the fully serialized cart.
+
+The cache holds exactly what the cart endpoint returns (CartItemSerializer output, product name, price and
+image included), newest item first, so a warm read needs no SQL query at all.
+
+Each entry records two versions it was built under, and is only served while both are current:
+
+- the catalog version (see products/cache.py): when an admin edits a product, the version moves and cached carts
+  are rebuilt on their next read so they never show an outdated name, price or image;
+- the user's cart version, which every cart mutation moves once its write is committed.
+
+Mutations write through: once committed, update_cart() moves the cart version and stores the cached cart with the
+changed lines replaced by what the mutation wrote, so the read that usually follows needs no query either. Two
+things keep concurrent mutations and reads from leaving an outdated entry behind:
+
+- the write-through only applies to the entry of the version right before the one it moved to. Otherwise some other
+  mutation or read got in between and the entry is left outdated, to be reloaded on the next read;
+- every mutation takes a write sequence number while it still holds the row locks of the lines it changed, so two
+  mutations of the same line are numbered in the order they committed. Each entry records the sequence number of
+  the last write of every line, and an older write never replaces a newer one, even when its write-through runs
+  last. A loaded entry records the sequence number current when it was loaded: a write numbered before it may or
+  may not be in the entry, so it is left outdated as well.
+
+A cart is loaded by reading its version before querying the database, so an entry built while a mutation commits
+is stored under the version that mutation moves away from, and is never served.
+
+Writes that change lines the caller does not have at hand (clearing the cart, batch updates, merges) use
+invalidate_cart() instead, and the next read reloads the cart.
+
+get_cart(), load_cart(), update_cart() and invalidate_cart() have async counterparts (aget_cart()...) for the async
+cart views of the ASGI deployment (see cart/async_views.py).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from products.cache import CATALOG_VERSION_KEY, aget_catalog_version, get_catalog_version
+from .models import CartItem
+from .serializers import CartItemSerializer
+
+
+def build_cart_cache_key(user_id: int) -> str:
+    """
+    Constructs the cart cache key for a given user ID.
+
+    Args:
+    - user_id (int): The ID of the user.
+
+    Returns:
+    - str: A cache key string.
+    """
+    return f'cart_{user_id}_items'
+
+
+def build_cart_version_key(user_id: int) -> str:
+    """
+    Constructs the key of a user's cart version.
+
+    Args:
+    - user_id (int): The ID of the user.
+
+    Returns:
+    - str: A cache key string.
+    """
+    return f'cart_{user_id}_version'
+
+
+def build_cart_writes_key(user_id: int) -> str:
+    """
+    Constructs the key of a user's cart write sequence.
+
+    Args:
+    - user_id (int): The ID of the user.
+
+    Returns:
+    - str: A cache key string.
+    """
+    return f'cart_{user_id}_writes'
+
+
+def load_cart(user_id: int) -> list:
+    """
+    Reads and serializes a user's cart from the database, then caches it.
+
+    Args:
+    - user_id (int): The ID of the user.
+
+    Returns:
+    - list of dict: The serialized cart items, newest first.
+    """
+    # Both versions are read before the query (see module docstring)
+    catalog_version = get_catalog_version()
+    cart_version = _get_cart_version(user_id)
+    loaded_after = cache.get(build_cart_writes_key(user_id), 0)
+    queryset = CartItem.objects.filter(user_id=user_id).select_related('product').order_by('-date_added')
+    items = [dict(item) for item in CartItemSerializer(queryset, many=True).data]
+    entry = _entry(items, catalog_version, cart_version, loaded_after)
+    cache.set(build_cart_cache_key(user_id), entry, timeout=settings.CART_CACHE_TIMEOUT)
+    return items
+
+
+def get_cart(user_id: int) -> list:
+    """
+    Returns a user's serialized cart, from the cache when possible.
+
+    Args:
+    - user_id (int): The ID of the user.
+
+    Returns:
+    - list of dict: The serialized cart items, newest first.
+    """
+    keys = _keys(user_id)
+    items = _read_entry(keys, cache.get_many(keys))
+    if items is None:
+        return load_cart(user_id)
+    return items
+
+
+def update_cart(user_id: int, items=(), removed=()):
+    """
+    Writes changed cart lines through to the cached cart, once the current transaction commits.
+
+    Must be called inside the transaction that changed the lines, after its writes, so that the write is numbered
+    while their rows are still locked (see module docstring).
+
+    Args:
+    - user_id (int): The ID of the user.
+    - items (list of dict): The changed lines as they now are, serialized with CartItemSerializer.
+    - removed (list of int): The product identifiers of the removed lines.
+    """
+    sequence = start_cart_update(user_id)
+    items = [dict(item) for item in items]
+    transaction.on_commit(lambda: finish_cart_update(user_id, sequence, items, removed))
+
+
+def start_cart_update(user_id: int) -> int:
+    """
+    Numbers a cart write. First half of update_cart(), for callers that finish it outside the transaction.
+
+    Args:
+    - user_id (int): The ID of the user.
+
+    Returns:
+    - int: The sequence number of the write, for finish_cart_update().
+    """
+    key = build_cart_writes_key(user_id)
+    try:
+        return cache.incr(key)
+    except ValueError:  # First write, or the sequence was evicted
+        # Restart from the current time so that new writes are numbered after any write an entry remembers
+        cache.add(key, int(time.time() * 1000), timeout=settings.CART_CACHE_TIMEOUT)
+        return cache.incr(key)
+
+
+def finish_cart_update(user_id: int, sequence: int, items=(), removed=()):
+    """
+    Moves the cart version and writes changed lines through to the cached cart. Second half of update_cart(),
+    to be called once the write is committed.
+
+    Args:
+    - user_id (int): The ID of the user.
+    - sequence (int): The sequence number from start_cart_update().
+    - items (list of dict): The changed lines as they now are, serialized with CartItemSerializer.
+    - removed (list of int): The product identifiers of the removed lines.
+    """
+    cart_version = _bump_cart_version(user_id)
+    if cart_version is None:  # No version, so no cached cart to update either
+        return
+    cart_key = build_cart_cache_key(user_id)
+    cached = cache.get_many([cart_key, CATALOG_VERSION_KEY])
+    entry = _apply_write(cached, cart_key, cart_version, sequence, items, removed)
+    if entry is not None:
+        cache.set(cart_key, entry, timeout=settings.CART_CACHE_TIMEOUT)
+
+
+def invalidate_cart(user_id: int):
+    """
+    Makes the cached cart of a user stale, once the current transaction commits. Called after every change to the
+    user's cart lines.
+
+    Args:
+    - user_id (int): The ID of the user.
+    """
+    transaction.on_commit(lambda: _bump_cart_version(user_id))
+
+
+async def aload_cart(user_id: int) -> list:
+    """
+    Async version of load_cart().
+    """
+    catalog_version = await aget_catalog_version()
+    cart_version = await _aget_cart_version(user_id)
+    loaded_after = await cache.aget(build_cart_writes_key(user_id), 0)
+    queryset = CartItem.objects.filter(user_id=user_id).select_related('product').order_by('-date_added')
+    items = [dict(item) for item in CartItemSerializer([item async for item in queryset], many=True).data]
+    entry = _entry(items, catalog_version, cart_version, loaded_after)
+    await cache.aset(build_cart_cache_key(user_id), entry, timeout=settings.CART_CACHE_TIMEOUT)
+    return items
+
+
+async def afinish_cart_update(user_id: int, sequence: int, items=(), removed=()):
+    """
+    Async version of finish_cart_update().
+    """
+    try:
+        cart_version = await cache.aincr(build_cart_version_key(user_id))
+    except ValueError:
+        return
+    cart_key = build_cart_cache_key(user_id)
+    cached = await cache.aget_many([cart_key, CATALOG_VERSION_KEY])
+    entry = _apply_write(cached, cart_key, cart_version, sequence, items, removed)
+    if entry is not None:
+        await cache.aset(cart_key, entry, timeout=settings.CART_CACHE_TIMEOUT)
+
+
+async def aget_cart(user_id: int) -> list:
+    """
+    Async version of get_cart().
+    """
+    keys = _keys(user_id)
+    items = _read_entry(keys, await cache.aget_many(keys))
+    if items is None:
+        return await aload_cart(user_id)
+    return items
+
+
+async def ainvalidate_cart(user_id: int):
+    """
+    Async version of invalidate_cart(), for changes already committed.
+    """
+    try:
+        await cache.aincr(build_cart_version_key(user_id))
+    except ValueError:  # No version, so no cached cart to invalidate either
+        pass
+
+
+def _keys(user_id):
+    # One round trip for the cart and both versions it has to match
+    return [build_cart_cache_key(user_id), CATALOG_VERSION_KEY, build_cart_version_key(user_id)]
+
+
+def _read_entry(keys, cached):
+    # The items of a cached cart, None when it is missing or outdated
+    cart_key, catalog_version_key, cart_version_key = keys
+    entry = cached.get(cart_key)
+    if (
+        entry is None
+        or entry['catalog_version'] != cached.get(catalog_version_key)
+        or entry['cart_version'] != cached.get(cart_version_key)
+    ):
+        return None
+    return entry['items']
+
+
+def _entry(items, catalog_version, cart_version, loaded_after, writes=None):
+    # writes: sequence number of the last write of each line written through since the cart was loaded
+    return {
+        'catalog_version': catalog_version,
+        'cart_version': cart_version,
+        'loaded_after': loaded_after,
+        'writes': writes or {},
+        'items': items,
+    }
+
+
+def _apply_write(cached, cart_key, cart_version, sequence, items, removed):
+    # The entry of cart_version with the write applied, None when the cached entry cannot be brought up to date
+    entry = cached.get(cart_key)
+    if (
+        entry is None
+        or entry['cart_version'] != cart_version - 1
+        or entry['catalog_version'] != cached.get(CATALOG_VERSION_KEY)
+    ):
+        return None
+
+    lines = {item['product_identifier']: item for item in entry['items']}
+    writes = dict(entry['writes'])
+    new_items = []
+    changes = [(item['product_identifier'], item) for item in items] + [(product_id, None) for product_id in removed]
+    for product_id, item in changes:
+        last_write = writes.get(product_id)
+        if last_write is None and sequence <= entry['loaded_after']:
+            return None  # The loaded cart may or may not include this write
+        if last_write is not None and last_write > sequence:
+            continue  # A later write of this line is already in
+        writes[product_id] = sequence
+        if item is None:
+            lines.pop(product_id, None)
+        elif product_id in lines:
+            lines[product_id] = item
+        else:
+            new_items.append(item)
+
+    # New lines are the newest, existing lines keep their place
+    items = new_items + list(lines.values())
+    return _entry(items, entry['catalog_version'], cart_version, entry['loaded_after'], writes)
+
+
+def _get_cart_version(user_id):
+    key = build_cart_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        # Like the catalog version, start from the current time so that a lost version never comes back with a
+        # number some older entry was stored under
+        cache.add(key, int(time.time() * 1000), timeout=settings.CART_CACHE_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+async def _aget_cart_version(user_id):
+    key = build_cart_version_key(user_id)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, int(time.time() * 1000), timeout=settings.CART_CACHE_TIMEOUT)
+        version = await cache.aget(key)
+    return version
+
+
+def _bump_cart_version(user_id):
+    # The new version, None when there is none (no cached cart to invalidate either)
+    try:
+        return cache.incr(build_cart_version_key(user_id))
+    except ValueError:
+        return None
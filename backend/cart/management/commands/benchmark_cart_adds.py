@@ -0,0 +1,90 @@
+import statistics
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.test import APIClient
+
+from cart.models import CartItem
+from products.models import Product
+
+BENCHMARK_EMAIL = 'cart-benchmark@bdafricanmarket.invalid'
+
+
+class Command(BaseCommand):
+    """
+    Benchmarks the add-item-to-cart endpoint under concurrent adds of the same product.
+
+    Every thread plays a shopper double clicking "add": all of them add the same product to the same cart.
+    The command reports throughput and latency percentiles, then checks that no add was lost, which is what
+    the upsert in cart/services.py guarantees.
+
+    A throwaway user is created for the run and deleted afterwards with its cart.
+    Run it against a MySQL database, SQLite serializes writers and is not representative.
+
+    Usage: python manage.py benchmark_cart_adds --product 1 [--threads 8] [--adds 50]
+    """
+    help = 'Benchmarks concurrent add-item-to-cart requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, required=True, help='product_identifier of the product to add')
+        parser.add_argument('--threads', type=int, default=8, help='Number of concurrent clients')
+        parser.add_argument('--adds', type=int, default=50, help='Number of adds per client')
+
+    def handle(self, *args, **options):
+        if not Product.objects.filter(product_identifier=options['product']).exists():
+            raise CommandError(f"Product {options['product']} does not exist")
+
+        User = get_user_model()
+        user, _ = User.objects.get_or_create(email=BENCHMARK_EMAIL, defaults={'first_name': 'Cart', 'last_name': 'Benchmark'})
+        CartItem.objects.filter(user=user).delete()
+
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+
+        def shopper():
+            # Secure requests to an allowed host so that the production middleware stack is exercised as is
+            client = APIClient(HTTP_HOST='127.0.0.1')
+            client.force_authenticate(user)
+            for _ in range(options['adds']):
+                started = time.perf_counter()
+                response = client.post(
+                    '/cart/cart_operations/add-item-to-cart/',
+                    {'product_identifier': options['product'], 'quantity': 1},
+                    format='json',
+                    secure=True,
+                )
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    if response.status_code != 200:
+                        errors.append(response.status_code)
+            connection.close()
+
+        threads = [threading.Thread(target=shopper) for _ in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        total_time = time.perf_counter() - started
+
+        expected = options['threads'] * options['adds'] - len(errors)
+        lines = list(CartItem.objects.filter(user=user, product_id=options['product']).values_list('quantity', flat=True))
+        CartItem.objects.filter(user=user).delete()
+        user.delete()
+
+        latencies.sort()
+        self.stdout.write(f'Requests: {len(latencies)} in {total_time:.2f}s ({len(latencies) / total_time:.1f} req/s)')
+        self.stdout.write(f'Latency p50: {statistics.median(latencies) * 1000:.1f}ms, '
+                          f'p99: {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms')
+        if errors:
+            self.stdout.write(self.style.WARNING(f'{len(errors)} failed requests: {sorted(set(errors))}'))
+
+        if lines == [expected]:
+            self.stdout.write(self.style.SUCCESS(f'One cart line with quantity {expected}, no add was lost'))
+        else:
+            raise CommandError(f'Expected one cart line with quantity {expected}, found {lines}')
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:30
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_cart_items(apps, schema_editor):
+    """
+    Collapses duplicate (user, product) cart lines into one before the unique constraint is added.
+    The remaining line keeps the earliest date_added and the sum of the quantities.
+    """
+    CartItem = apps.get_model('cart', 'CartItem')
+    duplicates = (
+        CartItem.objects.values('user_id', 'product_id')
+        .annotate(lines=Count('id'), first_id=Min('id'), total=Sum('quantity'), first_added=Min('date_added'))
+        .filter(lines__gt=1)
+    )
+    for duplicate in duplicates:
+        lines = CartItem.objects.filter(user_id=duplicate['user_id'], product_id=duplicate['product_id'])
+        lines.exclude(id=duplicate['first_id']).delete()
+        lines.update(quantity=duplicate['total'], date_added=duplicate['first_added'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_alter_cartitem_date_added_alter_cartitem_product_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_cart_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(fields=('user', 'product'), name='unique_cart_item_per_user_product'),
+        ),
+    ]
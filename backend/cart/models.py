@@ -5,7 +5,8 @@ from products.models import Product
 
 class CartItem(models.Model):
     """
-    Represents a single item in a user's shopping cart.
+    Represents a single item in a user's shopping cart. A user has at most one item per product,
+    adding the same product again increases the quantity (see cart/services.py).
 
     Attributes:
         user (ForeignKey): A reference to the user who owns the cart item.
@@ -35,6 +36,11 @@ class CartItem(models.Model):
         help_text="Date and time the item was added."
     )
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'product'], name='unique_cart_item_per_user_product'),
+        ]
+
     def __str__(self):
         """String representation of the CartItem model."""
         return f'{self.quantity} of {self.product.name}'
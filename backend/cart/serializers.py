@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import CartItem, Product
+from .models import CartItem
 
 class CartItemSerializer(serializers.ModelSerializer):
     """
@@ -23,3 +23,55 @@ class CartItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = CartItem
         fields = ['name', 'price', 'image', 'quantity', 'date_added', 'product_identifier']
+
+class CartOperationSerializer(serializers.Serializer):
+    """
+    Serializer validating a single operation of a batch cart update.
+
+    Attributes:
+        op (ChoiceField): 'add' adds the quantity to the item (1 by default), 'remove' removes the item and
+            'set_quantity' replaces its quantity (0 removes it).
+        product_identifier (IntegerField): Unique identifier of the product the operation applies to.
+        quantity (IntegerField): Quantity to add or set. Not used by 'remove'.
+    """
+    OPERATIONS = ('add', 'remove', 'set_quantity')
+
+    op = serializers.ChoiceField(choices=OPERATIONS)
+    product_identifier = serializers.IntegerField()
+    quantity = serializers.IntegerField(required=False, min_value=0)
+
+    def validate(self, data):
+        if data['op'] == 'add':
+            data.setdefault('quantity', 1)
+            if data['quantity'] < 1:
+                raise serializers.ValidationError({'quantity': 'Must be at least 1 when adding an item'})
+        elif data['op'] == 'set_quantity' and 'quantity' not in data:
+            raise serializers.ValidationError({'quantity': 'Required to set the quantity of an item'})
+        return data
+
+class CartBatchSerializer(serializers.Serializer):
+    """
+    Serializer for a batch of cart operations, applied in order.
+    """
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=100)
+
+class GuestCartItemSerializer(serializers.Serializer):
+    """
+    Serializer for a line of a cart built before login.
+    """
+    product_identifier = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+
+class GuestCartSerializer(serializers.Serializer):
+    """
+    Serializer for a guest cart to merge into the user's cart.
+
+    Attributes:
+        items (list): The guest cart lines.
+        strategy (ChoiceField): How guest quantities combine with existing lines ('sum', 'max' or 'overwrite').
+            Defaults to settings.CART_MERGE_STRATEGY.
+    """
+    STRATEGIES = ('sum', 'max', 'overwrite')
+
+    items = GuestCartItemSerializer(many=True, allow_empty=True, max_length=500)
+    strategy = serializers.ChoiceField(choices=STRATEGIES, required=False)
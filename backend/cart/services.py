@@ -0,0 +1,207 @@
+"""
+Database operations on cart items that go beyond a single ORM call.
+"""
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from products.models import Product
+from .models import CartItem
+
+
+def increment_cart_item(user_id, product_identifier, quantity):
+    """
+    Adds a quantity of a product to a user's cart in a single atomic statement (upsert).
+
+    Relies on the unique (user, product) constraint of CartItem: the row is inserted if the product is not in
+    the cart yet, otherwise its quantity is incremented by the database itself. Two concurrent adds of the same
+    product (a double click) therefore always end up as one line holding both quantities.
+
+    - MySQL: INSERT ... ON DUPLICATE KEY UPDATE. MySQL cannot return the row from an insert, so the affected
+      id is captured with LAST_INSERT_ID(id) and the row is read back with a primary key lookup.
+    - PostgreSQL / SQLite: INSERT ... ON CONFLICT DO UPDATE ... RETURNING, one round trip.
+    - Other backends: get_or_create plus an F() update inside a transaction.
+
+    Args:
+    - user_id (int): The ID of the user owning the cart.
+    - product_identifier (int): The product to add. Must exist, the foreign key is enforced by the database.
+    - quantity (int): The quantity to add.
+
+    Returns:
+    - CartItem: The resulting cart item, holding its new quantity. Its product is not loaded.
+    """
+    table = connection.ops.quote_name(CartItem._meta.db_table)
+    date_added = CartItem._meta.get_field('date_added').get_db_prep_value(timezone.now(), connection)
+    params = [user_id, product_identifier, quantity, date_added]
+
+    if connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, product_id, quantity, date_added) VALUES (%s, %s, %s, %s) '
+                f'ON DUPLICATE KEY UPDATE quantity = quantity + VALUES(quantity), id = LAST_INSERT_ID(id)',
+                params,
+            )
+            item_id = cursor.lastrowid
+        return CartItem.objects.get(pk=item_id)
+
+    features = connection.features
+    if features.supports_update_conflicts_with_target and features.can_return_columns_from_insert:
+        # raw() maps the RETURNING columns back to a CartItem, converting values like a normal query would
+        return list(CartItem.objects.raw(
+            f'INSERT INTO {table} (user_id, product_id, quantity, date_added) VALUES (%s, %s, %s, %s) '
+            f'ON CONFLICT (user_id, product_id) DO UPDATE SET quantity = {table}.quantity + excluded.quantity '
+            f'RETURNING id, user_id, product_id, quantity, date_added',
+            params,
+        ))[0]
+
+    with transaction.atomic():
+        cart_item, created = CartItem.objects.select_for_update().get_or_create(
+            user_id=user_id, product_id=product_identifier, defaults={'quantity': 0}
+        )
+        cart_item.quantity = F('quantity') + quantity
+        cart_item.save(update_fields=['quantity'])
+        cart_item.refresh_from_db(fields=['quantity'])
+    return cart_item
+
+
+class UnknownProducts(Exception):
+    """
+    Raised when cart operations reference products that do not exist.
+
+    Attributes:
+    - product_identifiers (list of int): The identifiers that do not match any product.
+    """
+    def __init__(self, product_identifiers):
+        super().__init__(f'Unknown products: {product_identifiers}')
+        self.product_identifiers = product_identifiers
+
+
+def apply_cart_operations(user_id, operations):
+    """
+    Applies a list of add / remove / set_quantity operations to a user's cart in one transaction.
+
+    The operations are first folded in memory over the current cart lines, in order, so any number of them
+    costs the same handful of queries: one read of the affected lines, one existence check for new products,
+    then at most one bulk insert, one bulk update and one delete.
+
+    Args:
+    - user_id (int): The ID of the user owning the cart.
+    - operations (list of dict): Validated CartOperationSerializer data.
+
+    Raises:
+    - UnknownProducts: If an operation adds a product that does not exist. Nothing is applied in that case.
+    """
+    product_identifiers = {operation['product_identifier'] for operation in operations}
+
+    with transaction.atomic():
+        existing = {
+            item.product_id: item
+            for item in CartItem.objects.select_for_update().filter(user_id=user_id, product_id__in=product_identifiers)
+        }
+
+        quantities = {product_id: item.quantity for product_id, item in existing.items()}
+        for operation in operations:
+            product_id = operation['product_identifier']
+            if operation['op'] == 'add':
+                quantities[product_id] = quantities.get(product_id, 0) + operation['quantity']
+            elif operation['op'] == 'set_quantity' and operation['quantity'] > 0:
+                quantities[product_id] = operation['quantity']
+            else:  # 'remove', or setting the quantity to 0
+                quantities.pop(product_id, None)
+
+        _write_cart_lines(user_id, existing, quantities)
+
+
+def merge_guest_cart(user_id, lines, strategy):
+    """
+    Merges a cart built before login (guest cart) into the user's cart.
+
+    Whatever the number of guest lines, this costs one read of the matching cart lines, one existence check
+    for the guest products and at most one bulk insert and one bulk update. Guest lines for products that no
+    longer exist are skipped rather than failing the login.
+
+    Args:
+    - user_id (int): The ID of the user owning the cart.
+    - lines (list of dict): Guest cart lines with "product_identifier" and "quantity". A product listed
+      several times counts once with the summed quantity.
+    - strategy (str): How to combine a guest line with an existing line for the same product:
+      'sum' adds both quantities, 'max' keeps the larger one and 'overwrite' keeps the guest quantity.
+
+    Returns:
+    - list of int: The product identifiers that were skipped because they do not exist.
+    """
+    guest = {}
+    for line in lines:
+        guest[line['product_identifier']] = guest.get(line['product_identifier'], 0) + line['quantity']
+    if not guest:
+        return []
+
+    with transaction.atomic():
+        existing = {
+            item.product_id: item
+            for item in CartItem.objects.select_for_update().filter(user_id=user_id, product_id__in=guest)
+        }
+
+        new_lines = set(guest) - set(existing)
+        found = set(Product.objects.filter(product_identifier__in=new_lines).values_list('product_identifier', flat=True)) if new_lines else set()
+        skipped = sorted(new_lines - found)
+
+        quantities = {product_id: item.quantity for product_id, item in existing.items()}
+        for product_id, quantity in guest.items():
+            if product_id in skipped:
+                continue
+            current = quantities.get(product_id, 0)
+            if strategy == 'sum':
+                quantities[product_id] = current + quantity
+            elif strategy == 'max':
+                quantities[product_id] = max(current, quantity)
+            else:  # 'overwrite'
+                quantities[product_id] = quantity
+
+        _write_cart_lines(user_id, existing, quantities, known_products=True)
+    return skipped
+
+
+def _write_cart_lines(user_id, existing, quantities, known_products=False):
+    """
+    Persists the wanted state of some cart lines with bulk queries.
+
+    Args:
+    - user_id (int): The ID of the user owning the cart.
+    - existing (dict): product_identifier -> CartItem for the lines currently in the database.
+    - quantities (dict): product_identifier -> wanted quantity. Existing lines missing from it are deleted.
+    - known_products (bool): Skip the product existence check because the caller already did it.
+
+    Raises:
+    - UnknownProducts: If a new line references a product that does not exist.
+    """
+    new_lines = set(quantities) - set(existing)
+    if new_lines and not known_products:
+        found = set(Product.objects.filter(product_identifier__in=new_lines).values_list('product_identifier', flat=True))
+        if new_lines - found:
+            raise UnknownProducts(sorted(new_lines - found))
+
+    to_create = [
+        CartItem(user_id=user_id, product_id=product_id, quantity=quantities[product_id])
+        for product_id in new_lines
+    ]
+    to_update = []
+    for product_id, item in existing.items():
+        if product_id in quantities and quantities[product_id] != item.quantity:
+            item.quantity = quantities[product_id]
+            to_update.append(item)
+    to_delete = [product_id for product_id in existing if product_id not in quantities]
+
+    if to_create:
+        # A concurrent request may have created one of these lines since it was read: keep our quantity.
+        CartItem.objects.bulk_create(
+            to_create,
+            update_conflicts=True,
+            # MySQL's ON DUPLICATE KEY UPDATE takes no conflict target, it applies to every unique key
+            unique_fields=['user', 'product'] if connection.features.supports_update_conflicts_with_target else None,
+            update_fields=['quantity'],
+        )
+    if to_update:
+        CartItem.objects.bulk_update(to_update, ['quantity'])
+    if to_delete:
+        CartItem.objects.filter(user_id=user_id, product_id__in=to_delete).delete()
@@ -1,3 +1,311 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from custom_admin.testing import QueryBudgetTestCase, create_user
+from products.tests import create_products
+from .cache import (
+    build_cart_cache_key, build_cart_version_key, finish_cart_update, get_cart, invalidate_cart, load_cart,
+    start_cart_update,
+)
+from .models import CartItem
+from .services import apply_cart_operations, merge_guest_cart
+from .urls import router
+from .async_urls import urlpatterns as async_urlpatterns
+
+
+def fill_cart(user, product_identifiers):
+    CartItem.objects.bulk_create(
+        CartItem(user=user, product_id=product_identifier, quantity=1) for product_identifier in product_identifiers
+    )
+
+
+class CartQueryBudgetTests(QueryBudgetTestCase):
+    """
+    Query budgets of the cart endpoints. Cart reads are served from the cart cache when it is warm, these
+    budgets are for a cold cache.
+    """
+    query_budgets = {
+        'cartitem-list': 1,
+        'cartitem-detail': 1,
+        'cartitem-add-item-to-cart': 3,  # product + upsert + read back
+        'cartitem-remove-item-from-cart': 2,  # item with its product + delete
+        'cartitem-clear-entire-cart': 2,  # select + delete
+        'cartitem-batch-update': 8,
+        'cartitem-merge-and-sync-carts': 8,
+        'cartitem-update-item-quantity': 2,  # item with its product + update
+    }
+
+    def setUp(self):
+        create_products(30)
+        self.use_new_shopper()
+
+    def use_new_shopper(self, extra_products=()):
+        """
+        Signs in as a new user whose cart holds products 1 to 3 plus extra_products. Mutating endpoints are
+        measured on two such users, so that both calls do the same work on carts of different sizes.
+        """
+        self.user = create_user(f'shopper{get_user_model().objects.count()}@example.com')
+        self.client.force_authenticate(self.user)
+        fill_cart(self.user, [1, 2, 3, *extra_products])
+
+    def test_every_route_has_a_budget(self):
+        self.assertEveryRouteBudgeted(router.urls)
+
+    def test_token_authentication_needs_no_user_query(self):
+        # Signed in with a real token rather than force_authenticate, with the user details cached at login
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        cache.clear()
+        self.client.get(reverse('cartitem-list'))  # Caches the user details and the cart
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('cartitem-list'))
+        self.assertEqual(len(response.data), 3)
+
+    def test_list(self):
+        self.assertQueriesDoNotGrow(
+            'cartitem-list', lambda: self.client.get(reverse('cartitem-list')),
+            lambda: fill_cart(self.user, range(4, 15))
+        )
+
+    def test_detail(self):
+        item = CartItem.objects.first()
+        self.assertWithinBudget('cartitem-detail', lambda: self.client.get(reverse('cartitem-detail', args=[item.pk])))
+
+    def test_add_item(self):
+        url = reverse('cartitem-add-item-to-cart')
+        self.assertWithinBudget('cartitem-add-item-to-cart', lambda: self.client.post(url, {'product_identifier': 1, 'quantity': 2}))
+        self.assertWithinBudget('cartitem-add-item-to-cart', lambda: self.client.post(url, {'product_identifier': 10}))
+
+    def test_remove_item(self):
+        url = reverse('cartitem-remove-item-from-cart', args=[1])
+        self.assertWithinBudget('cartitem-remove-item-from-cart', lambda: self.client.delete(url, {'product_identifier': 1}))
+
+    def test_clear_cart(self):
+        self.assertQueriesDoNotGrow(
+            'cartitem-clear-entire-cart', lambda: self.client.delete(reverse('cartitem-clear-entire-cart')),
+            lambda: self.use_new_shopper(range(10, 25))
+        )
+
+    def test_batch_update(self):
+        operations = [{'op': 'add', 'product_identifier': product_identifier, 'quantity': 1} for product_identifier in range(1, 6)]
+        operations += [{'op': 'set_quantity', 'product_identifier': 3, 'quantity': 4}, {'op': 'remove', 'product_identifier': 2}]
+        self.assertQueriesDoNotGrow(
+            'cartitem-batch-update',
+            lambda: self.client.post(reverse('cartitem-batch-update'), {'operations': operations}, format='json'),
+            lambda: self.use_new_shopper(range(10, 25))
+        )
+
+    def test_merge_carts(self):
+        url = reverse('cartitem-merge-and-sync-carts')
+        items = [{'product_identifier': product_identifier, 'quantity': 2} for product_identifier in range(1, 8)]
+        self.assertQueriesDoNotGrow(
+            'cartitem-merge-and-sync-carts', lambda: self.client.post(url, {'items': items}, format='json'),
+            lambda: self.use_new_shopper(range(10, 25))
+        )
+        self.assertWithinBudget('cartitem-merge-and-sync-carts', lambda: self.client.get(url))
+
+    def test_update_quantity(self):
+        url = reverse('cartitem-update-item-quantity', args=[1])
+        self.assertWithinBudget('cartitem-update-item-quantity', lambda: self.client.patch(url, {'quantity': 5}))
+
+
+class AsyncCartViewTests(QueryBudgetTestCase):
+    """
+    The async variants of the cart read and add endpoints, signed in with a real token.
+    """
+    query_budgets = {
+        'async-cart-list': 2,  # user + cart
+        'async-cart-add-item-to-cart': 4,  # user + product + upsert + read back
+    }
+
+    def setUp(self):
+        create_products(5)
+        self.user = create_user('shopper@example.com')
+        fill_cart(self.user, [1, 2, 3])
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+
+    def test_every_route_has_a_budget(self):
+        self.assertEveryRouteBudgeted(async_urlpatterns)
+
+    def test_list(self):
+        self.assertQueriesDoNotGrow(
+            'async-cart-list', lambda: self.client.get(reverse('async-cart-list')),
+            lambda: fill_cart(self.user, [4, 5])
+        )
+        # Warm: user details and cart cached
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('async-cart-list'))
+        self.assertEqual(response.content, self.client.get(reverse('cartitem-list')).content)
+
+    def test_add_item(self):
+        url = reverse('async-cart-add-item-to-cart')
+        self.assertWithinBudget('async-cart-add-item-to-cart', lambda: self.client.post(url, {'product_identifier': 1, 'quantity': 2}, format='json'))
+        self.client.get(reverse('async-cart-list'))  # Caches the cart
+        response = self.client.post(url, {'product_identifier': 4})
+        self.assertEqual(response.json()['quantity'], 1)
+        # The new line was written through to the cached cart
+        with self.assertNumQueries(0):
+            cart = self.client.get(reverse('async-cart-list')).json()
+        self.assertEqual(cart[0]['product_identifier'], 4)
+        self.assertEqual({item['product_identifier']: item['quantity'] for item in cart}, {1: 3, 2: 1, 3: 1, 4: 1})
+        self.assertEqual(self.client.post(url, {'product_identifier': 999}).status_code, 404)
+        self.assertEqual(self.client.post(url, {'quantity': 1}).status_code, 400)
+
+    def test_requires_authentication(self):
+        self.client.credentials()
+        self.assertEqual(self.client.get(reverse('async-cart-list')).status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+        self.assertEqual(self.client.get(reverse('async-cart-list')).status_code, 401)
+
+
+class CartServiceTests(QueryBudgetTestCase):
+    """
+    Batch updates and guest cart merges (see cart/services.py).
+    """
+    def setUp(self):
+        create_products(10)
+        self.user = create_user('shopper@example.com')
+        self.client.force_authenticate(self.user)
+        fill_cart(self.user, [1, 2])
+
+    def quantities(self):
+        return dict(CartItem.objects.filter(user=self.user).values_list('product_id', 'quantity'))
+
+    def test_batch_update_adds_a_new_product(self):
+        operations = [{'op': 'add', 'product_identifier': 5, 'quantity': 2}, {'op': 'set_quantity', 'product_identifier': 1, 'quantity': 3}]
+        response = self.client.post(reverse('cartitem-batch-update'), {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.quantities(), {1: 3, 2: 1, 5: 2})
+        self.assertEqual(response.data[0]['product_identifier'], 5)
+
+    def test_new_lines_without_a_conflict_target(self):
+        # MySQL: ON DUPLICATE KEY UPDATE takes no unique fields, Django refuses them
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False), \
+                mock.patch.object(CartItem.objects, 'bulk_create') as bulk_create:
+            apply_cart_operations(self.user.id, [{'op': 'add', 'product_identifier': 5, 'quantity': 1}])
+        self.assertIsNone(bulk_create.call_args.kwargs['unique_fields'])
+
+    def merge(self, strategy):
+        fill_cart(self.user, [3])
+        CartItem.objects.filter(user=self.user, product_id=3).update(quantity=5)
+        items = [
+            {'product_identifier': 3, 'quantity': 2}, {'product_identifier': 6, 'quantity': 1},
+            {'product_identifier': 6, 'quantity': 1}, {'product_identifier': 999, 'quantity': 1},
+        ]
+        response = self.client.post(reverse('cartitem-merge-and-sync-carts'), {'items': items, 'strategy': strategy}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['skipped_product_identifiers'], [999])
+        self.assertEqual(
+            {item['product_identifier']: item['quantity'] for item in response.data['items']}, self.quantities()
+        )
+        return self.quantities()
+
+    def test_merge_sum(self):
+        self.assertEqual(self.merge('sum'), {1: 1, 2: 1, 3: 7, 6: 2})
+
+    def test_merge_max(self):
+        self.assertEqual(self.merge('max'), {1: 1, 2: 1, 3: 5, 6: 2})
+
+    def test_merge_overwrite(self):
+        self.assertEqual(self.merge('overwrite'), {1: 1, 2: 1, 3: 2, 6: 2})
+
+    def test_merge_without_a_conflict_target(self):
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False), \
+                mock.patch.object(CartItem.objects, 'bulk_create') as bulk_create:
+            merge_guest_cart(self.user.id, [{'product_identifier': 6, 'quantity': 1}], 'sum')
+        self.assertIsNone(bulk_create.call_args.kwargs['unique_fields'])
+
+
+class CartCacheTests(QueryBudgetTestCase):
+    """
+    The cached cart is kept up to date by mutations, and never served once a mutation it misses has committed
+    (see cart/cache.py).
+    """
+    def setUp(self):
+        # User ids are reused across tests, their carts and write sequences must not be
+        cache.clear()
+        create_products(5)
+        self.user = create_user('shopper@example.com')
+        self.client.force_authenticate(self.user)
+        fill_cart(self.user, [1, 2])
+
+    def cart(self):
+        return [(item['product_identifier'], item['quantity']) for item in self.client.get(reverse('cartitem-list')).data]
+
+    def mutate(self, make_request):
+        # The cached cart is updated on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            response = make_request()
+        self.assertEqual(response.status_code, 200, response.data)
+
+    def assertCachedCartIsCurrent(self):
+        with self.assertNumQueries(0):
+            cart = get_cart(self.user.id)
+        self.assertEqual(cart, load_cart(self.user.id))
+
+    def test_mutations_write_through_to_the_cached_cart(self):
+        self.cart()
+        self.mutate(lambda: self.client.post(reverse('cartitem-add-item-to-cart'), {'product_identifier': 3, 'quantity': 2}))
+        self.assertCachedCartIsCurrent()
+        self.assertEqual(self.cart()[0], (3, 2))
+        self.mutate(lambda: self.client.post(reverse('cartitem-add-item-to-cart'), {'product_identifier': 1}))
+        self.assertCachedCartIsCurrent()
+        self.mutate(lambda: self.client.patch(reverse('cartitem-update-item-quantity', args=[1]), {'quantity': 4}))
+        self.assertCachedCartIsCurrent()
+        self.assertIn((1, 4), self.cart())
+        self.mutate(lambda: self.client.delete(reverse('cartitem-remove-item-from-cart', args=[2]), {'product_identifier': 2}))
+        self.assertCachedCartIsCurrent()
+        self.assertEqual(sorted(self.cart()), [(1, 4), (3, 2)])
+
+    def test_mutations_without_the_changed_lines_invalidate_the_cached_cart(self):
+        self.cart()
+        self.mutate(lambda: self.client.delete(reverse('cartitem-clear-entire-cart')))
+        self.assertEqual(self.cart(), [])
+        # Warm again: served without a query
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cart(), [])
+
+    def test_entry_loaded_during_a_mutation_is_not_served(self):
+        # A read that loaded the cart before a concurrent add committed, and stores it after the add
+        get_cart(self.user.id)
+        stale_entry = cache.get(build_cart_cache_key(self.user.id))
+        with self.captureOnCommitCallbacks(execute=True):
+            fill_cart(self.user, [3])
+            invalidate_cart(self.user.id)
+        cache.set(build_cart_cache_key(self.user.id), stale_entry)
+        self.assertEqual(sorted(item['product_identifier'] for item in get_cart(self.user.id)), [1, 2, 3])
+        self.assertNotEqual(stale_entry['cart_version'], cache.get(build_cart_version_key(self.user.id)))
+
+    def test_older_write_never_replaces_a_newer_one(self):
+        get_cart(self.user.id)
+        line = dict(get_cart(self.user.id)[-1])
+        # Two updates of the same line, whose write-throughs run in the reverse order of their commits
+        first = start_cart_update(self.user.id)
+        second = start_cart_update(self.user.id)
+        finish_cart_update(self.user.id, second, items=[{**line, 'quantity': 3}])
+        finish_cart_update(self.user.id, first, items=[{**line, 'quantity': 2}])
+        with self.assertNumQueries(0):
+            self.assertEqual(get_cart(self.user.id)[-1]['quantity'], 3)
+
+    def test_write_numbered_before_the_cart_was_loaded_is_not_applied(self):
+        sequence = start_cart_update(self.user.id)
+        CartItem.objects.filter(user=self.user, product_id=1).update(quantity=5)
+        # The cart is loaded after the write was numbered, it may or may not include it
+        get_cart(self.user.id)
+        line = next(item for item in get_cart(self.user.id) if item['product_identifier'] == 1)
+        finish_cart_update(self.user.id, sequence, items=[{**line, 'quantity': 5}])
+        with self.assertNumQueries(1):
+            get_cart(self.user.id)
+
+    def test_generic_write_routes_are_disabled(self):
+        item = CartItem.objects.filter(user=self.user).first()
+        detail = reverse('cartitem-detail', args=[item.pk])
+        self.assertEqual(self.client.post(reverse('cartitem-list'), {'product': 3, 'quantity': 1}).status_code, 405)
+        self.assertEqual(self.client.put(detail, {'quantity': 9}).status_code, 405)
+        self.assertEqual(self.client.patch(detail, {'quantity': 9}).status_code, 405)
+        self.assertEqual(self.client.delete(detail).status_code, 405)
@@ -1,48 +1,52 @@
-from rest_framework import viewsets, status
+from rest_framework import mixins, viewsets, status
 from rest_framework.response import Response
 from .models import CartItem
 from products.models import Product
-from .serializers import CartItemSerializer  
+from .serializers import CartItemSerializer, CartBatchSerializer, GuestCartSerializer
 from rest_framework.permissions import IsAuthenticated
 from django.shortcuts import get_object_or_404 
 from rest_framework.decorators import action
-from django.db.models import F
-from django.core.cache import cache
+from django.db import transaction
 from django.db.utils import IntegrityError
+from django.conf import settings
+from .services import increment_cart_item, apply_cart_operations, merge_guest_cart, UnknownProducts
+from .cache import get_cart, invalidate_cart, load_cart, update_cart
 
-class CartAPIView(viewsets.ModelViewSet):
+class CartAPIView(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
     """
     ViewSet for managing user's shopping cart.
 
     Supports adding, removing, and updating items in the cart, as well as
-    clearing the entire cart. Utilizes caching to improve performance.
+    clearing the entire cart. Utilizes caching to improve performance: the serialized
+    cart is cached per user (see cart/cache.py) and every mutation writes through to it or invalidates it.
+
+    Cart lines are only changed through the actions below, which keep the cache in sync: the generic
+    create/update/destroy routes of a ModelViewSet are not offered.
     """
 
-    queryset = CartItem.objects.all().order_by('-date_added')
+    queryset = CartItem.objects.select_related('product').order_by('-date_added')
     serializer_class = CartItemSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         """
         Override get_queryset to retrieve the cart items for the authenticated user.
-        Uses caching to store and retrieve the user's cart.
         """
         user = self.request.user
-        cache_key = f'cart_{user.id}'
-        cached_cart = cache.get(cache_key)
-        
-        if cached_cart:
-            return cached_cart
-        else:
-            cart = CartItem.objects.filter(user=user).order_by('-date_added')
-            cache.set(cache_key, cart)
-            return cart
+        return CartItem.objects.filter(user=user).select_related('product').order_by('-date_added')
+
+    def list(self, request, *args, **kwargs):
+        """
+        Returns the user's serialized cart straight from the cart cache, without any SQL query when it is warm.
+        """
+        return Response(get_cart(request.user.id))
 
     @action(detail=False, methods=['POST'], url_path='add-item-to-cart')
     def add_item_to_cart(self, request):
         """
         Adds an item to the user's cart. Creates a new cart item or updates the quantity
-        if the item already exists in the cart.
+        if the item already exists in the cart, in a single atomic upsert (see cart/services.py)
+        so that concurrent adds of the same product never race.
         """
         user = self.request.user
         item_data = request.data
@@ -52,24 +56,28 @@ class CartAPIView(viewsets.ModelViewSet):
             return Response({'error': 'Product identifier missing'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            product = get_object_or_404(Product, product_identifier=item_data['product_identifier'])
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            return Response({'error': 'Invalid quantity'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            # Only the fields needed by the response are loaded
+            product_fields = Product.objects.only('product_identifier', 'name', 'price', 'image_url')
+            product = get_object_or_404(product_fields, product_identifier=item_data['product_identifier'])
         except:
             return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
 
         try:
-            cart_item, created = CartItem.objects.get_or_create(user=user, product=product, defaults={'quantity': 0})
-            cart_item.quantity = F('quantity') + quantity
-            cart_item.save()
-            cart_item.refresh_from_db()
+            with transaction.atomic():
+                cart_item = increment_cart_item(user.id, product.product_identifier, quantity)
+                cart_item.product = product
+                serializer = CartItemSerializer(cart_item)
+                update_cart(user.id, items=[serializer.data])
         except IntegrityError:
             return Response({'error': 'Database integrity error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         except:
             return Response({'error': 'Unknown error occurred while adding to cart'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        # Update cache after modifying the cart
-        cache_key = f'cart_{user.id}'
-        cache.delete(cache_key)
-        serializer = CartItemSerializer(cart_item)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['DELETE'], url_path='remove-item-from-cart')
@@ -85,17 +93,18 @@ class CartAPIView(viewsets.ModelViewSet):
         product_identifier = request.data.get('product_identifier')
 
         try:
-            product_to_remove = Product.objects.get(product_identifier=product_identifier)
-            cart_item = CartItem.objects.get(user=user, product=product_to_remove)
-        except (Product.DoesNotExist, CartItem.DoesNotExist):
+            # One query for the cart item and its product
+            cart_item = CartItem.objects.select_related('product').get(user=user, product_id=product_identifier)
+            product_to_remove = cart_item.product
+        except (CartItem.DoesNotExist, ValueError, TypeError):
             return Response({'error': 'Item not found'}, status=status.HTTP_404_NOT_FOUND)
 
         try:
             quantity_removed = cart_item.quantity
             product_name_removed = product_to_remove.name
-            cart_item.delete()
-            cache_key = f'cart_{user.id}'
-            cache.delete(cache_key)
+            with transaction.atomic():
+                cart_item.delete()
+                update_cart(user.id, removed=[product_to_remove.product_identifier])
         except:
             return Response({'error': 'Error occurred while removing item'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -112,20 +121,70 @@ class CartAPIView(viewsets.ModelViewSet):
         """
         user = self.request.user
         CartItem.objects.filter(user=user).delete()
-        cache_key = f'cart_{user.id}'
-        cache.delete(cache_key)
+        invalidate_cart(user.id)
         return Response({'message': 'Cart cleared', 'success': True}, status=status.HTTP_200_OK)
 
-    @action(detail=False, methods=['GET'], url_path='merge-and-sync-carts')
+    @action(detail=False, methods=['POST'], url_path='batch-update')
+    def batch_update(self, request):
+        """
+        Applies several cart operations at once, for example when a shopper edits many quantities on the cart
+        page. The operations are applied in order within a single transaction: either all of them or none.
+
+        Expected body:
+            {"operations": [
+                {"op": "add", "product_identifier": 12, "quantity": 2},
+                {"op": "set_quantity", "product_identifier": 7, "quantity": 5},
+                {"op": "remove", "product_identifier": 3}
+            ]}
+
+        Returns the resulting cart, in the same format as listing the cart.
+        """
+        user = self.request.user
+        serializer = CartBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            apply_cart_operations(user.id, serializer.validated_data['operations'])
+        except UnknownProducts as e:
+            return Response({'error': 'Product not found', 'product_identifiers': e.product_identifiers}, status=status.HTTP_404_NOT_FOUND)
+        except IntegrityError:
+            return Response({'error': 'Database integrity error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        # Rebuild the cached cart once for the whole batch, this also gives us the response
+        invalidate_cart(user.id)
+        return Response(load_cart(user.id), status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['GET', 'POST'], url_path='merge-and-sync-carts')
     def merge_and_sync_carts(self, request):
         """
         Merges and syncs carts for the authenticated user.
 
-        This method is a placeholder for future functionality to merge carts from different sessions.
+        GET simply returns the user's cart. POST merges a cart built before login (guest cart) into it:
+            {"items": [{"product_identifier": 12, "quantity": 2}, ...], "strategy": "sum"}
+        "strategy" is optional ('sum', 'max' or 'overwrite', see cart.services.merge_guest_cart) and defaults
+        to settings.CART_MERGE_STRATEGY. Guest lines for products that no longer exist are skipped.
+
+        GET returns the cart in the same format as listing the cart. POST returns
+            {"items": [...the resulting cart...], "skipped_product_identifiers": [...]}
+        where the skipped identifiers are those of the guest lines that were dropped.
         """
-        queryset = CartItem.objects.filter(user=self.request.user).order_by('-date_added')
-        serializer = CartItemSerializer(queryset, many=True)
-        return Response(serializer.data)
+        user = self.request.user
+        if request.method == 'GET':
+            return Response(get_cart(user.id))
+
+        serializer = GuestCartSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        strategy = serializer.validated_data.get('strategy', settings.CART_MERGE_STRATEGY)
+        try:
+            skipped = merge_guest_cart(user.id, serializer.validated_data['items'], strategy)
+        except IntegrityError:
+            return Response({'error': 'Database integrity error'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        invalidate_cart(user.id)
+        return Response({'items': load_cart(user.id), 'skipped_product_identifiers': skipped}, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['PATCH'], url_path='update-item-quantity')
     def update_item_quantity(self, request, pk=None):
@@ -140,19 +199,19 @@ class CartAPIView(viewsets.ModelViewSet):
         new_quantity = request.data.get('quantity')
 
         try:
-            product_to_update = Product.objects.get(product_identifier=pk)
-            cart_item = CartItem.objects.get(user=user, product=product_to_update)
-        except (Product.DoesNotExist, CartItem.DoesNotExist):
+            # One query for the cart item and the product its cached line shows
+            cart_item = CartItem.objects.select_related('product').get(user=user, product_id=pk)
+        except (CartItem.DoesNotExist, ValueError, TypeError):
             return Response({'error': 'Item not found'}, status=status.HTTP_404_NOT_FOUND)
 
         if new_quantity is None:
             return Response({'error': 'New quantity not provided'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            cart_item.quantity = new_quantity
-            cart_item.save()
-            cache_key = f'cart_{user.id}'
-            cache.delete(cache_key)
+            with transaction.atomic():
+                cart_item.quantity = new_quantity
+                cart_item.save()
+                update_cart(user.id, items=[CartItemSerializer(cart_item).data])
         except:
             return Response({'error': 'Error occurred while updating quantity'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
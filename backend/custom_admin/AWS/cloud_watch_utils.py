@@ -1,10 +1,54 @@
-import boto3
+import os
+import threading
 from django.conf import settings
 
+# boto3 clients are created on first use, once per process, and shared between threads (boto3 clients are
+# thread safe). Nothing here talks to AWS at import time, so importing the logging modules stays cheap for
+# every Django worker, manage.py command and Celery process.
+_clients = {}
+_initialized_log_groups = set()
+_lock = threading.Lock()
+_pid = os.getpid()
+
+def get_aws_client(service_name):
+    """
+    Returns the shared boto3 client for an AWS service, creating it on first use.
+
+    Args:
+        service_name (str): The AWS service, e.g. 'logs' or 's3'.
+
+    Returns:
+        boto3 client object.
+    """
+    global _pid
+    client = _clients.get(service_name) if _pid == os.getpid() else None
+    if client is None:
+        with _lock:
+            if _pid != os.getpid():
+                # Forked child: the parent's connection pools must not be reused
+                _clients.clear()
+                _initialized_log_groups.clear()
+                _pid = os.getpid()
+            client = _clients.get(service_name)
+            if client is None:
+                import boto3  # Deferred, importing boto3 alone takes a noticeable part of a second
+
+                client = boto3.client(
+                    service_name,
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_S3_REGION_NAME
+                )
+                _clients[service_name] = client
+    return client
+
 def initialize_cloudwatch(log_group_name, intended_log_streams):
     """
     Initializes the AWS CloudWatch log group and log streams.
 
+    The log group and streams are only created on the first call for a given log group in a process,
+    later calls just return the shared client.
+
     Args:
         log_group_name (str): Name of the log group to create or use.
         intended_log_streams (list of str): List of log stream names to create within the log group.
@@ -12,13 +56,10 @@ def initialize_cloudwatch(log_group_name, intended_log_streams):
     Returns:
         boto3 CloudWatch Logs client object.
     """
-    # Creating a CloudWatch client using boto3 with AWS credentials from Django settings
-    cloudwatch_client = boto3.client(
-        'logs',
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_S3_REGION_NAME
-    )
+    # Shared CloudWatch client using AWS credentials from Django settings
+    cloudwatch_client = get_aws_client('logs')
+    if log_group_name in _initialized_log_groups:
+        return cloudwatch_client
 
     # Creating a log group. Ignores if the log group already exists.
     try:
@@ -36,4 +77,5 @@ def initialize_cloudwatch(log_group_name, intended_log_streams):
         except cloudwatch_client.exceptions.ResourceAlreadyExistsException:
             pass  # Log stream already exists, no action needed
 
+    _initialized_log_groups.add(log_group_name)
     return cloudwatch_client
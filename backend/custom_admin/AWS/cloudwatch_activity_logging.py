@@ -4,15 +4,26 @@ import json
 import uuid
 from datetime import datetime
 from .cloud_watch_utils import initialize_cloudwatch
+from custom_admin.log_sinks import get_log_sink
+from custom_admin import metrics
 
-cloudwatch_client = initialize_cloudwatch(
-    settings.ACTIVITY_LOG_GROUP_NAME, 
-    settings.INTENDED_ACTIVITY_LOG_STREAMS
-)
+def get_cloudwatch_client():
+    """
+    Returns the CloudWatch client, creating the log group and streams the first time it is needed.
+    Only called from the log shipper's background thread, never at import time.
+    """
+    return initialize_cloudwatch(settings.ACTIVITY_LOG_GROUP_NAME, settings.INTENDED_ACTIVITY_LOG_STREAMS)
+
+# Where the events go: CloudWatch (shipped in batches from a background thread, see cloudwatch_shipper.py),
+# a local file, stdout or memory depending on settings.LOG_SINKS['activity']. See custom_admin/log_sinks.py
+log_sink = get_log_sink('activity', cloudwatch_client_factory=get_cloudwatch_client)
 
 def log_to_cloudwatch(log_group, log_stream, level='INFO', action_type=None, details=None, request=None):
     """
     Main function to log to CloudWatch. 
+
+    The event is handed to log_sink. With the CloudWatch sink it is only queued here and sent in the
+    background, so the calling request never waits on AWS.
     
     Parameters:
     -----------
@@ -32,19 +43,8 @@ def log_to_cloudwatch(log_group, log_stream, level='INFO', action_type=None, det
       Additional details for the log as key-value pairs.
       
     """
-    
-    try:
-        sequence_token = None
-        response = cloudwatch_client.describe_log_streams(
-            logGroupName=log_group,
-            logStreamNamePrefix=log_stream
-        )
-        log_streams = response.get('logStreams', [])
-        if log_streams:
-            sequence_token = log_streams[0].get('uploadSequenceToken')
-    except Exception as e:
-        print(f"Failed to get sequence token: {e}")
 
+    start = time.perf_counter()
     timestamp = int(round(time.time() * 1000))  # Current time in milliseconds
     human_readable_timestamp = datetime.now().strftime('%A %B %d %Y %I:%M:%S %p')
     event_id = str(uuid.uuid4())
@@ -63,17 +63,8 @@ def log_to_cloudwatch(log_group, log_stream, level='INFO', action_type=None, det
         'message': json.dumps(log_data)
     }
 
-    try:
-        log_params = {
-            'logGroupName': log_group,
-            'logStreamName': log_stream,
-            'logEvents': [log_event]
-        }
-        if sequence_token:
-            log_params['sequenceToken'] = sequence_token
-        cloudwatch_client.put_log_events(**log_params)
-    except Exception as e:
-        print(f"Failed to put log events: {e}")
+    log_sink.emit(log_group, log_stream, log_event)
+    metrics.observe('log_event_duration_seconds', time.perf_counter() - start, (('sink', 'activity'),))
 
 # Log admin actions
 def log_admin_actions(admin_user, action_type, level='INFO', details={}, request=None):
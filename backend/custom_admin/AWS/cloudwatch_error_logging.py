@@ -5,17 +5,27 @@ import json
 import uuid
 from datetime import datetime
 from .cloud_watch_utils import initialize_cloudwatch
+from custom_admin.log_sinks import get_log_sink
+from custom_admin import metrics
 
-# Initialize the cloudwatch client for logging errors
-cloudwatch_client = initialize_cloudwatch(
-    settings.ERROR_LOG_GROUP_NAME, 
-    settings.INTENDED_ERROR_LOG_STREAMS
-)
+def get_cloudwatch_client():
+    """
+    Returns the CloudWatch client, creating the log group and streams the first time it is needed.
+    Only called from the log shipper's background thread, never at import time.
+    """
+    return initialize_cloudwatch(settings.ERROR_LOG_GROUP_NAME, settings.INTENDED_ERROR_LOG_STREAMS)
+
+# Where the events go: CloudWatch (shipped in batches from a background thread, see cloudwatch_shipper.py),
+# a local file, stdout or memory depending on settings.LOG_SINKS['error']. See custom_admin/log_sinks.py
+log_sink = get_log_sink('error', cloudwatch_client_factory=get_cloudwatch_client)
 
 def log_to_cloudwatch(log_stream, level='ERROR', details=None, request=None, exc_info=None):
     """
     Logs errors to AWS CloudWatch.
 
+    The event is handed to log_sink. With the CloudWatch sink it is only queued here and sent in the
+    background, so the calling request never waits on AWS.
+
     Parameters:
     - log_stream (str): The name of the CloudWatch log stream.
     - level (str): The severity level of the log ('ERROR' by default).
@@ -23,20 +33,8 @@ def log_to_cloudwatch(log_stream, level='ERROR', details=None, request=None, exc
     - request (HttpRequest): The Django HttpRequest object.
     - exc_info (Exception): The exception information to log.
     """
-    try:
-        # Fetching the sequence token for CloudWatch logs
-        sequence_token = None
-        response = cloudwatch_client.describe_log_streams(
-            logGroupName=settings.ERROR_LOG_GROUP_NAME,
-            logStreamNamePrefix=log_stream
-        )
-        log_streams = response.get('logStreams', [])
-        if log_streams:
-            sequence_token = log_streams[0].get('uploadSequenceToken')
-    except Exception as e:
-        print(f"Failed to get sequence token: {e}")  # Will try to implement better logging in the future
-    
     # Preparing log data
+    start = time.perf_counter()
     timestamp = int(round(time.time() * 1000))
     human_readable_timestamp = datetime.now().strftime('%A %B %d %Y %I:%M:%S %p')
     event_id = str(uuid.uuid4())
@@ -71,18 +69,9 @@ def log_to_cloudwatch(log_stream, level='ERROR', details=None, request=None, exc
         'message': json.dumps(log_data)
     }
 
-    try:
-        # Sending the log event to CloudWatch
-        log_params = {
-            'logGroupName': settings.ERROR_LOG_GROUP_NAME,
-            'logStreamName': log_stream,
-            'logEvents': [log_event]
-        }
-        if sequence_token:
-            log_params['sequenceToken'] = sequence_token
-        cloudwatch_client.put_log_events(**log_params)
-    except Exception as e:
-        print(f"Failed to put log events: {e}") # Will try to implement better logging in the future
+    # Handing the log event to the configured sink
+    log_sink.emit(settings.ERROR_LOG_GROUP_NAME, log_stream, log_event)
+    metrics.observe('log_event_duration_seconds', time.perf_counter() - start, (('sink', 'error'),))
 
 
 def log_critical_error(error_message, details={}, request=None, exc_info=None, level='CRITICAL'):
@@ -0,0 +1,210 @@
+"""
+Background shipper for CloudWatch log events.
+
+Logging used to call describe_log_streams and put_log_events inline, so every logged event cost the request
+two AWS round trips. The logging modules now hand their events to a CloudWatchLogShipper, which only appends
+them to an in-process queue. A worker thread drains that queue, groups the events per log stream, and sends
+them in as few put_log_events calls as CloudWatch's limits allow:
+
+- at most 10,000 events per call,
+- at most 1,048,576 bytes per call, each event counting for its UTF-8 message size plus 26 bytes,
+- events of a call in chronological order and spanning less than 24 hours.
+
+Pending events are flushed every settings.CLOUDWATCH_FLUSH_INTERVAL seconds and when the process exits.
+Sequence tokens are tracked locally per stream, so a stream is only described once per process.
+
+If CloudWatch is unreachable the events are dropped (with a printed message) rather than retried forever, and
+when the queue is full new events are dropped as well: logging must never slow down or break a request.
+"""
+import atexit
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+
+from custom_admin import metrics
+
+MAX_BATCH_EVENTS = 10000
+MAX_BATCH_BYTES = 1048576
+EVENT_OVERHEAD_BYTES = 26
+MAX_BATCH_SPAN_MS = 24 * 60 * 60 * 1000
+
+# Queue item asking the worker to send everything it holds right away
+_FLUSH = object()
+
+
+class CloudWatchLogShipper:
+    """
+    Ships log events to CloudWatch from a background thread.
+
+    Args:
+    - client_factory (callable): Returns the boto3 CloudWatch Logs client. Called from the worker thread.
+    - flush_interval (float): Seconds between two flushes. Defaults to settings.CLOUDWATCH_FLUSH_INTERVAL.
+    - max_queue_size (int): Events held at most before new ones are dropped.
+      Defaults to settings.CLOUDWATCH_MAX_QUEUE_SIZE.
+    """
+    def __init__(self, client_factory, flush_interval=None, max_queue_size=None):
+        self.client_factory = client_factory
+        self.flush_interval = flush_interval or settings.CLOUDWATCH_FLUSH_INTERVAL
+        self.max_queue_size = max_queue_size or settings.CLOUDWATCH_MAX_QUEUE_SIZE
+        self.dropped_events = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self._sequence_tokens = {}
+        atexit.register(self.flush)
+
+    def enqueue(self, log_group, log_stream, log_event):
+        """
+        Queues a log event for shipping. Never blocks and never raises.
+
+        Args:
+        - log_group (str): CloudWatch log group name.
+        - log_stream (str): Log stream name within the group.
+        - log_event (dict): The event, with 'timestamp' (epoch milliseconds) and 'message' (str).
+        """
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((log_group, log_stream, log_event))
+        except queue.Full:
+            self.dropped_events += 1
+            metrics.increment('cloudwatch_dropped_events_total')
+
+    def flush(self, timeout=10):
+        """
+        Sends every queued event and waits (up to timeout seconds) until it is done.
+        Called automatically at interpreter shutdown.
+        """
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        done = threading.Event()
+        try:
+            self._queue.put((_FLUSH, done, None), timeout=timeout)
+        except queue.Full:
+            return
+        done.wait(timeout)
+
+    def _ensure_worker(self):
+        # Started lazily, and again in a forked child (Gunicorn/Celery workers) since threads do not survive a fork
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                if self._thread.is_alive():
+                    return
+                # The worker died: a new one takes over the events queued in this process
+                print("CloudWatch log shipper thread died, restarting it")
+            else:
+                self._queue = queue.Queue(maxsize=self.max_queue_size)
+                self._sequence_tokens = {}
+            self._thread = threading.Thread(target=self._run, name='cloudwatch-log-shipper', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def _run(self):
+        pending = {}
+        next_flush = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(next_flush - time.monotonic(), 0))
+            except queue.Empty:
+                item = None
+
+            flush_requested = item is not None and item[0] is _FLUSH
+            try:
+                if item is not None and not flush_requested:
+                    log_group, log_stream, log_event = item
+                    pending.setdefault((log_group, log_stream), []).append(log_event)
+
+                if flush_requested or time.monotonic() >= next_flush:
+                    next_flush = time.monotonic() + self.flush_interval
+                    sending, pending = pending, {}
+                    self._send_pending(sending)
+                else:
+                    # A stream that reached the per-call event limit is sent without waiting for the interval
+                    full = [key for key, events in pending.items() if len(events) >= MAX_BATCH_EVENTS]
+                    if full:
+                        self._send_pending({key: pending.pop(key) for key in full})
+            except Exception as e:
+                # Never let the worker die: the events in hand are lost, the following ones are still shipped
+                print(f"CloudWatch log shipper failed: {e!r}")
+            finally:
+                if flush_requested:
+                    item[1].set()
+
+    def _send_pending(self, pending):
+        for (log_group, log_stream), events in pending.items():
+            for batch in split_into_batches(events):
+                try:
+                    self._put_log_events(log_group, log_stream, batch)
+                except Exception as e:
+                    print(f"Failed to put {len(batch)} log events to {log_group}/{log_stream}: {e}")
+
+    def _put_log_events(self, log_group, log_stream, batch):
+        client = self.client_factory()
+        key = (log_group, log_stream)
+        if key not in self._sequence_tokens:
+            self._sequence_tokens[key] = self._describe_sequence_token(client, log_group, log_stream)
+
+        for attempt in range(2):
+            log_params = {'logGroupName': log_group, 'logStreamName': log_stream, 'logEvents': batch}
+            if self._sequence_tokens[key]:
+                log_params['sequenceToken'] = self._sequence_tokens[key]
+            try:
+                with metrics.timer('cloudwatch_put_duration_seconds'):
+                    response = client.put_log_events(**log_params)
+                self._sequence_tokens[key] = response.get('nextSequenceToken')
+                return
+            except client.exceptions.DataAlreadyAcceptedException as e:
+                # The batch went through already (a previous call timed out after CloudWatch accepted it): sending it
+                # again would duplicate it. Only the token has to be caught up with.
+                self._sequence_tokens[key] = e.response.get('expectedSequenceToken')
+                return
+            except client.exceptions.InvalidSequenceTokenException as e:
+                # Another process wrote to the stream. The error tells us the token to use.
+                self._sequence_tokens[key] = e.response.get('expectedSequenceToken')
+                if attempt:
+                    raise
+
+    def _describe_sequence_token(self, client, log_group, log_stream):
+        try:
+            response = client.describe_log_streams(logGroupName=log_group, logStreamNamePrefix=log_stream)
+            for stream in response.get('logStreams', []):
+                if stream.get('logStreamName') == log_stream:
+                    return stream.get('uploadSequenceToken')
+        except Exception as e:
+            print(f"Failed to get sequence token: {e}")
+        return None
+
+
+def split_into_batches(events):
+    """
+    Sorts events chronologically and splits them into lists that each fit in one put_log_events call.
+
+    Args:
+    - events (list of dict): Log events with 'timestamp' and 'message'.
+
+    Returns:
+    - list of list of dict: The batches, in chronological order.
+    """
+    batches = []
+    batch = []
+    batch_bytes = 0
+    for event in sorted(events, key=lambda event: event['timestamp']):
+        size = len(event['message'].encode('utf-8')) + EVENT_OVERHEAD_BYTES
+        if batch and (
+            len(batch) >= MAX_BATCH_EVENTS
+            or batch_bytes + size > MAX_BATCH_BYTES
+            or event['timestamp'] - batch[0]['timestamp'] >= MAX_BATCH_SPAN_MS
+        ):
+            batches.append(batch)
+            batch = []
+            batch_bytes = 0
+        batch.append(event)
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches
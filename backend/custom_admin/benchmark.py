@@ -0,0 +1,42 @@
+"""
+Shared definitions of the benchmark commands: seed_benchmark_data creates the synthetic data set and
+benchmark_endpoints measures the API against it.
+
+Benchmark rows are recognizable so that they can be removed without touching real data: product identifiers
+start at PRODUCT_IDENTIFIER_OFFSET, category names start with CATEGORY_PREFIX and user emails end with
+EMAIL_DOMAIN.
+"""
+import math
+
+PRODUCT_IDENTIFIER_OFFSET = 10_000_000
+CATEGORY_PREFIX = 'Benchmark category '
+EMAIL_DOMAIN = '@benchmark.bdafricanmarket.invalid'
+
+# Password of every seeded user, it passes the login serializer's complexity rules
+PASSWORD = 'Benchmark1'
+
+# Words product names, descriptions and search queries are built from
+WORDS = (
+    'palm', 'oil', 'shea', 'butter', 'fufu', 'flour', 'plantain', 'chips', 'cassava', 'gari', 'egusi', 'seeds',
+    'jollof', 'spice', 'pepper', 'soup', 'yam', 'powder', 'cocoa', 'coffee', 'hibiscus', 'tea', 'peanut', 'rice',
+    'millet', 'sorghum', 'ginger', 'garlic', 'smoked', 'fish', 'dried', 'shrimp', 'black', 'soap', 'kola', 'nut',
+)
+
+
+def benchmark_email(index):
+    return f'user{index}{EMAIL_DOMAIN}'
+
+
+def percentile(sorted_values, fraction):
+    """
+    Returns the value below which the given fraction of the values fall (nearest rank).
+
+    Args:
+    - sorted_values (list of float): The values, sorted ascending. Must not be empty.
+    - fraction (float): Between 0 and 1, e.g. 0.99 for the 99th percentile.
+
+    Returns:
+    - float: The percentile.
+    """
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[min(max(rank, 1), len(sorted_values)) - 1]
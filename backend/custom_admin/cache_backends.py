@@ -0,0 +1,316 @@
+"""
+Cache backends that count hits and misses for the metrics endpoint (see custom_admin/metrics.py), optionally
+with an in-process tier in front of Redis.
+
+Lookups are counted per key namespace, the leading word of the key: 'catalog' for catalog:<version>:...,
+'cart' for cart_<id>_items, 'user' for user_<id>_details and so on. Only reads are counted, writes and
+deletes go straight to the underlying backend.
+
+The local tier (TwoTierRedisCache) keeps the values of the namespaces listed in settings.LOCAL_CACHE_NAMESPACES
+in a bounded LRU in every process, so that the hottest reads (catalog version, catalog responses, user details)
+cost no network round trip. Every write or delete of such a key is announced on the LOCAL_CACHE_CHANNEL Redis
+pub/sub channel (see custom_admin/redis_pubsub.py) and every process drops its local copy. Local entries also
+expire after their namespace's lifetime, which bounds staleness should a message be lost. While a process is not
+subscribed (startup, Redis connection lost) its local tier is bypassed, and it is emptied on every
+resubscription.
+
+Rebuild locks ("<key>:lock", see products/cache.py) always go straight to Redis: they are taken with add() and
+released with delete() on every rebuild, and each would otherwise publish an invalidation for a key that is
+never read.
+"""
+import os
+import pickle
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django_redis.cache import RedisCache
+
+from . import metrics, redis_pubsub
+
+_NAMESPACE = re.compile(r'[A-Za-z]+')
+_MISSING = object()
+
+
+def key_namespace(key):
+    """
+    Returns the namespace a cache key is counted under.
+
+    Args:
+    - key (str): The cache key, as given by the caller (without the backend's prefix and version).
+
+    Returns:
+    - str: The leading word of the key, or 'other'.
+    """
+    match = _NAMESPACE.match(str(key))
+    return match.group(0) if match else 'other'
+
+
+def record_lookup(key, hit):
+    """
+    Counts one cache lookup, globally per namespace and against the request being handled, if any.
+    """
+    metrics.increment('cache_requests_total', (('namespace', key_namespace(key)), ('result', 'hit' if hit else 'miss')))
+    stats = metrics.current_request_stats.get()
+    if stats is not None:
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+
+
+class CacheMetricsMixin:
+    """
+    Counts the hits and misses of get() and get_many() on any Django cache backend.
+    """
+    def get(self, key, default=None, version=None, **kwargs):
+        value = super().get(key, _MISSING, version=version, **kwargs)
+        record_lookup(key, value is not _MISSING)
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None, **kwargs):
+        keys = list(keys)
+        found = super().get_many(keys, version=version, **kwargs)
+        for key in keys:
+            record_lookup(key, key in found)
+        return found
+
+
+class InstrumentedRedisCache(CacheMetricsMixin, RedisCache):
+    """
+    django_redis RedisCache counting its hits and misses. Drop-in replacement in settings.CACHES.
+    """
+
+
+class LocalTier:
+    """
+    Bounded, thread safe LRU of cache values with a lifetime per key namespace, shared by the threads of a process.
+
+    Values are kept pickled, like the local memory backend does, so that callers mutating what they got cannot
+    alter the cached copy.
+
+    Attributes:
+    - max_entries (int): The least recently used entry is evicted beyond this many entries.
+    - timeouts (dict): Namespace -> lifetime of its local entries in seconds.
+    - generation (int): Incremented by every invalidation. A value read from Redis is only kept if no
+    invalidation arrived while it was being read, otherwise it may be older than the invalidation.
+    """
+    def __init__(self, max_entries, timeouts):
+        self.max_entries = max_entries
+        self.timeouts = timeouts
+        self.generation = 0
+        self._entries = OrderedDict()  # key -> (expires at, namespace, pickled value)
+        self._lock = threading.Lock()
+
+    def get(self, key, namespace):
+        """
+        Returns (True, value) for a live entry, (False, None) otherwise.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                metrics.increment('local_cache_evictions_total', (('namespace', namespace), ('reason', 'expired')))
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        metrics.increment('local_cache_requests_total', (('namespace', namespace), ('result', 'hit' if entry else 'miss')))
+        if entry is None:
+            return False, None
+        return True, pickle.loads(entry[2])
+
+    def set(self, key, namespace, value, generation):
+        """
+        Keeps a value read from Redis, unless an invalidation arrived since generation was read.
+        """
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        evicted = []
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.timeouts[namespace], namespace, pickled)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[1][1])
+        for evicted_namespace in evicted:
+            metrics.increment('local_cache_evictions_total', (('namespace', evicted_namespace), ('reason', 'capacity')))
+
+    def invalidate(self, key):
+        """
+        Drops the entry of a key, if any. Handler of the invalidation channel.
+        """
+        if key == CLEAR_MESSAGE:
+            return self.clear()
+        with self._lock:
+            self.generation += 1
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            metrics.increment('local_cache_evictions_total', (('namespace', entry[1]), ('reason', 'invalidated')))
+
+    def clear(self):
+        """
+        Drops every entry.
+        """
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Published on the invalidation channel when the whole cache is cleared
+CLEAR_MESSAGE = '*'
+
+# Suffix of the rebuild lock keys, kept out of the local tier whatever their namespace
+LOCK_KEY_SUFFIX = ':lock'
+
+_local_tier = None
+_local_tier_pid = None
+_local_tier_lock = threading.Lock()
+
+
+def get_local_tier():
+    """
+    Returns the local tier of this process, created and subscribed to the invalidation channel on first use.
+
+    Django creates a cache backend instance per thread: the local tier is per process so that the threads
+    share it.
+    """
+    global _local_tier, _local_tier_pid
+    if _local_tier is None or _local_tier_pid != os.getpid():
+        with _local_tier_lock:
+            if _local_tier is None or _local_tier_pid != os.getpid():
+                tier = LocalTier(settings.LOCAL_CACHE_MAX_ENTRIES, settings.LOCAL_CACHE_NAMESPACES)
+                redis_pubsub.subscribe(settings.LOCAL_CACHE_CHANNEL, tier.invalidate, on_reset=tier.clear)
+                _local_tier = tier
+                _local_tier_pid = os.getpid()
+    return _local_tier
+
+
+class LocalTierMixin:
+    """
+    Serves the keys of the namespaces in settings.LOCAL_CACHE_NAMESPACES from the process' LocalTier, and
+    announces their writes on the invalidation channel. Other keys go straight to the underlying backend.
+    """
+    def get_local_tier(self):
+        return get_local_tier()
+
+    def publish_invalidation(self, message):
+        redis_pubsub.publish(settings.LOCAL_CACHE_CHANNEL, message)
+
+    def _local_key(self, key, version):
+        """
+        Returns (namespace, full key) for a key of a locally cached namespace, None for any other key and for
+        rebuild locks.
+        """
+        namespace = key_namespace(key)
+        if namespace not in settings.LOCAL_CACHE_NAMESPACES or str(key).endswith(LOCK_KEY_SUFFIX):
+            return None
+        return namespace, str(self.make_key(key, version=version))
+
+    def _readable_tier(self):
+        # Without a subscription, invalidations would be missed: the local tier cannot be trusted
+        tier = self.get_local_tier()
+        return tier if redis_pubsub.is_listening() else None
+
+    def get(self, key, default=None, version=None, **kwargs):
+        local = self._local_key(key, version)
+        tier = self._readable_tier() if local else None
+        if tier is None:
+            return super().get(key, default, version=version, **kwargs)
+
+        namespace, full_key = local
+        hit, value = tier.get(full_key, namespace)
+        if hit:
+            return value
+        generation = tier.generation
+        value = super().get(key, _MISSING, version=version, **kwargs)
+        if value is _MISSING:
+            return default
+        tier.set(full_key, namespace, value, generation)
+        return value
+
+    def get_many(self, keys, version=None, **kwargs):
+        keys = list(keys)
+        local_keys = {key: self._local_key(key, version) for key in keys}
+        tier = self._readable_tier() if any(local_keys.values()) else None
+        if tier is None:
+            return super().get_many(keys, version=version, **kwargs)
+
+        found = {}
+        for key, local in local_keys.items():
+            if local:
+                hit, value = tier.get(local[1], local[0])
+                if hit:
+                    found[key] = value
+        missing = [key for key in keys if key not in found]
+        if missing:
+            generation = tier.generation
+            fetched = super().get_many(missing, version=version, **kwargs)
+            for key, value in fetched.items():
+                if local_keys[key]:
+                    tier.set(local_keys[key][1], local_keys[key][0], value, generation)
+            found.update(fetched)
+        return found
+
+    def _invalidate(self, keys, version):
+        # After the write: a process refetching on the message must get the new value
+        for key in keys:
+            local = self._local_key(key, version)
+            if local:
+                self.get_local_tier().invalidate(local[1])
+                self.publish_invalidation(local[1])
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, **kwargs):
+        result = super().set(key, value, timeout, version=version, **kwargs)
+        self._invalidate([key], version)
+        return result
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, **kwargs):
+        added = super().add(key, value, timeout, version=version, **kwargs)
+        if added:
+            # The key had expired in Redis, a process may still hold it locally
+            self._invalidate([key], version)
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None, **kwargs):
+        result = super().set_many(data, timeout, version=version, **kwargs)
+        self._invalidate(list(data), version)
+        return result
+
+    def delete(self, key, version=None, **kwargs):
+        result = super().delete(key, version=version, **kwargs)
+        self._invalidate([key], version)
+        return result
+
+    def delete_many(self, keys, version=None, **kwargs):
+        keys = list(keys)
+        result = super().delete_many(keys, version=version, **kwargs)
+        self._invalidate(keys, version)
+        return result
+
+    def incr(self, key, delta=1, version=None, **kwargs):
+        value = super().incr(key, delta, version=version, **kwargs)
+        self._invalidate([key], version)
+        return value
+
+    def decr(self, key, delta=1, version=None, **kwargs):
+        value = super().decr(key, delta, version=version, **kwargs)
+        self._invalidate([key], version)
+        return value
+
+    def clear(self):
+        result = super().clear()
+        self.get_local_tier().clear()
+        self.publish_invalidation(CLEAR_MESSAGE)
+        return result
+
+
+class TwoTierRedisCache(CacheMetricsMixin, LocalTierMixin, RedisCache):
+    """
+    InstrumentedRedisCache with the in-process tier of LocalTierMixin. Drop-in replacement in settings.CACHES.
+    """
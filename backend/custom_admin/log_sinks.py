@@ -0,0 +1,227 @@
+"""
+Destinations ("sinks") for the activity and error log events.
+
+custom_admin/AWS/cloudwatch_activity_logging.py and cloudwatch_error_logging.py build their events the same
+way whatever the destination, then hand them to the sink configured in settings.LOG_SINKS:
+
+- 'cloudwatch': batched, background shipping to AWS CloudWatch (the production default).
+- 'file': buffered JSON Lines file with size based rotation, for development or for a log collector to tail.
+- 'stdout': one JSON line per event on standard output, for containers and local debugging.
+- 'memory': bounded in-memory ring buffer, for tests and benchmarks.
+
+A dotted path to a class implementing emit()/flush() can be given instead of a name.
+Development, tests and benchmark runs thus never need network access to log.
+"""
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+class LogSink:
+    """
+    Base class of the log sinks.
+    """
+    def emit(self, log_group, log_stream, log_event):
+        """
+        Records a log event. Must be fast and must never raise.
+
+        Args:
+        - log_group (str): CloudWatch log group name (used as a category by the other sinks).
+        - log_stream (str): Log stream name within the group.
+        - log_event (dict): The event, with 'timestamp' (epoch milliseconds) and 'message' (a JSON string).
+        """
+        raise NotImplementedError
+
+    def flush(self):
+        """
+        Writes out anything buffered.
+        """
+
+    @staticmethod
+    def format_line(log_group, log_stream, log_event):
+        # The message is already JSON, embed it as is rather than decoding and encoding it again
+        return (
+            f'{{"log_group": {json.dumps(log_group)}, "log_stream": {json.dumps(log_stream)}, '
+            f'"timestamp": {log_event["timestamp"]}, "event": {log_event["message"]}}}\n'
+        )
+
+
+class CloudWatchSink(LogSink):
+    """
+    Sends events to AWS CloudWatch through a background CloudWatchLogShipper.
+
+    Args:
+    - client_factory (callable): Returns the boto3 CloudWatch Logs client.
+    """
+    def __init__(self, client_factory):
+        from .AWS.cloudwatch_shipper import CloudWatchLogShipper
+
+        self.shipper = CloudWatchLogShipper(client_factory)
+
+    def emit(self, log_group, log_stream, log_event):
+        self.shipper.enqueue(log_group, log_stream, log_event)
+
+    def flush(self):
+        self.shipper.flush()
+
+
+class JsonlFileSink(LogSink):
+    """
+    Appends events to a JSON Lines file.
+
+    Lines are buffered in memory and written in one go when the buffer is full, every flush_interval seconds
+    and at exit, so emitting an event is a string format and a list append. The file is rotated like
+    logging.handlers.RotatingFileHandler: path -> path.1 -> ... -> path.<backup_count>.
+
+    Args:
+    - path (str): The file to write. '{pid}' is replaced by the process ID so that several workers of the same
+      deployment never write to (or rotate) the same file.
+    - max_bytes (int): Size at which the file is rotated.
+    - backup_count (int): Number of rotated files kept.
+    - buffer_size (int): Buffered bytes that trigger a write.
+    - flush_interval (float): Seconds between two background flushes.
+    """
+    def __init__(self, path, max_bytes=50 * 1024 * 1024, backup_count=5, buffer_size=64 * 1024, flush_interval=1.0):
+        self.path_template = str(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.path = None
+        self._pid = None
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._file = None
+        atexit.register(self.flush)
+
+    def emit(self, log_group, log_stream, log_event):
+        if self._pid != os.getpid():
+            self._start()
+        line = self.format_line(log_group, log_stream, log_event)
+        with self._lock:
+            self._buffer.append(line)
+            self._buffered_bytes += len(line)
+            full = self._buffered_bytes >= self.buffer_size
+        if full:
+            self.flush()
+
+    def _start(self):
+        # Done on first use, and again in a forked worker which needs its own file and flush thread
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._buffer, self._buffered_bytes, self._file = [], 0, None
+            self.path = self.path_template.replace('{pid}', str(os.getpid()))
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            threading.Thread(target=self._flush_periodically, name='log-file-sink', daemon=True).start()
+            self._pid = os.getpid()
+
+    def flush(self):
+        with self._lock:
+            lines, self._buffer, self._buffered_bytes = self._buffer, [], 0
+        if not lines:
+            return
+        data = ''.join(lines).encode('utf-8')
+        with self._write_lock:
+            try:
+                if self._file is None:
+                    self._file = open(self.path, 'ab')
+                if self._file.tell() + len(data) > self.max_bytes and self._file.tell() > 0:
+                    self._rotate()
+                self._file.write(data)
+                self._file.flush()
+            except OSError as e:
+                print(f"Failed to write log events to {self.path}: {e}")
+
+    def _rotate(self):
+        self._file.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f'{self.path}.{index}'
+            if os.path.exists(source):
+                os.replace(source, f'{self.path}.{index + 1}')
+        if self.backup_count > 0:
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, 'ab')
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+class StdoutSink(LogSink):
+    """
+    Writes every event as a JSON line on standard output.
+    """
+    def emit(self, log_group, log_stream, log_event):
+        sys.stdout.write(self.format_line(log_group, log_stream, log_event))
+
+    def flush(self):
+        sys.stdout.flush()
+
+
+class MemorySink(LogSink):
+    """
+    Keeps the most recent events in memory.
+
+    Args:
+    - capacity (int): Number of events kept, older ones are discarded.
+
+    Attributes:
+    - events (deque): (log_group, log_stream, log_event) tuples, oldest first.
+    """
+    def __init__(self, capacity=10000):
+        self.events = deque(maxlen=capacity)
+
+    def emit(self, log_group, log_stream, log_event):
+        self.events.append((log_group, log_stream, log_event))
+
+    def messages(self, log_stream=None):
+        """
+        Returns the decoded messages of the kept events, optionally only those of one stream.
+        """
+        return [json.loads(event['message']) for _, stream, event in list(self.events) if log_stream in (None, stream)]
+
+    def clear(self):
+        self.events.clear()
+
+
+SINK_CLASSES = {
+    'cloudwatch': CloudWatchSink,
+    'file': JsonlFileSink,
+    'stdout': StdoutSink,
+    'memory': MemorySink,
+}
+
+
+def get_log_sink(name, cloudwatch_client_factory=None):
+    """
+    Builds the sink configured for a logging module in settings.LOG_SINKS.
+
+    Args:
+    - name (str): The LOG_SINKS entry, 'activity' or 'error'.
+    - cloudwatch_client_factory (callable): Returns the CloudWatch client, used by the 'cloudwatch' sink.
+
+    Returns:
+    - LogSink: The configured sink.
+    """
+    config = settings.LOG_SINKS[name]
+    backend = config['BACKEND']
+    sink_class = SINK_CLASSES.get(backend) or import_string(backend)
+    options = dict(config.get('OPTIONS', {}))
+    if sink_class is CloudWatchSink:
+        options['client_factory'] = cloudwatch_client_factory
+    elif sink_class is JsonlFileSink:
+        options.setdefault('path', os.path.join(settings.BASE_DIR, 'logs', f'{name}-{{pid}}.jsonl'))
+    return sink_class(**options)
@@ -0,0 +1,336 @@
+import asyncio
+import itertools
+import json
+import random
+import statistics
+import subprocess
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from cart.models import CartItem
+from products.models import Product, Category
+from custom_admin.benchmark import PRODUCT_IDENTIFIER_OFFSET, CATEGORY_PREFIX, EMAIL_DOMAIN, PASSWORD, WORDS, percentile
+
+# Product list filters, benchmarked alone and in every combination
+LIST_FILTERS = ('search', 'category', 'price', 'tags')
+
+# Tags of the seeded products
+TAGS = ('HOT', 'NEW')
+
+# Metrics compared against a baseline run, and whether a higher value is better
+COMPARED_METRICS = {'throughput_rps': True, 'p50_ms': False, 'p99_ms': False}
+
+
+class AsyncAPIClient(AsyncClient):
+    """
+    AsyncClient accepting format='json' and REMOTE_ADDR like APIClient, so that the scenarios work with both.
+    """
+    def post(self, path, data=None, format=None, **extra):
+        if format == 'json':
+            extra['content_type'] = 'application/json'
+        return super().post(path, data, **extra)
+
+    def patch(self, path, data=None, format=None, **extra):
+        if format == 'json':
+            extra['content_type'] = 'application/json'
+        return super().patch(path, data, **extra)
+
+    def generic(self, method, path, *args, **extra):
+        # Anything else given here is sent as a header, ASGI requests take their client address from the scope
+        self.client_address = extra.pop('REMOTE_ADDR', None)
+        return super().generic(method, path, *args, **extra)
+
+    def request(self, **request):
+        if getattr(self, 'client_address', None):
+            request['client'] = [self.client_address, 0]
+        return super().request(**request)
+
+class Command(BaseCommand):
+    """
+    Benchmarks the API endpoints against the data seeded by seed_benchmark_data.
+
+    Scenarios:
+    - products:list with every combination of the search, category, price range and tags filters, plus
+      cursor pagination, facets, several categories and products carrying every one of several tags,
+    - products:detail, products:star_eight and products:homepage,
+    - cart:list, cart:add, cart:update_quantity and cart:batch_update, each client using its own seeded user,
+    - user:login and user:register,
+    - async:products:list, async:products:detail, async:products:star_eight, async:cart:list, async:cart:add and
+      async:user:login, the same requests to the async variants of these endpoints (see backend/asgi.py).
+
+    Every scenario is run by --concurrency clients sending --requests requests in total, after --warmup requests
+    that are not measured. Requests go through the whole middleware stack with the Django test client, so network
+    and web server time are left out. With --asgi, the clients are coroutines sharing one event loop and requests go
+through Django's ASGI handler instead of the WSGI one, like a single ASGI worker serving them all: comparing the
+async scenarios run with --asgi to their synchronous counterparts run without it compares the two deployments.
+With --cold-cache the cache is cleared before every request, which measures
+    the database path of cached endpoints (run it with --concurrency 1).
+
+    Results (throughput, mean/p50/p90/p99 latency and errors per scenario) are printed and, with --output, written
+    to a JSON file along with the commit and settings of the run. --compare checks them against a previous file:
+    the command fails when a scenario's throughput dropped, or its p50 or p99 latency grew, by more than
+    --threshold (0.2 = 20%).
+
+    Usage: python manage.py benchmark_endpoints [--requests 200] [--concurrency 4] [--warmup 20]
+           [--scenario products:list] [--asgi] [--cold-cache] [--output results.json]
+           [--compare baseline.json] [--threshold 0.2]
+    """
+    help = 'Measures throughput and latency of the API endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per scenario')
+        parser.add_argument('--concurrency', type=int, default=4, help='Number of concurrent clients')
+        parser.add_argument('--warmup', type=int, default=20, help='Unmeasured requests per scenario')
+        parser.add_argument('--scenario', action='append', default=[],
+                            help='Only run scenarios whose name starts with this (repeatable)')
+        parser.add_argument('--asgi', action='store_true', help='Send the requests through the ASGI handler')
+        parser.add_argument('--cold-cache', action='store_true', help='Clear the cache before every request')
+        parser.add_argument('--output', help='Write the results to this JSON file')
+        parser.add_argument('--compare', help='JSON results of a previous run to compare against')
+        parser.add_argument('--threshold', type=float, default=0.2, help='Tolerated relative regression')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(42)
+        self.load_fixtures()
+
+        results = {}
+        for name, make_request in self.scenarios():
+            if options['scenario'] and not any(name.startswith(prefix) for prefix in options['scenario']):
+                continue
+            results[name] = self.run_scenario(make_request)
+            self.report(name, results[name])
+
+        if not results:
+            raise CommandError('No scenario matches --scenario')
+
+        run = {
+            'commit': self.current_commit(),
+            'date': datetime.now(timezone.utc).isoformat(),
+            'database': connection.vendor,
+            'options': {key: options[key] for key in ('requests', 'concurrency', 'warmup', 'asgi', 'cold_cache')},
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(run, output, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options['compare']:
+            self.compare(results, options['compare'], options['threshold'])
+
+    def load_fixtures(self):
+        # A sample of the seeded data the scenarios draw their parameters from
+        User = get_user_model()
+        self.product_ids = list(
+            Product.objects.filter(product_identifier__gte=PRODUCT_IDENTIFIER_OFFSET).values_list('pk', flat=True)[:1000]
+        )
+        self.categories = list(Category.objects.filter(name__startswith=CATEGORY_PREFIX).values_list('name', flat=True)[:100])
+        self.users = list(User.objects.filter(email__endswith=EMAIL_DOMAIN, cart_items__isnull=False).distinct()[:max(self.options['concurrency'], 1) * 4])
+        if not self.product_ids or not self.users:
+            raise CommandError('No benchmark data, run seed_benchmark_data first')
+        self.cart_products = {
+            user.pk: list(CartItem.objects.filter(user=user).values_list('product_id', flat=True)) for user in self.users
+        }
+
+    def scenarios(self):
+        """
+        Yields (name, make_request) pairs. make_request(client, user) sends one request and returns the response.
+        """
+        for size in range(len(LIST_FILTERS) + 1):
+            for combination in itertools.combinations(LIST_FILTERS, size):
+                name = 'products:list' + ''.join(f'+{filter_name}' for filter_name in combination)
+                yield name, self.product_list(combination)
+        yield 'products:list+cursor', self.product_list((), {'pagination': 'cursor'})
+        yield 'products:list+search+facets', self.product_list(('search',), {'facets': 'true'})
+        yield 'products:list+categories', lambda client, user: client.get(
+            '/products/products_viewsets/', {'categories': ','.join(self.rng.sample(self.categories, 3))}, secure=True)
+        yield 'products:list+tags_all', self.product_list((), {'tags': ','.join(TAGS), 'tag_mode': 'all'})
+
+        yield 'products:detail', lambda client, user: client.get(
+            f'/products/products_viewsets/{self.rng.choice(self.product_ids)}/', secure=True)
+        yield 'products:star_eight', lambda client, user: client.get('/products/products_viewsets/star_eight/', secure=True)
+        yield 'products:homepage', lambda client, user: client.get('/products/homepage/', secure=True)
+
+        yield 'cart:list', lambda client, user: client.get('/cart/cart_operations/', secure=True)
+        yield 'cart:add', lambda client, user: client.post(
+            '/cart/cart_operations/add-item-to-cart/',
+            {'product_identifier': self.rng.choice(self.product_ids), 'quantity': 1}, format='json', secure=True)
+        yield 'cart:update_quantity', lambda client, user: client.patch(
+            f'/cart/cart_operations/{self.rng.choice(self.cart_products[user.pk])}/update-item-quantity/',
+            {'quantity': self.rng.randint(1, 5)}, format='json', secure=True)
+        yield 'cart:batch_update', lambda client, user: client.post(
+            '/cart/cart_operations/batch-update/',
+            {'operations': [
+                {'op': 'set_quantity', 'product_identifier': product_id, 'quantity': self.rng.randint(1, 5)}
+                for product_id in self.cart_products[user.pk][:10]
+            ]}, format='json', secure=True)
+
+        yield 'user:login', lambda client, user: client.post(
+            '/user/login/', {'email': user.email, 'password': PASSWORD}, format='json', secure=True,
+            REMOTE_ADDR=self.random_ip())
+        yield 'user:register', lambda client, user: client.post(
+            '/user/register/', {
+                'first_name': 'Bench', 'last_name': 'Mark', 'email': f'register-{uuid.uuid4().hex}{EMAIL_DOMAIN}',
+                'password': PASSWORD, 'preferred_language': 'en',
+            }, format='json', secure=True, REMOTE_ADDR=self.random_ip())
+
+        yield 'async:products:list', self.product_list((), prefix='/async')
+        yield 'async:products:detail', lambda client, user: client.get(
+            f'/async/products/products_viewsets/{self.rng.choice(self.product_ids)}/', secure=True)
+        yield 'async:products:star_eight', lambda client, user: client.get(
+            '/async/products/products_viewsets/star_eight/', secure=True)
+        yield 'async:cart:list', lambda client, user: client.get('/async/cart/cart_operations/', secure=True)
+        yield 'async:cart:add', lambda client, user: client.post(
+            '/async/cart/cart_operations/add-item-to-cart/',
+            {'product_identifier': self.rng.choice(self.product_ids), 'quantity': 1}, format='json', secure=True)
+        yield 'async:user:login', lambda client, user: client.post(
+            '/async/user/login/', {'email': user.email, 'password': PASSWORD}, format='json', secure=True,
+            REMOTE_ADDR=self.random_ip())
+
+    def product_list(self, filters, extra_params=None, prefix=''):
+        def make_request(client, user):
+            params = dict(extra_params or {})
+            if 'search' in filters:
+                params['search'] = ' '.join(self.rng.sample(WORDS, 2))
+            if 'category' in filters:
+                params['category'] = self.rng.choice(self.categories)
+            if 'price' in filters:
+                low = self.rng.randint(1, 150)
+                params.update(min_price=low, max_price=low + 50)
+            if 'tags' in filters:
+                params['tags'] = self.rng.choice(TAGS)
+            return client.get(f'{prefix}/products/products_viewsets/', params, secure=True)
+        return make_request
+
+    def random_ip(self):
+        # Login and registration are rate limited per IP address
+        return '10.{}.{}.{}'.format(*(self.rng.randint(0, 255) for _ in range(3)))
+
+    def run_scenario(self, make_request):
+        concurrency = max(self.options['concurrency'], 1)
+        latencies = []
+        errors = []
+        lock = threading.Lock()
+        counter = itertools.count()
+        total = self.options['warmup'] + self.options['requests']
+        users = [self.users[index % len(self.users)] for index in range(concurrency)]
+
+        def record(index, elapsed, status):
+            if index < self.options['warmup']:
+                return
+            with lock:
+                latencies.append(elapsed)
+                if not isinstance(status, int) or status >= 400:
+                    errors.append(status)
+
+        def worker(user):
+            # Secure requests to an allowed host so that the production middleware stack is exercised as is
+            client = APIClient(HTTP_HOST='127.0.0.1')
+            client.force_authenticate(user)
+            # The async views are plain Django views, authenticated by the token cookie only
+            client.cookies[settings.SIMPLE_JWT['AUTH_COOKIE']] = str(AccessToken.for_user(user))
+            while True:
+                index = next(counter)
+                if index >= total:
+                    break
+                if self.options['cold_cache']:
+                    cache.clear()
+                started = time.perf_counter()
+                try:
+                    status = make_request(client, user).status_code
+                except Exception as e:  # An unhandled error in a view, counted rather than stopping the run
+                    status = type(e).__name__
+                record(index, time.perf_counter() - started, status)
+            connection.close()
+
+        async def async_worker(user):
+            client = AsyncAPIClient(headers={'host': '127.0.0.1'})
+            client.cookies[settings.SIMPLE_JWT['AUTH_COOKIE']] = str(AccessToken.for_user(user))
+            while True:
+                index = next(counter)
+                if index >= total:
+                    break
+                if self.options['cold_cache']:
+                    cache.clear()
+                started = time.perf_counter()
+                try:
+                    status = (await make_request(client, user)).status_code
+                except Exception as e:
+                    status = type(e).__name__
+                record(index, time.perf_counter() - started, status)
+
+        async def run_async_workers():
+            await asyncio.gather(*(async_worker(user) for user in users))
+
+        started = time.perf_counter()
+        if self.options['asgi']:
+            asyncio.run(run_async_workers())
+        else:
+            threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elapsed = time.perf_counter() - started
+
+        if not latencies:
+            raise CommandError('No request was measured, check --requests')
+        latencies.sort()
+        return {
+            'requests': len(latencies),
+            'errors': len(errors),
+            'error_statuses': sorted(set(map(str, errors))),
+            'throughput_rps': round(len(latencies) / elapsed, 1),
+            'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+            'p50_ms': round(percentile(latencies, 0.5) * 1000, 2),
+            'p90_ms': round(percentile(latencies, 0.9) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        }
+
+    def report(self, name, result):
+        line = (f"{name:<45} {result['throughput_rps']:>8.1f} req/s  p50 {result['p50_ms']:>7.1f}ms  "
+                f"p99 {result['p99_ms']:>7.1f}ms")
+        if result['errors']:
+            self.stdout.write(self.style.WARNING(f"{line}  {result['errors']} errors {result['error_statuses']}"))
+        else:
+            self.stdout.write(line)
+
+    def compare(self, results, baseline_path, threshold):
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)['results']
+
+        regressions = []
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            for metric, higher_is_better in COMPARED_METRICS.items():
+                before, after = baseline[name][metric], result[metric]
+                if not before:
+                    continue
+                change = (after - before) / before
+                if (change < -threshold) if higher_is_better else (change > threshold):
+                    regressions.append(f'{name} {metric}: {before} -> {after} ({change:+.0%})')
+
+        if regressions:
+            raise CommandError('Regressions over {:.0%}:\n{}'.format(threshold, '\n'.join(regressions)))
+        self.stdout.write(self.style.SUCCESS(f'No regression over {threshold:.0%} against {baseline_path}'))
+
+    def current_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
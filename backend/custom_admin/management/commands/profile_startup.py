@@ -0,0 +1,83 @@
+import os
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Imported in a fresh interpreter: Django setup plus the URLconf, which pulls in every view, serializer
+# and the logging modules, i.e. what a web worker loads before serving its first request.
+STARTUP_SCRIPT = (
+    'import django; django.setup(); '
+    'from django.urls import get_resolver; get_resolver().url_patterns'
+)
+
+
+class Command(BaseCommand):
+    """
+    Reports how long the project takes to start and which modules are the most expensive to import.
+
+    A fresh Python interpreter is started with "-X importtime" using the current settings module, and
+    the per-module timings it prints are aggregated. Use it to spot startup regressions, e.g. a module
+    doing network calls or heavy work at import time.
+
+    Usage: python manage.py profile_startup [--top 25] [--filter custom_admin] [--max-ms 3000]
+    """
+    help = 'Reports the import time of every module loaded at startup'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=25, help='Number of modules to list')
+        parser.add_argument('--filter', default=None, help='Only list modules whose name contains this text')
+        parser.add_argument('--sort', choices=['cumulative', 'self'], default='cumulative',
+                            help='Rank modules by cumulative time (including their own imports) or self time')
+        parser.add_argument('--max-ms', type=float, default=None,
+                            help='Fail when the total startup time is above this many milliseconds')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT],
+            capture_output=True, text=True, env=os.environ.copy(),
+        )
+        total_ms = (time.perf_counter() - started) * 1000
+        if result.returncode != 0:
+            raise CommandError(f'Startup failed:\n{result.stderr[-2000:]}')
+
+        timings = parse_importtime(result.stderr)
+        if options['filter']:
+            timings = [timing for timing in timings if options['filter'] in timing['module']]
+        key = 'cumulative_us' if options['sort'] == 'cumulative' else 'self_us'
+        timings.sort(key=lambda timing: timing[key], reverse=True)
+
+        self.stdout.write(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for timing in timings[:options['top']]:
+            self.stdout.write(f"{timing['cumulative_us'] / 1000:>14.1f} {timing['self_us'] / 1000:>9.1f}  {timing['module']}")
+        self.stdout.write(f'Total startup time (interpreter, imports and django.setup()): {total_ms:.0f}ms')
+
+        if options['max_ms'] is not None and total_ms > options['max_ms']:
+            raise CommandError(f"Startup took {total_ms:.0f}ms, above the {options['max_ms']:.0f}ms limit")
+
+
+def parse_importtime(output):
+    """
+    Parses the stderr of "python -X importtime".
+
+    Lines look like "import time:       412 |       1530 |   django.db.models", the module name being
+    indented by its nesting depth.
+
+    Returns:
+    - list of dict: One entry per imported module with 'module', 'self_us' and 'cumulative_us'.
+    """
+    timings = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        parts = line[len('import time:'):].split('|')
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # Header line
+        timings.append({
+            'module': parts[2].strip(),
+            'self_us': int(parts[0]),
+            'cumulative_us': int(parts[1]),
+        })
+    return timings
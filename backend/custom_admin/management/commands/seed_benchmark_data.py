@@ -0,0 +1,171 @@
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from cart.models import CartItem
+from products.cache import bump_catalog_version
+from products.homepage import schedule_rebuild
+from products.models import Product, Category, ProductSearchTerm, ProductTag
+from products.search import index_products
+from products.tags import sync_tags
+from custom_admin.benchmark import (
+    PRODUCT_IDENTIFIER_OFFSET, CATEGORY_PREFIX, EMAIL_DOMAIN, PASSWORD, WORDS, benchmark_email,
+)
+
+
+class Command(BaseCommand):
+    """
+    Seeds a synthetic catalog, user base and carts for benchmark_endpoints, with bulk inserts.
+
+    The defaults are production scale: 1,000 categories, 100,000 products, 50,000 users and 1,000,000 cart items
+    spread over the users. Every user's password is custom_admin.benchmark.PASSWORD. Data is generated from a
+    fixed seed, so two runs with the same options produce the same data set and benchmark results stay comparable.
+
+    bulk_create does not send post_save signals: the search index and tag table are rebuilt for the seeded
+    products, the catalog version is bumped and the homepage payload rebuilt explicitly at the end.
+
+    Benchmark rows are recognizable (see custom_admin/benchmark.py). --clear removes them, on its own or before
+    seeding again. Real data is never touched.
+
+    Usage: python manage.py seed_benchmark_data [--products 100000] [--categories 1000] [--users 50000]
+           [--cart-items 1000000] [--batch-size 5000] [--seed 42] [--clear] [--clear-only]
+    """
+    help = 'Seeds synthetic products, categories, users and cart items for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=1000, help='Number of categories')
+        parser.add_argument('--products', type=int, default=100000, help='Number of products')
+        parser.add_argument('--users', type=int, default=50000, help='Number of users')
+        parser.add_argument('--cart-items', type=int, default=1000000, help='Number of cart items, spread over the users')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT statement')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed')
+        parser.add_argument('--clear', action='store_true', help='Remove existing benchmark data first')
+        parser.add_argument('--clear-only', action='store_true', help='Remove existing benchmark data and stop')
+
+    def handle(self, *args, **options):
+        if options['clear'] or options['clear_only']:
+            self.clear()
+            if options['clear_only']:
+                return
+        elif Product.objects.filter(product_identifier__gte=PRODUCT_IDENTIFIER_OFFSET).exists():
+            raise CommandError('Benchmark data already exists, use --clear to replace it')
+
+        if options['categories'] < 1 and options['products'] > 0:
+            raise CommandError('Products need at least one category')
+        if options['cart_items'] > options['users'] * options['products']:
+            raise CommandError('More cart items than (user, product) pairs')
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+
+        category_ids = self.step('categories', lambda: self.seed_categories(options['categories']))
+        self.step('products', lambda: self.seed_products(options['products'], category_ids))
+        user_ids = self.step('users', lambda: self.seed_users(options['users']))
+        self.step('cart items', lambda: self.seed_cart_items(options['cart_items'], user_ids, options['products']))
+        seeded = Product.objects.filter(product_identifier__gte=PRODUCT_IDENTIFIER_OFFSET)
+        self.step('search index', lambda: index_products(seeded, batch_size=self.batch_size))
+        self.step('tags', lambda: sync_tags(seeded, batch_size=self.batch_size))
+        transaction.on_commit(bump_catalog_version)
+        schedule_rebuild()
+
+    def step(self, name, seed):
+        started = time.perf_counter()
+        result = seed()
+        self.stdout.write(f'Seeded {name} in {time.perf_counter() - started:.1f}s')
+        return result
+
+    def seed_categories(self, count):
+        Category.objects.bulk_create(
+            (Category(name=f'{CATEGORY_PREFIX}{index}', description='Benchmark data') for index in range(count)),
+            batch_size=self.batch_size,
+        )
+        return list(Category.objects.filter(name__startswith=CATEGORY_PREFIX).values_list('pk', flat=True))
+
+    def seed_products(self, count, category_ids):
+        tags = [choice for choice, _ in Product.TAG_CHOICES]
+        # Some products carry two tags so that "all of these tags" filters have matches
+        tag_sets = [[tag] for tag in tags] + [['HOT', 'NEW']]
+
+        def products():
+            for index in range(count):
+                words = self.rng.sample(WORDS, 3)
+                weight = Decimal(self.rng.randint(1, 500)) / 100
+                yield Product(
+                    product_identifier=PRODUCT_IDENTIFIER_OFFSET + index,
+                    image_url=f'https://example.com/benchmark/{index}.jpg',
+                    name=' '.join(words).title() + f' {index}',
+                    price=Decimal(self.rng.randint(100, 20000)) / 100,
+                    description=' '.join(self.rng.choices(WORDS, k=20)),
+                    weight_kg=weight,
+                    weight_lbs=(weight * Decimal('2.20462')).quantize(Decimal('0.01')),
+                    default_quantity=1,
+                    stock=self.rng.randint(0, 100),
+                    tags=list(self.rng.choice(tag_sets)),
+                    category_id=self.rng.choice(category_ids),
+                )
+
+        self.bulk_insert(Product, products())
+
+    def seed_users(self, count):
+        User = get_user_model()
+        # Hashing is deliberately slow: hash the shared password once
+        password = make_password(PASSWORD)
+
+        def users():
+            for index in range(count):
+                yield User(
+                    email=benchmark_email(index), password=password,
+                    first_name=self.rng.choice(('Ama', 'Kofi', 'Awa', 'Moussa', 'Chidi', 'Fatou')),
+                    last_name=self.rng.choice(('Mensah', 'Diallo', 'Okafor', 'Traore', 'Boateng', 'Ndiaye')),
+                )
+
+        self.bulk_insert(User, users())
+        return list(User.objects.filter(email__endswith=EMAIL_DOMAIN).order_by('pk').values_list('pk', flat=True))
+
+    def seed_cart_items(self, count, user_ids, product_count):
+        if not user_ids or not product_count:
+            return
+
+        def cart_items():
+            per_user, remainder = divmod(count, len(user_ids))
+            for position, user_id in enumerate(user_ids):
+                size = min(per_user + (position < remainder), product_count)
+                for offset in self.rng.sample(range(product_count), size):
+                    yield CartItem(user_id=user_id, product_id=PRODUCT_IDENTIFIER_OFFSET + offset, quantity=self.rng.randint(1, 5))
+
+        self.bulk_insert(CartItem, cart_items())
+
+    def bulk_insert(self, model, rows):
+        # The rows are generated lazily and inserted a batch at a time, so memory stays flat whatever the count
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                model.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch)
+
+    def clear(self):
+        User = get_user_model()
+        with transaction.atomic():
+            CartItem.objects.filter(product_id__gte=PRODUCT_IDENTIFIER_OFFSET).delete()
+            CartItem.objects.filter(user__email__endswith=EMAIL_DOMAIN).delete()
+            ProductSearchTerm.objects.filter(product_id__gte=PRODUCT_IDENTIFIER_OFFSET).delete()
+            ProductTag.objects.filter(product_id__gte=PRODUCT_IDENTIFIER_OFFSET).delete()
+            # A plain DELETE: the ORM would load every product to send its post_delete signal, one catalog
+            # version bump each. Their cart items, search terms and tags are already gone.
+            with connection.cursor() as cursor:
+                table = connection.ops.quote_name(Product._meta.db_table)
+                column = connection.ops.quote_name(Product._meta.pk.column)
+                cursor.execute(f'DELETE FROM {table} WHERE {column} >= %s', [PRODUCT_IDENTIFIER_OFFSET])
+            Category.objects.filter(name__startswith=CATEGORY_PREFIX, products__isnull=True).delete()
+            User.objects.filter(email__endswith=EMAIL_DOMAIN).delete()
+            transaction.on_commit(bump_catalog_version)
+            schedule_rebuild()
+        self.stdout.write('Removed the benchmark data')
@@ -0,0 +1,208 @@
+"""
+In-process metrics registry, exposed in the Prometheus text format by the /metrics view.
+
+Counters and histograms are kept in plain dictionaries keyed by metric name and label values, guarded by one
+lock. Recording a value is a dictionary lookup plus a bisect over the histogram buckets, cheap enough to stay
+enabled in production. What gets recorded:
+
+- http_requests_total, http_request_duration_seconds: per route (the URL pattern, not the actual path, so
+  /products/12/ and /products/13/ share a series), method and status (custom_admin/middleware.py).
+- db_queries_per_request, db_query_duration_seconds: SQL queries issued by each request and their time.
+- cache_requests_total, http_request_cache_requests_total: cache hits and misses per key namespace
+  ('catalog', 'cart', 'user', ...) and per route, see custom_admin/cache_backends.py.
+- local_cache_requests_total, local_cache_evictions_total: hits and misses of the in-process cache tier per
+  namespace, and its entries dropped because they expired, were invalidated or did not fit (reason label).
+- log_event_duration_seconds, cloudwatch_put_duration_seconds, cloudwatch_dropped_events_total: time spent
+  by requests handing events to the log sinks and by the background CloudWatch shipper.
+
+Values are per process: with several Gunicorn workers, every worker keeps and serves its own numbers.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Upper bounds in seconds of the latency buckets, from 1 ms to 10 s
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Upper bounds of the per-request query count buckets
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+_help = {}
+
+# Counters of the request being handled, set by the metrics middleware (None outside of a request)
+current_request_stats = ContextVar('current_request_stats', default=None)
+
+
+class RequestStats:
+    """
+    What one request did, filled in while it is handled and recorded per route when it ends.
+    """
+    __slots__ = ('queries', 'query_time', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class Histogram:
+    """
+    Cumulative histogram of observed values.
+
+    Attributes:
+    - buckets (tuple of float): Upper bounds of the buckets, ascending. An implicit +Inf bucket follows.
+    - counts (list of int): Observations per bucket (not cumulative, summed when rendered).
+    - sum (float): Sum of the observed values.
+    - count (int): Number of observations.
+    """
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def describe(name, help_text):
+    """
+    Registers the HELP line of a metric.
+
+    Args:
+    - name (str): The metric name.
+    - help_text (str): What the metric measures.
+    """
+    _help[name] = help_text
+
+
+def increment(name, labels=(), amount=1):
+    """
+    Adds to a counter.
+
+    Args:
+    - name (str): The metric name.
+    - labels (tuple of (str, str)): The label names and values of the series.
+    - amount (float): The increment.
+    """
+    key = (name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, value, labels=(), buckets=DURATION_BUCKETS):
+    """
+    Records a value in a histogram.
+
+    Args:
+    - name (str): The metric name.
+    - value (float): The observed value.
+    - labels (tuple of (str, str)): The label names and values of the series.
+    - buckets (tuple of float): Bucket bounds, only used when the series is first created.
+    """
+    key = (name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram(buckets)
+        histogram.observe(value)
+
+
+@contextmanager
+def timer(name, labels=()):
+    """
+    Records the time spent in the with block in a duration histogram, in seconds.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, labels)
+
+
+def reset():
+    """
+    Forgets every recorded value.
+    """
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def render_prometheus():
+    """
+    Renders every metric in the Prometheus text exposition format (version 0.0.4).
+
+    Returns:
+    - str: The exposition text.
+    """
+    with _lock:
+        counters = sorted(_counters.items())
+        histograms = sorted(
+            (key, (histogram.buckets, list(histogram.counts), histogram.sum, histogram.count))
+            for key, histogram in _histograms.items()
+        )
+
+    lines = []
+    described = set()
+
+    def header(name, kind):
+        if name not in described:
+            described.add(name)
+            if name in _help:
+                lines.append(f'# HELP {name} {_help[name]}')
+            lines.append(f'# TYPE {name} {kind}')
+
+    for (name, labels), value in counters:
+        header(name, 'counter')
+        lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+    for (name, labels), (buckets, counts, total, count) in histograms:
+        header(name, 'histogram')
+        cumulative = 0
+        for bound, bucket_count in zip(buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            le = '+Inf' if bound == float('inf') else _format_value(bound)
+            lines.append(f'{name}_bucket{_format_labels(labels + (("le", le),))} {cumulative}')
+        lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+        lines.append(f'{name}_count{_format_labels(labels)} {count}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{label}="{_escape(value)}"' for label, value in labels) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+describe('http_requests_total', 'HTTP requests handled, per route, method and status code.')
+describe('http_request_duration_seconds', 'Time spent handling HTTP requests, per route and method.')
+describe('db_queries_per_request', 'SQL queries issued by one HTTP request, per route.')
+describe('db_query_duration_seconds', 'Total SQL time of one HTTP request, per route.')
+describe('cache_requests_total', 'Cache lookups per key namespace and result (hit or miss).')
+describe('local_cache_requests_total', 'Lookups of the in-process cache tier per key namespace and result (hit or miss).')
+describe('local_cache_evictions_total', 'Entries dropped from the in-process cache tier, per namespace and reason.')
+describe('http_request_cache_requests_total', 'Cache lookups made by HTTP requests, per route and result.')
+describe('log_event_duration_seconds', 'Time spent by the caller handing one event to a log sink, per sink.')
+describe('cloudwatch_put_duration_seconds', 'Duration of the put_log_events calls of the CloudWatch shipper.')
+describe('cloudwatch_dropped_events_total', 'Log events dropped because the CloudWatch shipper queue was full.')
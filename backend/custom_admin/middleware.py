@@ -0,0 +1,129 @@
+"""
+Middleware recording per-route request metrics (see custom_admin/metrics.py).
+"""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.functional import SimpleLazyObject
+from django_user_agents.utils import get_user_agent
+
+from . import metrics
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper counting the queries of the current request, if any, in its RequestStats.
+
+    Installed once on every connection rather than per request: the async ORM runs queries in a worker thread,
+    on that thread's connections, and the request's stats follow it there as a context variable.
+    """
+    stats = metrics.current_request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    query_start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_time += time.perf_counter() - query_start
+
+
+def install_query_recorder(connection, **kwargs):
+    # First in the list: connection.execute_wrapper() pops the last wrapper when its block ends
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records the latency, SQL queries and cache lookups of every request, per route.
+
+    The route is the URL pattern the request resolved to (e.g. 'products/<pk>/'), so series stay few however
+    many products or users there are. Requests that resolve to no route are counted under 'unmatched'.
+    SQL queries are counted by record_query(), installed on every database connection.
+
+    Both sync and async: under ASGI, a sync-only middleware would make Django run the whole chain below it in a
+    thread, async views included.
+
+    Should come first in settings.MIDDLEWARE so that the time spent in the other middleware is included.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+        connection_created.connect(install_query_recorder)
+        # Connections opened before this middleware was loaded
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = metrics.RequestStats()
+        token = metrics.current_request_stats.set(stats)
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            metrics.current_request_stats.reset(token)
+            self._record(request, status, stats, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        stats = metrics.RequestStats()
+        token = metrics.current_request_stats.set(stats)
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            metrics.current_request_stats.reset(token)
+            self._record(request, status, stats, time.perf_counter() - start)
+
+    def _record(self, request, status, stats, duration):
+        resolver_match = getattr(request, 'resolver_match', None)
+        route = resolver_match.route if resolver_match else 'unmatched'
+        route_labels = (('route', route),)
+
+        metrics.observe('http_request_duration_seconds', duration, route_labels + (('method', request.method),))
+        metrics.increment('http_requests_total', route_labels + (('method', request.method), ('status', str(status))))
+        metrics.observe('db_queries_per_request', stats.queries, route_labels, buckets=metrics.QUERY_COUNT_BUCKETS)
+        metrics.observe('db_query_duration_seconds', stats.query_time, route_labels)
+        if stats.cache_hits:
+            metrics.increment('http_request_cache_requests_total', route_labels + (('result', 'hit'),), stats.cache_hits)
+        if stats.cache_misses:
+            metrics.increment('http_request_cache_requests_total', route_labels + (('result', 'miss'),), stats.cache_misses)
+
+
+class UserAgentMiddleware:
+    """
+    Same as django_user_agents' UserAgentMiddleware (request.user_agent, parsed on first use), which is sync only.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        request.user_agent = SimpleLazyObject(lambda: get_user_agent(request))
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        request.user_agent = SimpleLazyObject(lambda: get_user_agent(request))
+        return await self.get_response(request)
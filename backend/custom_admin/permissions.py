@@ -1,7 +1,17 @@
+import os
+import threading
+import time
+
+from django.conf import settings
 from rest_framework import permissions
 from custom_admin.AWS.cloudwatch_error_logging import log_authentication_issue
 from django.contrib.auth.models import AnonymousUser
 
+_denials = {}  # (user email, view name) -> window of denials not logged yet
+_denials_lock = threading.Lock()
+_flusher_pid = None  # Process in which the flusher thread runs
+
+
 class IsAdminUser(permissions.BasePermission):
     """
     Custom permission to only allow users with 'admin' role to access the view.
@@ -9,6 +19,10 @@ class IsAdminUser(permissions.BasePermission):
     This permission checks if the user is authenticated and if their user_role is 'admin'. 
     If the user does not have the 'admin' role, it logs an authentication issue and denies access.
 
+    The admin pages check it on every navigation. The roles come from the cached user details of the request's
+    user (see user/claims.py), dropped as soon as the user is saved: no query, and a role change applies to the
+    next check. A burst of denials of a user on a view is logged as a single event, see log_denial().
+
     Method:
     - has_permission: Returns True if the user is authenticated and has the 'admin' role; otherwise False.
     
@@ -21,18 +35,72 @@ class IsAdminUser(permissions.BasePermission):
             return True
         elif not isinstance(user, AnonymousUser):
             # Log the failed attempt for authenticated users without the 'admin' role
-            log_authentication_issue(
-                "Admin access denied",
-                custom_tags="admin permission class",
-                details={
-                    'user_email': user.email,
-                    'attempted_access': view.__class__.__name__,
-                },
-                request=request
-            )
+            log_denial(user.email, view.__class__.__name__, request)
         # If user is AnonymousUser or doesn't have the 'admin' role, deny access
         return False
 
+def log_denial(user_email, view_name, request):
+    """
+    Logs a denied admin access, coalescing bursts: the denials of a user on a view within ADMIN_DENIAL_LOG_WINDOW
+    seconds of the first one are logged as a single event with their count, once the window is over. The event is
+    logged by the next denial after the window or, at the latest, by the flusher thread of the process.
+
+    Args:
+    - user_email (str): Email of the denied user.
+    - view_name (str): Name of the view they attempted to access.
+    - request (HttpRequest): The request of the denial.
+    """
+    now = time.time()
+    key = (user_email, view_name)
+    with _denials_lock:
+        window = _denials.get(key)
+        if window is not None and now - window['since'] < settings.ADMIN_DENIAL_LOG_WINDOW:
+            window['denials'] += 1
+            return
+        _denials[key] = {'since': now, 'denials': 1, 'request': request}
+
+    if window is not None:
+        _log_denials(key, window)
+    _ensure_flusher()
+
+def _flush_denials(now):
+    # Logs the windows over by now
+    with _denials_lock:
+        expired = [key for key, window in _denials.items() if now - window['since'] >= settings.ADMIN_DENIAL_LOG_WINDOW]
+        windows = [(key, _denials.pop(key)) for key in expired]
+    for key, window in windows:
+        _log_denials(key, window)
+
+def _log_denials(key, window):
+    log_authentication_issue(
+        "Admin access denied",
+        custom_tags="admin permission class",
+        details={
+            'user_email': key[0],
+            'attempted_access': key[1],
+            'denials': window['denials'],
+            'since': window['since'],
+        },
+        request=window['request'],
+    )
+
+def _ensure_flusher():
+    # One flusher thread per process, started on its first denial (a thread is not inherited through a fork)
+    global _flusher_pid
+    with _denials_lock:
+        if _flusher_pid == os.getpid():
+            return
+        _flusher_pid = os.getpid()
+    threading.Thread(target=_run_flusher, name='admin-denial-flusher', daemon=True).start()
+
+def _run_flusher():
+    while True:
+        time.sleep(settings.ADMIN_DENIAL_LOG_WINDOW)
+        try:
+            _flush_denials(time.time())
+        except Exception as e:
+            print(f'Could not log the denied admin accesses: {e!r}')
+
 class IsSuperAdminUser(permissions.BasePermission):
     """
     Custom permission to only allow super admin users to access the view.
@@ -0,0 +1,150 @@
+"""
+Redis pub/sub shared by every process of the deployment, over the connection pool of the default cache.
+
+Handlers subscribe to a channel with subscribe(). The first subscription of a process starts one background
+thread holding the SUBSCRIBE connection and dispatching every message it receives to the channel's handlers.
+When that connection drops, the thread reconnects with a growing delay. Messages published meanwhile are lost,
+so on every (re)subscription each subscriber's on_reset callback is called: whatever it built from messages
+must be assumed stale. is_listening() tells whether messages are currently being received.
+
+Threads do not survive a fork, and neither do subscriptions: a Gunicorn worker forked from a master that
+already subscribed must subscribe again, which starts its own listener.
+"""
+import os
+import threading
+import time
+
+# How long the listener waits for a message before checking for new channels, in seconds
+POLL_INTERVAL = 1.0
+# The connection is pinged when nothing was received for this long, so that a dead one is noticed
+PING_INTERVAL = 15.0
+# Delays between reconnection attempts, in seconds: doubled after every failure up to the maximum
+RECONNECT_DELAY = 0.5
+MAX_RECONNECT_DELAY = 30.0
+
+_lock = threading.Lock()
+_subscribers = {}  # channel -> list of (handler, on_reset)
+_listener = None
+_listener_pid = None
+_listening = threading.Event()
+
+
+def get_connection():
+    """
+    Returns the Redis client of the default cache (django-redis).
+    """
+    from django_redis import get_redis_connection
+
+    return get_redis_connection('default')
+
+
+def publish(channel, message):
+    """
+    Publishes a message to every process subscribed to a channel, this one included.
+
+    Args:
+    - channel (str): The channel name.
+    - message (str): The message.
+
+    Returns:
+    - int: The number of connections that received it.
+    """
+    return get_connection().publish(channel, message)
+
+
+def subscribe(channel, handler, on_reset=None):
+    """
+    Calls handler(message) for every message published to a channel, from the listener thread.
+
+    Args:
+    - channel (str): The channel name.
+    - handler (callable): Called with the message, a str. Exceptions are logged and ignored.
+    - on_reset (callable): Called without arguments every time the listener (re)subscribes, since messages
+    may have been missed while it was not listening.
+    """
+    global _listener, _listener_pid
+    with _lock:
+        if _listener is not None and _listener_pid != os.getpid():
+            # Forked: the parent's listener and subscriptions are gone
+            _subscribers.clear()
+            _listener = None
+        _subscribers.setdefault(channel, []).append((handler, on_reset))
+        if _listener is None:
+            _listening.clear()
+            _listener = threading.Thread(target=_listen, name='redis-pubsub', daemon=True)
+            _listener_pid = os.getpid()
+            _listener.start()
+
+
+def is_listening():
+    """
+    Returns whether this process is currently subscribed and receiving messages.
+    """
+    return _listener_pid == os.getpid() and _listening.is_set()
+
+
+def _listen():
+    delay = RECONNECT_DELAY
+    while True:
+        pubsub = None
+        try:
+            pubsub = get_connection().pubsub(ignore_subscribe_messages=True)
+            subscribed = set()
+            last_activity = time.monotonic()
+            while True:
+                with _lock:
+                    channels = {channel: list(entries) for channel, entries in _subscribers.items()}
+                new_channels = channels.keys() - subscribed
+                if new_channels:
+                    pubsub.subscribe(*new_channels)
+                    subscribed |= new_channels
+                    _reset(entries for channel in new_channels for entries in channels[channel])
+                    _listening.set()
+                    delay = RECONNECT_DELAY
+
+                message = pubsub.get_message(timeout=POLL_INTERVAL)
+                if message is not None:
+                    last_activity = time.monotonic()
+                    if message['type'] == 'message':
+                        _dispatch(channels, message)
+                elif time.monotonic() - last_activity > PING_INTERVAL:
+                    pubsub.ping()
+                    last_activity = time.monotonic()
+        except Exception as e:
+            _listening.clear()
+            print(f'Redis pub/sub connection lost ({e}), reconnecting in {delay:.1f}s')
+            # Whatever was built from messages can no longer be trusted
+            with _lock:
+                entries = [entry for channel_entries in _subscribers.values() for entry in channel_entries]
+            _reset(entries)
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+        time.sleep(delay)
+        delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+
+def _dispatch(channels, message):
+    channel = message['channel']
+    data = message['data']
+    if isinstance(channel, bytes):
+        channel = channel.decode()
+    if isinstance(data, bytes):
+        data = data.decode()
+    for handler, _ in channels.get(channel, ()):
+        try:
+            handler(data)
+        except Exception as e:
+            print(f'Handler of the {channel} pub/sub channel failed: {e!r}')
+
+
+def _reset(entries):
+    for _, on_reset in entries:
+        if on_reset is not None:
+            try:
+                on_reset()
+            except Exception as e:
+                print(f'Pub/sub reset callback failed: {e!r}')
@@ -0,0 +1,120 @@
+"""
+Query budget assertions shared by the test suites of every app.
+
+Each app's tests.py declares how many SQL queries each of its endpoints may issue (its "budget") and checks
+two things per endpoint:
+
+- the endpoint stays within its budget, with a cold cache so that the database path is what gets measured;
+- the query count does not grow with the number of rows: the endpoint is called once, more rows are seeded,
+  and the second call must issue exactly as many queries as the first. This is what catches a serializer
+  reading a relation that the queryset did not select_related (one query per row).
+
+Every route registered on an app's router must have a budget, so that a new endpoint cannot slip in untested.
+
+Run with: python manage.py test --settings=backend.test_settings
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+
+def create_user(email, password='Passw0rd!', **fields):
+    """
+    Creates a user with a usable password.
+
+    Args:
+    - email (str): The user's email, also their login.
+    - password (str): The raw password. The default one passes the login serializer's complexity rules.
+    - fields: Any other User field (first_name, roles...).
+
+    Returns:
+    - User: The saved user.
+    """
+    fields.setdefault('first_name', 'Ama')
+    fields.setdefault('last_name', 'Mensah')
+    user = get_user_model()(email=email, **fields)
+    user.set_password(password)
+    user.save()
+    return user
+
+
+class QueryBudgetTestCase(APITestCase):
+    """
+    APITestCase with query budget assertions.
+
+    Attributes:
+    - query_budgets (dict): URL pattern name -> maximum number of queries, for the routes of the app under test.
+    """
+    query_budgets = {}
+
+    def count_queries(self, make_request, expected_status=None):
+        """
+        Calls an endpoint with a cold cache and counts the SQL queries it issues.
+
+        Args:
+        - make_request (callable): Performs the request through self.client and returns the response.
+        - expected_status (int): Status code the response must have. Any status below 400 when omitted.
+
+        Returns:
+        - tuple: (number of queries, response).
+        """
+        cache.clear()
+        with CaptureQueriesContext(connection) as captured:
+            response = make_request()
+        if expected_status is None:
+            self.assertLess(response.status_code, 400, getattr(response, 'data', response.content))
+        else:
+            self.assertEqual(response.status_code, expected_status, getattr(response, 'data', response.content))
+        # Tests run inside a transaction, where every atomic block is a savepoint. In production, an endpoint's
+        # outermost atomic block begins and commits a transaction without any query, so savepoints are not counted
+        queries = [query for query in captured.captured_queries if not _is_savepoint(query['sql'])]
+        return len(queries), response
+
+    def assertWithinBudget(self, route_name, make_request, expected_status=None):
+        """
+        Asserts that an endpoint issues at most the number of queries budgeted for its route.
+
+        Returns:
+        - Response: The endpoint's response.
+        """
+        queries, response = self.count_queries(make_request, expected_status)
+        budget = self.query_budgets[route_name]
+        self.assertLessEqual(queries, budget, f'{route_name} issued {queries} queries, its budget is {budget}')
+        return response
+
+    def assertQueriesDoNotGrow(self, route_name, make_request, add_rows, expected_status=None):
+        """
+        Asserts that an endpoint issues the same number of queries before and after add_rows() seeds more data,
+        and that this number is within the route's budget.
+
+        Args:
+        - route_name (str): The URL pattern name, key of query_budgets.
+        - make_request (callable): Performs the request through self.client and returns the response.
+        - add_rows (callable): Seeds more rows of whatever the endpoint returns.
+        - expected_status (int): Status code the responses must have.
+        """
+        before, _ = self.count_queries(make_request, expected_status)
+        add_rows()
+        after, _ = self.count_queries(make_request, expected_status)
+        self.assertEqual(before, after, f'{route_name} issued {before} queries, then {after} with more rows')
+        budget = self.query_budgets[route_name]
+        self.assertLessEqual(after, budget, f'{route_name} issued {after} queries, its budget is {budget}')
+
+    def assertEveryRouteBudgeted(self, urlpatterns):
+        """
+        Asserts that every named route of a router (or URL list) has a query budget.
+
+        Args:
+        - urlpatterns (list): The URL patterns, e.g. router.urls.
+        """
+        names = {pattern.name for pattern in urlpatterns if getattr(pattern, 'name', None)}
+        # The router's browsable API root lists links only and never touches the database
+        names.discard('api-root')
+        missing = sorted(names - set(self.query_budgets))
+        self.assertFalse(missing, f'Routes without a query budget: {missing}')
+
+
+def _is_savepoint(sql):
+    return sql.startswith(('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT'))
@@ -1,3 +1,632 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.cache.backends.locmem import LocMemCache
+from asgiref.sync import iscoroutinefunction
+from django.test import AsyncClient, SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import metrics, permissions
+from .AWS import cloud_watch_utils, cloudwatch_activity_logging
+from .AWS.cloudwatch_shipper import MAX_BATCH_BYTES, MAX_BATCH_SPAN_MS, CloudWatchLogShipper, split_into_batches
+from .cache_backends import CacheMetricsMixin, LocalTier, LocalTierMixin
+from .log_sinks import CloudWatchSink, JsonlFileSink, MemorySink, StdoutSink, get_log_sink
+from .management.commands.profile_startup import parse_importtime
+from .middleware import RequestMetricsMiddleware, UserAgentMiddleware
+from .testing import QueryBudgetTestCase, create_user
+from .utils import cache_user_details
+from .urls import urlpatterns
+
+
+class AdminQueryBudgetTests(QueryBudgetTestCase):
+    """
+    Query budgets of the admin endpoints.
+    """
+    query_budgets = {
+        'admin-action-checker': 0,
+        'user-list': 2,  # page + count
+        'user-detail': 1,
+    }
+
+    def setUp(self):
+        self.admin = create_user('admin@example.com', roles='admin', is_staff=True)
+        self.client.force_authenticate(self.admin)
+
+    def add_users(self, count=10):
+        for index in range(count):
+            create_user(f'user{index}@example.com')
+
+    def test_every_route_has_a_budget(self):
+        self.assertEveryRouteBudgeted(urlpatterns)
+
+    def test_admin_check(self):
+        self.assertWithinBudget('admin-action-checker', lambda: self.client.post(reverse('admin-action-checker')))
+
+    def test_user_list(self):
+        self.assertQueriesDoNotGrow('user-list', lambda: self.client.get(reverse('user-list')), self.add_users)
+
+    def test_user_detail(self):
+        self.assertWithinBudget('user-detail', lambda: self.client.get(reverse('user-detail', args=[self.admin.pk])))
+
+
+class AdminCheckTests(QueryBudgetTestCase):
+    def setUp(self):
+        self.admin = create_user('admin@example.com', roles='admin', is_staff=True)
+        cache.clear()
+        cache_user_details(self.admin)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}')
+        patcher = mock.patch('custom_admin.permissions._ensure_flusher')
+        self.ensure_flusher = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(permissions._denials.clear)
+
+    def test_checked_without_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('admin-action-checker'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_role_change_applies_to_the_next_check(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.admin.roles = 'user'
+            self.admin.save()
+        self.assertEqual(self.client.post(reverse('admin-action-checker')).status_code, 403)
+
+    def deny(self, count):
+        for _ in range(count):
+            self.assertEqual(self.client.post(reverse('admin-action-checker')).status_code, 403)
+
+    @mock.patch('custom_admin.permissions.log_authentication_issue')
+    def test_a_burst_of_denials_is_logged_once(self, log):
+        self.admin.roles = 'user'
+        self.admin.save()
+        self.deny(5)
+        self.assertEqual(log.call_count, 0)
+        self.ensure_flusher.assert_called_once()
+        # Not over yet
+        permissions._flush_denials(time.time())
+        self.assertEqual(log.call_count, 0)
+        # The flusher thread's pass after the window
+        permissions._flush_denials(time.time() + settings.ADMIN_DENIAL_LOG_WINDOW)
+        self.assertEqual(log.call_count, 1)
+        self.assertEqual(log.call_args.kwargs['details']['denials'], 5)
+        self.assertEqual(permissions._denials, {})
+
+    @mock.patch('custom_admin.permissions.log_authentication_issue')
+    def test_the_next_burst_logs_the_previous_one(self, log):
+        self.admin.roles = 'user'
+        self.admin.save()
+        self.deny(3)
+        with mock.patch('custom_admin.permissions.time.time', return_value=time.time() + settings.ADMIN_DENIAL_LOG_WINDOW):
+            self.deny(2)
+        self.assertEqual(log.call_count, 1)
+        self.assertEqual(log.call_args.kwargs['details']['denials'], 3)
+        self.assertEqual(list(permissions._denials.values())[0]['denials'], 2)
+
+
+class TwoTierLocMemCache(LocalTierMixin, LocMemCache):
+    """
+    The local tier in front of a local memory cache standing for Redis. Every instance plays a separate process
+    with its own tier. Invalidations are delivered to every tier right away, as pub/sub would.
+    """
+    tiers = []
+
+    def __init__(self, location, params):
+        super().__init__(location, params)
+        self.tier = LocalTier(max_entries=3, timeouts={'catalog': 60, 'user': 60})
+        self.tiers.append(self.tier)
+
+    def get_local_tier(self):
+        return self.tier
+
+    def publish_invalidation(self, message):
+        for tier in self.tiers:
+            tier.invalidate(message)
+
+
+@override_settings(LOCAL_CACHE_NAMESPACES={'catalog': 60, 'user': 60})
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch('custom_admin.redis_pubsub.is_listening', return_value=True)
+        self.is_listening = patcher.start()
+        self.addCleanup(patcher.stop)
+        TwoTierLocMemCache.tiers = []
+        self.first = TwoTierLocMemCache('two-tier-tests', {})
+        self.second = TwoTierLocMemCache('two-tier-tests', {})
+        self.first.clear()
+        metrics.reset()
+
+    def count(self, name, **labels):
+        return metrics._counters.get((name, tuple(labels.items())), 0)
+
+    def test_reads_are_served_locally(self):
+        self.first.set('catalog:version', 1)
+        self.assertEqual(self.second.get('catalog:version'), 1)
+        with mock.patch.object(LocMemCache, 'get') as get:
+            self.assertEqual(self.second.get('catalog:version'), 1)
+        get.assert_not_called()
+        self.assertEqual(self.count('local_cache_requests_total', namespace='catalog', result='hit'), 1)
+
+    def test_writes_invalidate_every_process(self):
+        self.first.set('catalog:version', 1)
+        self.first.get('catalog:version')
+        self.second.get('catalog:version')
+        self.second.incr('catalog:version')
+        self.assertEqual(self.first.get('catalog:version'), 2)
+        self.second.delete('catalog:version')
+        self.assertIsNone(self.first.get('catalog:version'))
+
+    def test_other_namespaces_are_not_kept(self):
+        self.first.set('cart_1_items', [1])
+        self.first.get('cart_1_items')
+        self.assertEqual(len(self.first.tier), 0)
+
+    def test_rebuild_locks_are_not_kept_nor_announced(self):
+        with mock.patch.object(self.first, 'publish_invalidation') as publish_invalidation:
+            self.assertTrue(self.first.add('catalog:1:products:list:abc:lock', 1))
+            self.assertFalse(self.first.add('catalog:1:products:list:abc:lock', 1))
+            self.first.delete('catalog:1:products:list:abc:lock')
+        publish_invalidation.assert_not_called()
+        self.assertEqual(len(self.first.tier), 0)
+
+    def test_not_kept_while_not_subscribed(self):
+        self.is_listening.return_value = False
+        self.first.set('user_1_details', {'first_name': 'Ama'})
+        self.assertEqual(self.first.get('user_1_details'), {'first_name': 'Ama'})
+        self.assertEqual(len(self.first.tier), 0)
+
+    def test_values_are_copies(self):
+        self.first.set('user_1_details', {'roles': 'customer'})
+        self.first.get('user_1_details')['roles'] = 'admin'
+        self.assertEqual(self.first.get('user_1_details'), {'roles': 'customer'})
+
+    def test_get_many(self):
+        self.first.set_many({'catalog:version': 1, 'cart_1_items': [1]})
+        self.first.get('catalog:version')
+        self.assertEqual(self.first.get_many(['catalog:version', 'cart_1_items']), {'catalog:version': 1, 'cart_1_items': [1]})
+
+    def test_least_recently_used_entries_are_evicted(self):
+        for index in range(4):
+            self.first.set(f'user_{index}_details', index)
+        for index in range(4):
+            self.first.get(f'user_{index}_details')
+        self.assertEqual(len(self.first.tier), 3)
+        self.assertEqual(self.count('local_cache_evictions_total', namespace='user', reason='capacity'), 1)
+
+    def test_entries_expire(self):
+        tier = LocalTier(max_entries=10, timeouts={'catalog': 60})
+        with mock.patch('custom_admin.cache_backends.time.monotonic', return_value=1000):
+            tier.set('key', 'catalog', 'value', tier.generation)
+        with mock.patch('custom_admin.cache_backends.time.monotonic', return_value=1061):
+            self.assertEqual(tier.get('key', 'catalog'), (False, None))
+
+    def test_value_read_during_an_invalidation_is_not_kept(self):
+        tier = LocalTier(max_entries=10, timeouts={'catalog': 60})
+        generation = tier.generation
+        tier.invalidate('key')  # Received while the old value was being read from Redis
+        tier.set('key', 'catalog', 'old value', generation)
+        self.assertEqual(tier.get('key', 'catalog'), (False, None))
+
+
+class AsyncMiddlewareTests(QueryBudgetTestCase):
+    """
+    Under ASGI the middleware stays async, so that the async views run on the event loop.
+    """
+    def setUp(self):
+        from products.tests import create_products
+
+        create_products(1)
+        cache.clear()
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_middleware_adapts_to_the_handler(self):
+        async def get_response(request):
+            pass
+
+        for middleware_class in (RequestMetricsMiddleware, UserAgentMiddleware):
+            self.assertTrue(iscoroutinefunction(middleware_class(get_response)))
+            self.assertFalse(iscoroutinefunction(middleware_class(lambda request: None)))
+
+    async def test_queries_of_async_views_are_recorded(self):
+        response = await AsyncClient().get('/async/products/products_viewsets/1/')
+        self.assertEqual(response.status_code, 200)
+        queries = {
+            dict(labels)['route']: histogram.sum
+            for (name, labels), histogram in metrics._histograms.items() if name == 'db_queries_per_request'
+        }
+        self.assertEqual(queries, {'async/products/products_viewsets/<str:pk>/': 1})
+
+
+def log_event(timestamp, message='event'):
+    return {'timestamp': timestamp, 'message': message}
+
+
+class SplitIntoBatchesTests(SimpleTestCase):
+    """
+    Batches of split_into_batches() fit in one put_log_events call each.
+    """
+    def test_sorted_chronologically(self):
+        batches = split_into_batches([log_event(3), log_event(1), log_event(2)])
+        self.assertEqual(batches, [[log_event(1), log_event(2), log_event(3)]])
+
+    def test_event_limit(self):
+        batches = split_into_batches([log_event(timestamp) for timestamp in range(10001)])
+        self.assertEqual([len(batch) for batch in batches], [10000, 1])
+
+    def test_size_limit(self):
+        # Two of these messages with their overhead go over the limit, one does not
+        message = 'x' * (MAX_BATCH_BYTES // 2)
+        batches = split_into_batches([log_event(1, message), log_event(2, message), log_event(3)])
+        self.assertEqual([len(batch) for batch in batches], [1, 2])
+
+    def test_span_limit(self):
+        batches = split_into_batches([log_event(0), log_event(MAX_BATCH_SPAN_MS - 1), log_event(MAX_BATCH_SPAN_MS)])
+        self.assertEqual([len(batch) for batch in batches], [2, 1])
+
+
+class ClientError(Exception):
+    def __init__(self, expected_token):
+        super().__init__(f'Expected {expected_token}')
+        self.response = {'expectedSequenceToken': expected_token}
+
+
+class FakeLogsClient:
+    """
+    Stands for the boto3 CloudWatch Logs client. put_log_events answers with the given responses in turn, raising
+    those that are exceptions.
+    """
+    class exceptions:
+        class InvalidSequenceTokenException(ClientError):
+            pass
+
+        class DataAlreadyAcceptedException(ClientError):
+            pass
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def describe_log_streams(self, logGroupName, logStreamNamePrefix):
+        return {'logStreams': [{'logStreamName': logStreamNamePrefix, 'uploadSequenceToken': 'token-0'}]}
+
+    def put_log_events(self, **params):
+        self.calls.append(params)
+        response = self.responses.pop(0) if self.responses else {'nextSequenceToken': f'token-{len(self.calls)}'}
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class CloudWatchLogShipperTests(SimpleTestCase):
+    """
+    Sending and retries of the background log shipper.
+    """
+    def ship(self, client, *batches):
+        shipper = CloudWatchLogShipper(lambda: client)
+        for batch in batches:
+            shipper._send_pending({('group', 'stream'): batch})
+        return [(call.get('sequenceToken'), call['logEvents']) for call in client.calls]
+
+    def test_events_are_flushed_per_stream(self):
+        client = FakeLogsClient()
+        shipper = CloudWatchLogShipper(lambda: client, flush_interval=60)
+        shipper.enqueue('group', 'first', log_event(2))
+        shipper.enqueue('group', 'second', log_event(3))
+        shipper.enqueue('group', 'first', log_event(1))
+        shipper.flush()
+
+        sent = {call['logStreamName']: call['logEvents'] for call in client.calls}
+        self.assertEqual(sent, {'first': [log_event(1), log_event(2)], 'second': [log_event(3)]})
+
+    def test_sequence_token_is_followed(self):
+        client = FakeLogsClient()
+        calls = self.ship(client, [log_event(1)], [log_event(2)])
+        self.assertEqual(calls, [('token-0', [log_event(1)]), ('token-1', [log_event(2)])])
+
+    def test_invalid_sequence_token_is_retried(self):
+        client = FakeLogsClient(FakeLogsClient.exceptions.InvalidSequenceTokenException('token-7'))
+        calls = self.ship(client, [log_event(1)])
+        self.assertEqual(calls, [('token-0', [log_event(1)]), ('token-7', [log_event(1)])])
+
+    def test_already_accepted_batch_is_not_sent_again(self):
+        client = FakeLogsClient(FakeLogsClient.exceptions.DataAlreadyAcceptedException('token-7'), {})
+        calls = self.ship(client, [log_event(1)], [log_event(2)])
+        self.assertEqual(calls, [('token-0', [log_event(1)]), ('token-7', [log_event(2)])])
+
+    @mock.patch('builtins.print')
+    def test_worker_survives_a_failure(self, print):
+        client = FakeLogsClient()
+        shipper = CloudWatchLogShipper(lambda: client, flush_interval=60)
+        shipper.enqueue('group', 'stream', {'timestamp': 1})  # No message: cannot be batched
+        shipper.flush()
+        print.assert_called_once()
+        shipper.enqueue('group', 'stream', log_event(2))
+        shipper.flush()
+        self.assertTrue(shipper._thread.is_alive())
+        self.assertEqual([call['logEvents'] for call in client.calls], [[log_event(2)]])
+
+    @mock.patch('builtins.print')
+    def test_dead_worker_is_restarted(self, print):
+        client = FakeLogsClient()
+        shipper = CloudWatchLogShipper(lambda: client, flush_interval=60)
+        shipper.enqueue('group', 'stream', log_event(1))
+        shipper.flush()
+        dead = threading.Thread(target=lambda: None)
+        dead.start()
+        dead.join()
+        shipper._thread = dead
+        shipper.enqueue('group', 'stream', log_event(2))
+        shipper.flush()
+        self.assertIsNot(shipper._thread, dead)
+        self.assertEqual([call['logEvents'] for call in client.calls], [[log_event(1)], [log_event(2)]])
+
+    @mock.patch('builtins.print')
+    def test_batch_is_dropped_after_a_second_failure(self, print):
+        client = FakeLogsClient(
+            FakeLogsClient.exceptions.InvalidSequenceTokenException('token-7'),
+            FakeLogsClient.exceptions.InvalidSequenceTokenException('token-8'),
+        )
+        calls = self.ship(client, [log_event(1)], [log_event(2)])
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(calls[2], ('token-8', [log_event(2)]))
+        print.assert_called_once()
+
+
+class AWSClientTests(SimpleTestCase):
+    """
+    boto3 clients are created on first use, once per process.
+    """
+    def setUp(self):
+        for patcher in (
+            mock.patch.dict(cloud_watch_utils._clients, clear=True),
+            mock.patch.object(cloud_watch_utils, '_initialized_log_groups', set()),
+            mock.patch('boto3.client', side_effect=lambda *args, **kwargs: mock.Mock()),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_created_once_and_shared_between_threads(self):
+        import boto3
+
+        barrier = threading.Barrier(8)
+        clients = []
+
+        def get_client():
+            barrier.wait()
+            clients.append(cloud_watch_utils.get_aws_client('s3'))
+
+        threads = [threading.Thread(target=get_client) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(boto3.client.call_count, 1)
+        self.assertEqual(len({id(client) for client in clients}), 1)
+
+    def test_recreated_in_a_forked_process(self):
+        client = cloud_watch_utils.get_aws_client('s3')
+        with mock.patch.object(cloud_watch_utils, '_pid', -1):
+            self.assertIsNot(cloud_watch_utils.get_aws_client('s3'), client)
+
+    def test_log_group_is_set_up_once(self):
+        client = cloud_watch_utils.initialize_cloudwatch('group', ['first', 'second'])
+        self.assertIs(cloud_watch_utils.initialize_cloudwatch('group', ['first', 'second']), client)
+        client.create_log_group.assert_called_once_with(logGroupName='group')
+        self.assertEqual(client.create_log_stream.call_count, 2)
+
+
+IMPORTTIME_OUTPUT = """\
+import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   encodings.utf_8
+import time:      3000 |       9000 | django.db.models
+import time:      1500 |       1500 |   custom_admin.metrics
+"""
+
+
+class ProfileStartupTests(SimpleTestCase):
+    """
+    The profile_startup command.
+    """
+    def test_parse_importtime(self):
+        self.assertEqual(parse_importtime(IMPORTTIME_OUTPUT), [
+            {'module': 'encodings.utf_8', 'self_us': 120, 'cumulative_us': 120},
+            {'module': 'django.db.models', 'self_us': 3000, 'cumulative_us': 9000},
+            {'module': 'custom_admin.metrics', 'self_us': 1500, 'cumulative_us': 1500},
+        ])
+
+    def profile(self, *args, returncode=0):
+        output = StringIO()
+        result = subprocess.CompletedProcess([], returncode, stdout='', stderr=IMPORTTIME_OUTPUT)
+        with mock.patch('subprocess.run', return_value=result) as run:
+            call_command('profile_startup', *args, stdout=output)
+        self.assertIn('importtime', run.call_args.args[0])
+        return output.getvalue().splitlines()
+
+    def test_slowest_modules_first(self):
+        lines = self.profile('--top', '2')
+        self.assertEqual([line.split()[-1] for line in lines[1:3]], ['django.db.models', 'custom_admin.metrics'])
+        self.assertTrue(lines[-1].startswith('Total startup time'))
+
+        lines = self.profile('--sort', 'self', '--filter', 'custom_admin')
+        self.assertEqual([line.split()[-1] for line in lines[1:-1]], ['custom_admin.metrics'])
+
+    def test_failures(self):
+        with self.assertRaisesMessage(CommandError, 'above the 0ms limit'):
+            self.profile('--max-ms', '0')
+        with self.assertRaisesMessage(CommandError, 'Startup failed'):
+            self.profile(returncode=1)
+
+
+class LogSinkTests(SimpleTestCase):
+    """
+    Selection of the log sinks and what they write.
+    """
+    def test_sink_selection(self):
+        client_factory = mock.Mock()
+        sinks = {
+            'memory': ({'capacity': 2}, MemorySink),
+            'stdout': ({}, StdoutSink),
+            'custom_admin.log_sinks.StdoutSink': ({}, StdoutSink),
+            'cloudwatch': ({}, CloudWatchSink),
+            'file': ({'flush_interval': 3600}, JsonlFileSink),
+        }
+        for backend, (options, sink_class) in sinks.items():
+            with self.subTest(backend=backend):
+                with self.settings(LOG_SINKS={'activity': {'BACKEND': backend, 'OPTIONS': options}}):
+                    sink = get_log_sink('activity', cloudwatch_client_factory=client_factory)
+                self.assertIsInstance(sink, sink_class)
+
+        with self.settings(LOG_SINKS={'activity': {'BACKEND': 'cloudwatch'}}):
+            self.assertIs(get_log_sink('activity', cloudwatch_client_factory=client_factory).shipper.client_factory, client_factory)
+        with self.settings(LOG_SINKS={'activity': {'BACKEND': 'file'}}):
+            self.assertTrue(get_log_sink('activity').path_template.endswith(os.path.join('logs', 'activity-{pid}.jsonl')))
+
+    def test_memory_sink_keeps_the_latest_events(self):
+        sink = MemorySink(capacity=2)
+        for index in range(3):
+            sink.emit('group', 'even' if index % 2 == 0 else 'odd', log_event(index, json.dumps({'index': index})))
+        self.assertEqual(sink.messages(), [{'index': 1}, {'index': 2}])
+        self.assertEqual(sink.messages('even'), [{'index': 2}])
+
+    def test_file_sink_buffers_and_rotates(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        sink = JsonlFileSink(
+            os.path.join(directory, 'activity-{pid}.jsonl'), max_bytes=300, backup_count=2, buffer_size=200,
+            flush_interval=3600,
+        )
+        message = json.dumps({'action_type': 'Login'})
+        sink.emit('group', 'stream', log_event(1, message))
+        self.assertFalse(os.path.exists(sink.path))  # Buffered
+        sink.flush()
+        with open(sink.path) as file:
+            self.assertEqual(json.loads(file.read()), {
+                'log_group': 'group', 'log_stream': 'stream', 'timestamp': 1, 'event': {'action_type': 'Login'},
+            })
+
+        for timestamp in range(2, 6):
+            sink.emit('group', 'stream', log_event(timestamp, message))
+        sink.flush()
+        # A write of three events once the buffer was full, then the last one, each over the size limit
+        timestamps = []
+        for path in (f'{sink.path}.2', f'{sink.path}.1', sink.path):
+            with open(path) as file:
+                timestamps.append([json.loads(line)['timestamp'] for line in file])
+        self.assertEqual(timestamps, [[1], [2, 3, 4], [5]])
+
+    def test_events_reach_the_sink(self):
+        sink = MemorySink()
+        with mock.patch.object(cloudwatch_activity_logging, 'log_sink', sink):
+            cloudwatch_activity_logging.log_to_cloudwatch('group', 'Admin Actions', action_type='Login', details={'id': 1})
+        (log_group, log_stream, event), = sink.events
+        self.assertEqual((log_group, log_stream), ('group', 'Admin Actions'))
+        self.assertEqual(json.loads(event['message'])['details'], {'id': 1})
+
+
+class MetricsRenderingTests(SimpleTestCase):
+    """
+    The Prometheus text rendering of the metrics registry.
+    """
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_counters_and_histograms(self):
+        metrics.increment('http_requests_total', (('route', 'products/'), ('status', '200')))
+        metrics.increment('http_requests_total', (('route', 'products/'), ('status', '200')), 2)
+        metrics.observe('db_queries_per_request', 2, (('route', 'products/'),), buckets=(1, 5))
+        metrics.observe('db_queries_per_request', 7, (('route', 'products/'),), buckets=(1, 5))
+
+        self.assertEqual(metrics.render_prometheus().splitlines(), [
+            '# HELP http_requests_total HTTP requests handled, per route, method and status code.',
+            '# TYPE http_requests_total counter',
+            'http_requests_total{route="products/",status="200"} 3',
+            '# HELP db_queries_per_request SQL queries issued by one HTTP request, per route.',
+            '# TYPE db_queries_per_request histogram',
+            'db_queries_per_request_bucket{route="products/",le="1"} 0',
+            'db_queries_per_request_bucket{route="products/",le="5"} 1',
+            'db_queries_per_request_bucket{route="products/",le="+Inf"} 2',
+            'db_queries_per_request_sum{route="products/"} 9',
+            'db_queries_per_request_count{route="products/"} 2',
+        ])
+
+    def test_label_values_are_escaped(self):
+        metrics.increment('unknown_total', (('route', 'a"b\\c\nd'),))
+        self.assertEqual(metrics.render_prometheus().splitlines(), [
+            '# TYPE unknown_total counter',
+            'unknown_total{route="a\\"b\\\\c\\nd"} 1',
+        ])
+
+    @override_settings(METRICS_TOKEN='')
+    def test_endpoint_is_disabled_without_a_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 404)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_endpoint_needs_the_token(self):
+        self.assertEqual(self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        metrics.increment('http_requests_total')
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertIn('http_requests_total 1', response.content.decode())
+
+
+class InstrumentedLocMemCache(CacheMetricsMixin, LocMemCache):
+    """
+    A local memory cache counting its hits and misses like the Redis backends of the deployment.
+    """
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'custom_admin.tests.InstrumentedLocMemCache'}})
+class RequestMetricsTests(QueryBudgetTestCase):
+    """
+    What RequestMetricsMiddleware records per route.
+    """
+    route = (('route', 'products/products_viewsets/(?P<pk>[^/.]+)/$'),)
+
+    def setUp(self):
+        from products.tests import create_products
+
+        create_products(1)
+        cache.clear()
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_requests_are_recorded_per_route(self):
+        self.client.get(reverse('product-detail', args=[1]))
+        self.client.get(reverse('product-detail', args=[1]))
+        self.client.get(reverse('product-detail', args=[999]))
+        self.client.get('/no/such/page/')
+
+        self.assertEqual(metrics._counters[('http_requests_total', self.route + (('method', 'GET'), ('status', '200')))], 2)
+        self.assertEqual(metrics._counters[('http_requests_total', self.route + (('method', 'GET'), ('status', '404')))], 1)
+        self.assertEqual(
+            metrics._counters[('http_requests_total', (('route', 'unmatched'), ('method', 'GET'), ('status', '404')))], 1
+        )
+        self.assertEqual(metrics._histograms[('http_request_duration_seconds', self.route + (('method', 'GET'),))].count, 3)
+
+    def test_queries_and_cache_lookups(self):
+        self.client.get(reverse('product-detail', args=[1]))
+        queries = metrics._histograms[('db_queries_per_request', self.route)]
+        self.assertEqual((queries.count, queries.sum), (1, 1))
+        self.assertIn(('http_request_cache_requests_total', self.route + (('result', 'miss'),)), metrics._counters)
+
+        # Served from the cache: no query and only hits
+        metrics.reset()
+        self.client.get(reverse('product-detail', args=[1]))
+        self.assertEqual(metrics._histograms[('db_queries_per_request', self.route)].sum, 0)
+        self.assertNotIn(('http_request_cache_requests_total', self.route + (('result', 'miss'),)), metrics._counters)
+        self.assertGreater(metrics._counters[('http_request_cache_requests_total', self.route + (('result', 'hit'),))], 0)
+        self.assertGreater(metrics._counters[('cache_requests_total', (('namespace', 'catalog'), ('result', 'hit')))], 0)
@@ -1,6 +1,20 @@
-from django.http import HttpResponse
+from functools import wraps
+
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import DEFERRED
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+
+# User fields kept in the cached user details, enough to authenticate a request and check its permissions
+# without loading the user (see get_cached_user)
+USER_DETAIL_FIELDS = (
+    'first_name', 'last_name', 'email', 'phone_number', 'preferred_language', 'roles', 'last_updated',
+    'is_active', 'is_superuser', 'is_staff', 'is_locked',
+)
 
 def set_token_cookies(response: HttpResponse, access_token: str, refresh_token: str):
     """
@@ -53,15 +67,7 @@ def cache_user_details(user):
     - user (User): The user whose details are to be cached.
     """
     cache_key = build_cache_key(user.pk)
-    user_details = {
-        'first_name': user.first_name,
-        'last_name': user.last_name,
-        'email': user.email,
-        'phone_number': user.phone_number,
-        'preferred_language': user.preferred_language,
-        'roles': user.roles,
-        'last_updated': user.last_updated
-    }
+    user_details = {field: getattr(user, field) for field in USER_DETAIL_FIELDS}
     cache.set(cache_key, user_details, timeout=60 * 60 * 24)
 
 def get_cached_user_details(user_id: int):
@@ -86,3 +92,73 @@ def delete_cached_user_details(user_id: int):
     """
     cache_key = build_cache_key(user_id)
     cache.delete(cache_key)
+
+def get_cached_user(user_id):
+    """
+    Builds a user from their cached details, without querying the database.
+
+    The user behaves like one loaded with .only(*USER_DETAIL_FIELDS): reading any other field (the password
+    for example) loads it with a query.
+
+    Args:
+    - user_id: The ID of the user, e.g. from the user_id claim of their token.
+
+    Returns:
+    - User or None: The user, or None if their details are not cached.
+    """
+    details = get_cached_user_details(user_id)
+    if details is None:
+        return None
+    User = get_user_model()
+    values = dict(details, **{User._meta.pk.attname: User._meta.pk.to_python(user_id)})
+    field_names = [field.attname for field in User._meta.concrete_fields]
+    return User.from_db(DEFAULT_DB_ALIAS, field_names, [values.get(name, DEFERRED) for name in field_names])
+
+def json_response(data, status=status.HTTP_200_OK):
+    """
+    Renders data to JSON exactly like the DRF views do, for the plain Django views.
+
+    Args:
+    - data: Anything JSONRenderer accepts, e.g. serializer data.
+    - status (int): The response status code.
+
+    Returns:
+    - HttpResponse: The JSON response.
+    """
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status)
+
+def async_api_view(methods, authenticate=None):
+    """
+    Makes a coroutine function an async view behaving like a DRF API view, for the async variants of the busiest
+    endpoints (served by the ASGI deployment, see backend/asgi.py). DRF views cannot be coroutines, and the view
+    decorators of Django 4.2 (require_http_methods...) do not support them either.
+
+    - Requests with any other method get a 405.
+    - With authenticate, request.user is set to the user it returns, and requests without one get a 401.
+    - APIException (ValidationError, AuthenticationFailed...) and Http404 raised by the view become the same
+      JSON error responses as in a DRF view.
+
+    Args:
+    - methods (list of str): The allowed HTTP methods.
+    - authenticate (coroutine function): Called with the request, returns the authenticated user or None.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            if request.method not in methods:
+                return HttpResponseNotAllowed(methods)
+            try:
+                if authenticate is not None:
+                    request.user = await authenticate(request)
+                    if request.user is None:
+                        raise exceptions.NotAuthenticated()
+                return await view(request, *args, **kwargs)
+            except Http404:
+                return json_response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+            except exceptions.APIException as e:
+                detail = e.detail if isinstance(e.detail, (list, dict)) else {'detail': e.detail}
+                return json_response(detail, status=e.status_code)
+        # Token authenticated like the DRF views, which are exempt from CSRF checks too
+        wrapped.csrf_exempt = True
+        return wrapped
+    return decorator
@@ -1,17 +1,21 @@
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
 from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from .permissions import IsAdminUser
-from user.authenticate import CustomAuthentication
+from user.claims import ClaimsAuthentication
+from . import metrics
 
 class AdminOnlyPagesAuthCheckView(APIView):
     """
     A view that checks if the requesting user has administrative privileges.
 
-    Inherits from APIView and uses CustomAuthentication for authentication
-    and IsAdminUser for permission checking.
+    Inherits from APIView and uses ClaimsAuthentication (CustomAuthentication refusing revoked tokens, without a
+    user query) for authentication and IsAdminUser for permission checking.
     """
-    authentication_classes = [CustomAuthentication]
+    authentication_classes = [ClaimsAuthentication]
     permission_classes = [IsAdminUser]
 
     def post(self, request):
@@ -28,3 +32,23 @@ class AdminOnlyPagesAuthCheckView(APIView):
         """
         # The code reaches here only if the user is authenticated and has admin access.
         return Response({'detail': 'You have admin privileges.'}, status=status.HTTP_200_OK)
+
+
+def metrics_view(request):
+    """
+    Serves the metrics of this process in the Prometheus text format (see custom_admin/metrics.py).
+
+    Scrapers authenticate with "Authorization: Bearer <settings.METRICS_TOKEN>". The endpoint answers 404
+    when no token is configured, so that it is never exposed by accident.
+
+    Args:
+    - request: The incoming HTTP request.
+
+    Returns:
+    - HttpResponse: The exposition text, or 403 / 404.
+    """
+    if not settings.METRICS_TOKEN:
+        raise Http404
+    if not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}'):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
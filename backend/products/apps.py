@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'products'
+
+    def ready(self):
+        # Connects the receivers keeping the search index in sync with the catalog
+        from . import signals  # noqa: F401
@@ -0,0 +1,9 @@
+from django.urls import path
+from . import async_views
+
+# Async variants of the busiest catalog endpoints, same paths as the router's under /async/products/
+urlpatterns = [
+    path('products_viewsets/', async_views.product_list, name='async-product-list'),
+    path('products_viewsets/star_eight/', async_views.star_eight, name='async-product-star-eight'),
+    path('products_viewsets/<str:pk>/', async_views.product_detail, name='async-product-detail'),
+]
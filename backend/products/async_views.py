@@ -0,0 +1,124 @@
+"""
+Async variants of the busiest catalog endpoints, for the ASGI deployment (see backend/asgi.py).
+
+They answer exactly like their ProductViewSet counterparts, reuse its filters and share its cache entries (see
+products/cache.py), but use the async ORM and cache: while a request waits on the database or Redis, the worker
+serves other requests instead of blocking a thread. Mounted under /async/products/ (see products/async_urls.py).
+"""
+from math import ceil
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from custom_admin.utils import async_api_view, json_response
+from .cache import abuild_catalog_key, aget_or_build
+from .facets import get_facets
+from .models import Product
+from .pagination import rebase_links
+from .serializers import ProductSerializer
+from .viewsets import CustomPagination, ProductViewSet
+
+
+@async_api_view(['GET', 'HEAD'])
+async def product_list(request):
+    """
+    Async variant of ProductViewSet.list: same filters, pagination modes and facets, same response.
+    """
+    drf_request = Request(request)
+    viewset = ProductViewSet()
+    filters = viewset.get_list_filters(drf_request)
+    params = drf_request.query_params
+
+    async def build():
+        queryset = viewset.get_list_queryset(drf_request, filters)
+
+        if viewset.is_cursor_paginated(params):
+            # The keyset paginator queries synchronously
+            paginator = viewset.cursor_pagination_class()
+            page = await sync_to_async(paginator.paginate_queryset)(queryset, drf_request)
+            data = paginator.get_paginated_response(ProductSerializer(page, many=True).data).data
+        else:
+            data = await paginate(request, queryset)
+
+        if params.get('facets', '').lower() in ('true', '1'):
+            data['facets'] = await sync_to_async(get_facets)(queryset, filters)
+        return data
+
+    key = await abuild_catalog_key('products:list', *viewset.get_list_cache_parts(drf_request, filters))
+    data = await aget_or_build(key, build)
+    return json_response(rebase_links(data, request.build_absolute_uri()))
+
+
+async def paginate(request, queryset):
+    """
+    Page number pagination of CustomPagination, with the async ORM.
+
+    Raises:
+    - NotFound: If the page does not exist (404, like CustomPagination).
+
+    Returns:
+    - dict: "count", "next", "previous" and "results", the response of the paginated list.
+    """
+    page_size = CustomPagination.page_size
+    count = await queryset.acount()
+    last_page = max(ceil(count / page_size), 1)
+
+    page_number = request.GET.get('page', 1)
+    if page_number in CustomPagination.last_page_strings:
+        page_number = last_page
+    try:
+        page_number = int(page_number)
+    except (TypeError, ValueError):
+        raise NotFound(CustomPagination.invalid_page_message)
+    if not 1 <= page_number <= last_page:
+        raise NotFound(CustomPagination.invalid_page_message)
+
+    offset = (page_number - 1) * page_size
+    products = [product async for product in queryset[offset:offset + page_size]]
+
+    url = request.build_absolute_uri()
+    next_link = replace_query_param(url, 'page', page_number + 1) if page_number < last_page else None
+    if page_number == 1:
+        previous_link = None
+    elif page_number == 2:
+        previous_link = remove_query_param(url, 'page')
+    else:
+        previous_link = replace_query_param(url, 'page', page_number - 1)
+
+    return {
+        'count': count,
+        'next': next_link,
+        'previous': previous_link,
+        'results': ProductSerializer(products, many=True).data,
+    }
+
+
+@async_api_view(['GET', 'HEAD'])
+async def product_detail(request, pk):
+    """
+    Async variant of ProductViewSet.retrieve.
+    """
+    async def build():
+        try:
+            product = await Product.objects.select_related('category').aget(pk=pk)
+        except (Product.DoesNotExist, ValueError, TypeError, ValidationError):
+            raise Http404
+        return ProductSerializer(product).data
+
+    return json_response(await aget_or_build(await abuild_catalog_key('products:retrieve', pk), build))
+
+
+@async_api_view(['GET', 'HEAD'])
+async def star_eight(request):
+    """
+    Async variant of ProductViewSet.star_eight.
+    """
+    async def build():
+        queryset = Product.objects.select_related('category').order_by('product_identifier')[:8]
+        return ProductSerializer([product async for product in queryset], many=True).data
+
+    return json_response(await aget_or_build(await abuild_catalog_key('products:star_eight'), build))
@@ -0,0 +1,178 @@
+"""
+Read-through cache for the public catalog endpoints (product list/detail, star_eight, categories).
+
+Keys embed a catalog version number. Any Product or Category save/delete bumps that number (see
+products/signals.py), which makes every previously cached catalog response unreachable at once. Stale
+entries are never deleted one by one, they simply expire.
+
+To avoid a stampede when a hot entry expires, every entry carries a "refresh at" time shortly before its
+real expiry. The first worker to read it past that time takes a short lock and rebuilds it while everybody
+else keeps being served the still valid copy. When an entry is missing altogether, only the lock holder
+queries the database and the other workers wait briefly for its result.
+
+The read functions have async counterparts prefixed with "a" (aget_or_build...) for the async views of the ASGI
+deployment (see products/async_views.py). They use the same keys, so both kinds of views share their entries.
+"""
+import asyncio
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+
+def get_catalog_version():
+    """
+    Returns the current catalog version, initializing it if needed.
+
+    Returns:
+    - int: The catalog version.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Start from the current time rather than 1 so that a version key lost to an eviction or a Redis restart
+        # can never come back with a number that older (possibly stale) entries were cached under.
+        cache.add(CATALOG_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """
+    Invalidates every cached catalog response by moving to a new catalog version.
+    """
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:  # The key does not exist yet
+        get_catalog_version()
+
+
+def build_catalog_key(name, *parts):
+    """
+    Constructs a versioned cache key for a catalog response.
+
+    Args:
+    - name (str): Name of the cached response, e.g. 'products:list'.
+    - parts (str): Whatever identifies the response (primary key, normalized list filters and page...).
+
+    Returns:
+    - str: A cache key string.
+    """
+    return _catalog_key(get_catalog_version(), name, parts)
+
+
+def get_or_build(key, builder, timeout=None):
+    """
+    Returns the cached value for the key, building and caching it with builder() if needed.
+
+    Only one worker at a time rebuilds a given key (see module docstring). Exceptions raised by the builder
+    (Http404 for example) propagate and nothing is cached.
+
+    Args:
+    - key (str): The cache key, usually from build_catalog_key().
+    - builder (callable): Function without arguments computing the value. The value must be picklable.
+    - timeout (int): Lifetime of the entry in seconds. Defaults to settings.CATALOG_CACHE_TIMEOUT.
+
+    Returns:
+    - The cached or freshly built value.
+    """
+    timeout = timeout or settings.CATALOG_CACHE_TIMEOUT
+    lock_key = f'{key}:lock'
+
+    entry = cache.get(key)
+    if entry is not None:
+        refresh_at, value = entry
+        if time.time() < refresh_at or not cache.add(lock_key, 1, timeout=settings.CATALOG_CACHE_LOCK_TIMEOUT):
+            return value
+        # This worker won the lock, refresh the entry before it actually expires
+        return _build_and_store(key, lock_key, builder, timeout)
+
+    if cache.add(lock_key, 1, timeout=settings.CATALOG_CACHE_LOCK_TIMEOUT):
+        return _build_and_store(key, lock_key, builder, timeout)
+
+    # Another worker is rebuilding this entry. Give it a moment rather than piling up on the database.
+    deadline = time.monotonic() + settings.CATALOG_CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[1]
+
+    # The lock holder is too slow or died, build it ourselves.
+    return _build_and_store(key, None, builder, timeout)
+
+
+def _build_and_store(key, lock_key, builder, timeout):
+    try:
+        value = builder()
+        # Refresh during the last tenth of the entry's life
+        refresh_at = time.time() + timeout * 0.9
+        cache.set(key, (refresh_at, value), timeout=timeout)
+        return value
+    finally:
+        if lock_key:
+            cache.delete(lock_key)
+
+
+async def aget_catalog_version():
+    """
+    Async version of get_catalog_version().
+    """
+    version = await cache.aget(CATALOG_VERSION_KEY)
+    if version is None:
+        await cache.aadd(CATALOG_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = await cache.aget(CATALOG_VERSION_KEY)
+    return version
+
+
+async def abuild_catalog_key(name, *parts):
+    """
+    Async version of build_catalog_key().
+    """
+    return _catalog_key(await aget_catalog_version(), name, parts)
+
+
+async def aget_or_build(key, builder, timeout=None):
+    """
+    Async version of get_or_build(). builder is a coroutine function, and a worker waiting for another one's
+    rebuild does not hold a thread while it waits.
+    """
+    timeout = timeout or settings.CATALOG_CACHE_TIMEOUT
+    lock_key = f'{key}:lock'
+
+    entry = await cache.aget(key)
+    if entry is not None:
+        refresh_at, value = entry
+        if time.time() < refresh_at or not await cache.aadd(lock_key, 1, timeout=settings.CATALOG_CACHE_LOCK_TIMEOUT):
+            return value
+        return await _abuild_and_store(key, lock_key, builder, timeout)
+
+    if await cache.aadd(lock_key, 1, timeout=settings.CATALOG_CACHE_LOCK_TIMEOUT):
+        return await _abuild_and_store(key, lock_key, builder, timeout)
+
+    deadline = time.monotonic() + settings.CATALOG_CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        entry = await cache.aget(key)
+        if entry is not None:
+            return entry[1]
+
+    return await _abuild_and_store(key, None, builder, timeout)
+
+
+def _catalog_key(version, name, parts):
+    digest = hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'catalog:{version}:{name}:{digest}'
+
+
+async def _abuild_and_store(key, lock_key, builder, timeout):
+    try:
+        value = await builder()
+        refresh_at = time.time() + timeout * 0.9
+        await cache.aset(key, (refresh_at, value), timeout=timeout)
+        return value
+    finally:
+        if lock_key:
+            await cache.adelete(lock_key)
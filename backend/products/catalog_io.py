@@ -0,0 +1,154 @@
+"""
+File formats of the import_products and export_products management commands.
+
+A catalog file holds one product per row, in CSV (with a header line) or JSON Lines (one object per line), with
+the columns in FIELDS. "category" is the category name. In CSV, tags are separated by TAG_SEPARATOR
+("HOT|NEW"); in JSON Lines they are a list. Files written by export_products can be imported as is.
+"""
+import csv
+import json
+
+from django.core.exceptions import ValidationError
+
+from .models import Category, Product
+from .search import tag_values
+
+# Columns of a catalog file, in order
+FIELDS = (
+    'product_identifier', 'name', 'category', 'price', 'description', 'weight_kg', 'weight_lbs',
+    'default_quantity', 'stock', 'tags', 'image_url',
+)
+
+# Product fields set from a row, "category" aside
+PRODUCT_FIELDS = tuple(field for field in FIELDS if field != 'category')
+
+# Values read from the database by export_products
+EXPORT_VALUES = PRODUCT_FIELDS + ('category__name',)
+
+# Numbers the model accepts negative but a product never has
+NON_NEGATIVE_FIELDS = ('price', 'weight_kg', 'weight_lbs', 'default_quantity', 'stock')
+
+FORMATS = ('csv', 'jsonl')
+
+TAG_SEPARATOR = '|'
+
+
+class RowError(Exception):
+    """
+    Raised for a row that cannot be imported. The message says which fields are wrong.
+    """
+
+
+def guess_format(path, default='csv'):
+    """
+    Returns the format of a file from its extension ('.jsonl' or '.ndjson' for JSON Lines), or the default.
+    """
+    return 'jsonl' if path.lower().endswith(('.jsonl', '.ndjson')) else default
+
+
+def read_rows(file, file_format):
+    """
+    Reads the rows of a catalog file one at a time, so that memory does not depend on the file size.
+
+    Args:
+    - file: A text file object.
+    - file_format (str): 'csv' or 'jsonl'.
+
+    Yields:
+    - tuple: (line number, dict of raw values), or (line number, RowError) for a line that cannot be parsed.
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(file)
+        missing = set(FIELDS) - set(reader.fieldnames or ())
+        if missing:
+            raise RowError(f"Missing columns: {', '.join(sorted(missing))}")
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(file, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, RowError(f'Invalid JSON: {e}')
+                continue
+            if not isinstance(row, dict):
+                yield line_number, RowError('Expected a JSON object')
+                continue
+            yield line_number, row
+
+
+def clean_row(row):
+    """
+    Validates a raw row and converts its values with the model fields' own validation.
+
+    Args:
+    - row (dict): Raw values, strings when read from CSV.
+
+    Raises:
+    - RowError: If a value is missing or invalid.
+
+    Returns:
+    - dict: The product field values, plus "category" (the stripped category name).
+    """
+    cleaned = {}
+    errors = []
+    for name in PRODUCT_FIELDS:
+        field = Product._meta.get_field(name)
+        value = row.get(name)
+        if name == 'tags':
+            value = parse_tags(value)
+        elif isinstance(value, str):
+            value = value.strip()
+
+        if value is None or value == '':
+            if field.has_default():
+                cleaned[name] = field.get_default()
+                continue
+            if not field.blank:
+                errors.append(f'{name}: This field is required.')
+                continue
+        try:
+            cleaned[name] = field.clean(value, None)
+        except ValidationError as e:
+            errors.append(f"{name}: {' '.join(e.messages)}")
+            continue
+        if name in NON_NEGATIVE_FIELDS and cleaned[name] < 0:
+            errors.append(f'{name}: Must not be negative.')
+
+    category = str(row.get('category') or '').strip()
+    max_length = Category._meta.get_field('name').max_length
+    if not category:
+        errors.append('category: This field is required.')
+    elif len(category) > max_length:
+        errors.append(f'category: Ensure this value has at most {max_length} characters.')
+    cleaned['category'] = category
+
+    if errors:
+        raise RowError('; '.join(errors))
+    return cleaned
+
+
+def parse_tags(value):
+    """
+    Returns the tags of a row as a list: split on TAG_SEPARATOR when read from CSV, as is from JSON.
+    """
+    if isinstance(value, str):
+        return [tag.strip() for tag in value.split(TAG_SEPARATOR) if tag.strip()]
+    return tag_values(value)
+
+
+def export_row(values, file_format):
+    """
+    Converts a product, as returned by Product.objects.values(*EXPORT_VALUES), to a catalog file row.
+    """
+    row = {field: values[field] for field in PRODUCT_FIELDS}
+    row['category'] = values['category__name']
+    for field in ('price', 'weight_kg', 'weight_lbs'):
+        row[field] = str(row[field])
+    row['tags'] = tag_values(row['tags'])
+    if file_format == 'csv':
+        row['tags'] = TAG_SEPARATOR.join(row['tags'])
+    return {field: row[field] for field in FIELDS}
+
@@ -0,0 +1,88 @@
+"""
+Facet counts of the product list: how many of the matching products fall in each category, carry each tag
+and fall in each price range. They feed the storefront's category sidebar and price slider.
+
+All three are computed from a single grouped query over the filtered products, grouping by
+(category, tags, price bucket); the per-facet totals are then summed in Python from the few resulting rows.
+Results are cached per normalized filter set (not per page), until the catalog changes.
+"""
+import json
+
+from django.conf import settings
+from django.db.models import Case, Count, IntegerField, Value, When
+
+from .cache import build_catalog_key, get_or_build
+from .models import Product
+from .tags import product_tags
+
+
+def compute_facets(queryset):
+    """
+    Counts the products of a queryset per category, tag and price bucket in one query.
+
+    Args:
+    - queryset (QuerySet): The filtered products. Search results (annotated and grouped) are accepted too.
+
+    Returns:
+    - dict: {"categories": [{"name", "count"}], "tags": [{"tag", "count"}], "price": [{"min", "max", "count"}]}.
+    Categories and tags are sorted by decreasing count then name, price buckets by price. "max" is None
+    for the last price bucket.
+    """
+    if queryset.query.group_by is not None:
+        # Search results are already grouped per product: count them from the outside
+        queryset = Product.objects.filter(pk__in=queryset.values('pk'))
+
+    bounds = settings.PRODUCT_PRICE_FACET_BOUNDS
+    price_bucket = Case(
+        *[When(price__lt=bound, then=Value(index)) for index, bound in enumerate(bounds)],
+        default=Value(len(bounds)),
+        output_field=IntegerField(),
+    )
+    rows = (
+        queryset
+        .order_by()
+        .values('category__name', 'tags', bucket=price_bucket)
+        .annotate(count=Count('pk'))
+    )
+
+    categories = {}
+    tags = {}
+    buckets = [0] * (len(bounds) + 1)
+    for row in rows:
+        categories[row['category__name']] = categories.get(row['category__name'], 0) + row['count']
+        # Normalized like ProductTag, so that every counted tag can be used as a filter as is
+        for tag in product_tags(row['tags']):
+            tags[tag] = tags.get(tag, 0) + row['count']
+        buckets[row['bucket']] += row['count']
+
+    edges = [0, *bounds, None]
+    return {
+        'categories': [
+            {'name': name, 'count': count}
+            for name, count in sorted(categories.items(), key=lambda item: (-item[1], item[0]))
+        ],
+        'tags': [
+            {'tag': tag, 'count': count}
+            for tag, count in sorted(tags.items(), key=lambda item: (-item[1], item[0]))
+        ],
+        'price': [
+            {'min': edges[index], 'max': edges[index + 1], 'count': count}
+            for index, count in enumerate(buckets)
+        ],
+    }
+
+
+def get_facets(queryset, filters):
+    """
+    Returns the facets of the filtered products, from the catalog cache when possible.
+
+    Args:
+    - queryset (QuerySet): The filtered products, only queried on a cache miss.
+    - filters (dict): The normalized filters the queryset was built from. Two requests with the same
+    filters share the cached facets, whatever their page or parameter order.
+
+    Returns:
+    - dict: See compute_facets().
+    """
+    key = build_catalog_key('products:facets', json.dumps(filters, sort_keys=True, default=str))
+    return get_or_build(key, lambda: compute_facets(queryset))
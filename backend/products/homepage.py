@@ -0,0 +1,133 @@
+"""
+Precomputed payload of the homepage endpoint: the star_eight products, every category and the first page of the
+catalog, which the storefront used to fetch with three requests.
+
+The payload is rendered to JSON once and stored as bytes, with its ETag, under a single cache key. Serving it is
+one cache GET and no serialization (see products/views.py). It is rebuilt in the background by the
+rebuild_homepage task whenever the catalog changes (see products/signals.py), rather than invalidated: the
+endpoint keeps serving the previous payload while the new one is computed. A payload built for the current
+catalog version is not rebuilt again, so a burst of changes costs one rebuild, not one per change.
+
+When the payload is missing altogether, only one request builds it, under a short lock, and the others wait
+briefly for its result, like the catalog responses do (see products/cache.py).
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from custom_admin.AWS.cloudwatch_error_logging import log_critical_error
+from .cache import get_catalog_version
+from .models import Category, Product
+from .serializers import CategorySerializer, ProductSerializer
+
+HOMEPAGE_KEY = 'catalog:homepage'
+HOMEPAGE_LOCK_KEY = f'{HOMEPAGE_KEY}:lock'
+
+
+def build_payload():
+    """
+    Computes the homepage data.
+
+    Returns:
+    - dict: "star_eight" (same as the star_eight endpoint), "categories" (same as the category list) and
+    "products" ("count" and "results" of the first page of the product list, without filters).
+    """
+    # viewsets imports the tasks, which import this module
+    from .viewsets import CustomPagination
+
+    products = Product.objects.select_related('category').order_by('name', 'product_identifier')
+    star_eight = Product.objects.select_related('category').order_by('product_identifier')[:8]
+    return {
+        'star_eight': ProductSerializer(star_eight, many=True).data,
+        'categories': CategorySerializer(Category.objects.order_by('name'), many=True).data,
+        'products': {
+            'count': products.count(),
+            'results': ProductSerializer(products[:CustomPagination.page_size], many=True).data,
+        },
+    }
+
+
+def rebuild():
+    """
+    Renders the homepage payload and stores it.
+
+    Returns:
+    - tuple: (ETag, JSON bytes).
+    """
+    # Read the version first: if the catalog changes while building, the payload is marked as older than it is
+    # and the next rebuild is not skipped
+    version = get_catalog_version()
+    body = JSONRenderer().render(build_payload())
+    etag = '"{}"'.format(hashlib.sha256(body).hexdigest()[:32])
+    cache.set(HOMEPAGE_KEY, (version, etag, body), timeout=settings.HOMEPAGE_CACHE_TIMEOUT)
+    return etag, body
+
+
+def rebuild_if_stale():
+    """
+    Rebuilds the homepage payload unless it was already built for the current catalog version.
+
+    Returns:
+    - bool: Whether it was rebuilt.
+    """
+    entry = cache.get(HOMEPAGE_KEY)
+    if entry is not None and entry[0] == get_catalog_version():
+        return False
+    rebuild()
+    return True
+
+
+def get_homepage():
+    """
+    Returns the stored homepage payload, building it on the spot if it is missing (first request after a
+    deployment or a cache flush).
+
+    Returns:
+    - tuple: (ETag, JSON bytes).
+    """
+    entry = cache.get(HOMEPAGE_KEY)
+    if entry is None:
+        return _build_once()
+    return entry[1], entry[2]
+
+
+def _build_once():
+    # Every request arriving while the payload is missing would otherwise run the four queries of the build
+    if cache.add(HOMEPAGE_LOCK_KEY, 1, timeout=settings.CATALOG_CACHE_LOCK_TIMEOUT):
+        try:
+            return rebuild()
+        finally:
+            cache.delete(HOMEPAGE_LOCK_KEY)
+
+    # Another request is building it. Give it a moment rather than piling up on the database.
+    deadline = time.monotonic() + settings.CATALOG_CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(HOMEPAGE_KEY)
+        if entry is not None:
+            return entry[1], entry[2]
+
+    # The lock holder is too slow or died, build it ourselves.
+    return rebuild()
+
+
+def schedule_rebuild():
+    """
+    Rebuilds the homepage payload in the background once the current transaction commits.
+    """
+    transaction.on_commit(_enqueue_rebuild)
+
+
+def _enqueue_rebuild():
+    from .tasks import rebuild_homepage
+
+    try:
+        rebuild_homepage.delay()
+    except Exception as e:  # Broker unavailable
+        # Drop the payload rather than serving it stale until it expires: the next request rebuilds it
+        cache.delete(HOMEPAGE_KEY)
+        log_critical_error('Could not schedule the homepage rebuild', exc_info=e)
@@ -0,0 +1,278 @@
+"""
+Product image pipeline: the uploaded original is stored as is, then resized renditions are generated and
+uploaded in the background by the process_product_image Celery task (see products/tasks.py).
+
+Renditions (PRODUCT_IMAGE_RENDITIONS, e.g. "thumbnail", "grid" and "detail") are encoded in
+PRODUCT_IMAGE_FORMAT (WebP, or JPEG when Pillow was built without WebP support). Resizing is CPU bound, so it
+runs in a pool of PRODUCT_IMAGE_PROCESSES processes. Celery's prefork workers are daemon processes, which may not
+have children: there the renditions are rendered in threads instead (Pillow releases the GIL while resizing).
+The renditions are then uploaded concurrently.
+
+Files go to the PRODUCT_IMAGE_STORAGE storage backend (S3 in production, the local filesystem in tests and
+development) under the SHA-256 of their content, see content_name().
+"""
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.utils.module_loading import import_string
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+# Formats accepted for uploads, as detected by Pillow (the file name and content type are not trusted)
+ACCEPTED_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+
+# File extension and content type of each rendition format
+RENDITION_FORMATS = {
+    'WEBP': ('webp', 'image/webp'),
+    'JPEG': ('jpg', 'image/jpeg'),
+}
+
+_storage = None
+_executor = None
+_executor_pid = None
+_lock = threading.Lock()
+
+
+class InvalidImage(ValueError):
+    """
+    Raised when an upload is not an image we can process.
+    """
+
+
+def get_storage():
+    """
+    Returns the storage product images are saved to (PRODUCT_IMAGE_STORAGE), created on first use.
+    """
+    global _storage
+    if _storage is None:
+        _storage = import_string(settings.PRODUCT_IMAGE_STORAGE)()
+    return _storage
+
+
+def get_rendition_format():
+    """
+    Returns the Pillow format renditions are encoded in: PRODUCT_IMAGE_FORMAT, or JPEG if it is not available.
+    """
+    image_format = settings.PRODUCT_IMAGE_FORMAT.upper()
+    if image_format not in RENDITION_FORMATS or (image_format == 'WEBP' and not features.check('webp')):
+        return 'JPEG'
+    return image_format
+
+
+def validate_image(file):
+    """
+    Checks that an uploaded file is an image in an accepted format and size, without decoding it completely.
+
+    Args:
+    - file (File): The uploaded file. It is rewound afterwards.
+
+    Raises:
+    - InvalidImage: If the file is too large, not an image or in an unsupported format.
+
+    Returns:
+    - str: The file extension matching the detected format, e.g. 'jpg'.
+    """
+    if file.size > settings.PRODUCT_IMAGE_MAX_UPLOAD_BYTES:
+        raise InvalidImage(f'Images are limited to {settings.PRODUCT_IMAGE_MAX_UPLOAD_BYTES // (1024 * 1024)} MB')
+    try:
+        with Image.open(file) as image:
+            image_format = image.format
+            image.verify()
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError):
+        raise InvalidImage('The file is not a valid image')
+    finally:
+        file.seek(0)
+    if image_format not in ACCEPTED_FORMATS:
+        raise InvalidImage(f"Unsupported image format, use one of: {', '.join(ACCEPTED_FORMATS)}")
+    return ACCEPTED_FORMATS[image_format]
+
+
+def content_name(digest, extension):
+    """
+    Returns the storage name of a file from the SHA-256 of its content, e.g. "products/ab/ab12...ef.webp".
+
+    A name always holds the same bytes: files are never overwritten and can be cached forever
+    (see products/storage.py), and identical uploads share one file. The first two hex digits spread the files
+    over 256 prefixes.
+    """
+    return f'products/{digest[:2]}/{digest}.{extension}'
+
+
+def save_content_addressed(content, digest, extension):
+    """
+    Saves a file under its content name, unless a file with the same content was already saved.
+
+    Args:
+    - content (File): The file to save.
+    - digest (str): The SHA-256 of its content, in hex.
+    - extension (str): The file extension.
+
+    Returns:
+    - str: The name of the file in the image storage.
+    """
+    storage = get_storage()
+    name = content_name(digest, extension)
+    # A HEAD request on S3: much cheaper than transferring the bytes again
+    if storage.exists(name):
+        return name
+    return storage.save(name, content)
+
+
+def store_original(file):
+    """
+    Saves an uploaded image as is, to be processed later by the process_product_image task.
+
+    Args:
+    - file (File): The uploaded image.
+
+    Raises:
+    - InvalidImage: See validate_image().
+
+    Returns:
+    - str: The name of the stored file in the image storage.
+    """
+    extension = validate_image(file)
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return save_content_addressed(file, digest.hexdigest(), extension)
+
+
+def render(data, width, height, image_format, quality):
+    """
+    Resizes an image to fit within width x height (keeping its aspect ratio, never enlarging it) and encodes it.
+
+    Runs in a worker process: it only takes and returns bytes.
+
+    Args:
+    - data (bytes): The original image.
+    - width, height (int): The bounding box of the rendition.
+    - image_format (str): Pillow format to encode in, 'WEBP' or 'JPEG'.
+    - quality (int): Encoder quality, 1 to 100.
+
+    Returns:
+    - bytes: The encoded rendition.
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEGs can be decoded directly at a fraction of their size (down to the smallest scale still larger
+        # than the rendition), which is much faster than decoding everything then resizing. Square, as the
+        # image may still be rotated below.
+        image.draft('RGB', (max(width, height),) * 2)
+        # Phones store the orientation in EXIF rather than rotating the pixels
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((width, height), Image.LANCZOS)
+
+        if image_format == 'JPEG' and image.mode != 'RGB':
+            # JPEG has no transparency: flatten on white rather than on black
+            background = Image.new('RGB', image.size, 'white')
+            image = image.convert('RGBA')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+
+        output = io.BytesIO()
+        image.save(output, image_format, quality=quality, optimize=True)
+        return output.getvalue()
+
+
+def get_executor():
+    """
+    Returns the shared executor renditions are rendered in, created on first use in every process: a process
+    pool, or a thread pool when this process cannot have children (Celery prefork worker) or
+    PRODUCT_IMAGE_PROCESSES is 0.
+    """
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _lock:
+            if _executor is None or _executor_pid != os.getpid():
+                workers = settings.PRODUCT_IMAGE_PROCESSES
+                if workers > 0 and not multiprocessing.current_process().daemon:
+                    # Spawned rather than forked: forking a process running threads (web server, Celery) is unsafe
+                    _executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+                else:
+                    _executor = ThreadPoolExecutor(max_workers=max(workers, len(settings.PRODUCT_IMAGE_RENDITIONS)))
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def build_renditions(data):
+    """
+    Renders every rendition of an image in parallel.
+
+    Args:
+    - data (bytes): The original image.
+
+    Returns:
+    - dict: Mapping of rendition name to encoded bytes.
+    """
+    image_format = get_rendition_format()
+    futures = {
+        name: get_executor().submit(render, data, width, height, image_format, settings.PRODUCT_IMAGE_QUALITY)
+        for name, (width, height) in settings.PRODUCT_IMAGE_RENDITIONS.items()
+    }
+    return {name: future.result() for name, future in futures.items()}
+
+
+def upload_renditions(renditions):
+    """
+    Uploads renditions concurrently. Renditions identical to already uploaded ones (the same image uploaded
+    again, for another product for example) are not transferred again.
+
+    Args:
+    - renditions (dict): Mapping of rendition name to encoded bytes, from build_renditions().
+
+    Returns:
+    - dict: Mapping of rendition name to public URL.
+    """
+    storage = get_storage()
+    extension, content_type = RENDITION_FORMATS[get_rendition_format()]
+
+    def upload(data):
+        content = ContentFile(data)
+        content.content_type = content_type  # Used by the S3 storage instead of guessing from the name
+        return storage.url(save_content_addressed(content, hashlib.sha256(data).hexdigest(), extension))
+
+    with ThreadPoolExecutor(max_workers=len(renditions) or 1) as executor:
+        futures = {name: executor.submit(upload, data) for name, data in renditions.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def discard_original(original_name):
+    """
+    Deletes a stored original that will not be processed, unless a product already shows the same file: identical
+    uploads share one file (see content_name()).
+
+    Args:
+    - original_name (str): The name returned by store_original().
+    """
+    # Not imported at the top: the rendering processes import this module without the Django apps
+    from .models import Product
+
+    storage = get_storage()
+    if not Product.objects.filter(image_renditions__original=storage.url(original_name)).exists():
+        storage.delete(original_name)
+
+
+def process_image(original_name):
+    """
+    Generates and uploads the renditions of a stored original.
+
+    Args:
+    - original_name (str): The name returned by store_original().
+
+    Returns:
+    - dict: Mapping of rendition name to URL, plus "original".
+    """
+    storage = get_storage()
+    with storage.open(original_name, 'rb') as original:
+        data = original.read()
+    urls = upload_renditions(build_renditions(data))
+    urls['original'] = storage.url(original_name)
+    return urls
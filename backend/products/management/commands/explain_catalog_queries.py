@@ -0,0 +1,173 @@
+import itertools
+import json
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from products.models import Category, ProductSearchTerm, ProductTag
+from products.pagination import KeysetPagination
+from products.viewsets import CustomPagination, ProductViewSet
+
+# Every way ProductViewSet.list can be filtered, one dimension per filter family. Each combination of one
+# variant per dimension is explained (None means the family is not filtered).
+FILTER_VARIANTS = {
+    'search': (None, 'search'),
+    'category': (None, 'category', 'categories'),
+    'price': (None, 'price_range', 'min_price'),
+    'tags': (None, 'tag', 'all_tags'),
+}
+
+# Tables that are small by nature: a full scan of them is not worth flagging
+SMALL_TABLES = {Category._meta.db_table}
+
+
+class Command(BaseCommand):
+    """
+    Runs EXPLAIN on every query the product list can generate and flags full table scans and filesorts.
+
+    For every combination of the list filters (search, category or several categories, a price range or a single
+    bound, one tag or several tags that must all match), three queries are explained: the first page, the total
+    count of page number pagination and a page of cursor pagination past the first one. Filter values are taken
+    from the data: the largest category, the most common tag and search term.
+
+    Plans depend on table sizes: on a small database every planner prefers scanning. Run it against production
+    sized data (see seed_benchmark_data). Supported databases are MySQL, PostgreSQL and SQLite.
+
+    With --strict the command fails when a full scan is found, so it can guard the indexes in CI. Filesorts are
+    only reported: some are unavoidable, such as ordering search results by relevance.
+
+    Usage: python manage.py explain_catalog_queries [--min-price 10] [--max-price 50] [--verbose] [--strict]
+    """
+    help = 'Explains the product list queries and flags full scans and filesorts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-price', default='10', help='Lower bound of the price filters')
+        parser.add_argument('--max-price', default='50', help='Upper bound of the price range filter')
+        parser.add_argument('--verbose', action='store_true', help='Print every plan, not only the flagged ones')
+        parser.add_argument('--strict', action='store_true', help='Fail when a full scan is found')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in ('mysql', 'postgresql', 'sqlite'):
+            raise CommandError(f'EXPLAIN output of {connection.vendor} is not supported')
+        self.options = options
+        self.values = self.load_filter_values()
+
+        full_scans = 0
+        filesorts = 0
+        for combination in itertools.product(*FILTER_VARIANTS.values()):
+            variants = [variant for variant in combination if variant]
+            name = '+'.join(variants) or 'unfiltered'
+            for query_name, queryset in self.build_queries(variants):
+                plan = self.explain(queryset)
+                issues = find_issues(plan, connection.vendor)
+                full_scans += sum(issue.startswith('full scan') for issue in issues)
+                filesorts += sum(issue == 'filesort' for issue in issues)
+                self.report(f'{name} [{query_name}]', issues, plan)
+
+        summary = f'{full_scans} full scans and {filesorts} filesorts found'
+        if options['strict'] and full_scans:
+            raise CommandError(summary)
+        self.stdout.write(self.style.WARNING(summary) if full_scans or filesorts else self.style.SUCCESS(summary))
+
+    def load_filter_values(self):
+        # The most frequent values, which are the ones an index helps the least with
+        category = Category.objects.annotate(size=Count('products')).order_by('-size').first()
+        tags = list(
+            ProductTag.objects.values('tag').annotate(size=Count('pk')).order_by('-size').values_list('tag', flat=True)[:2]
+        )
+        term = ProductSearchTerm.objects.values('term').annotate(size=Count('pk')).order_by('-size').first()
+        if category is None or not tags or term is None:
+            raise CommandError('The catalog is empty, seed it first (see seed_benchmark_data)')
+
+        categories = [category.name, *Category.objects.exclude(pk=category.pk).values_list('name', flat=True)[:2]]
+        return {
+            'search': {'search': term['term']},
+            'category': {'category': category.name},
+            'categories': {'categories': ','.join(categories)},
+            'price_range': {'min_price': self.options['min_price'], 'max_price': self.options['max_price']},
+            'min_price': {'min_price': self.options['min_price']},
+            'tag': {'tags': tags[0]},
+            'all_tags': {'tags': ','.join(tags), 'tag_mode': 'all'},
+        }
+
+    def build_queries(self, variants):
+        """
+        Yields (name, queryset) pairs: the queries the list view runs for the given filter variants.
+        """
+        params = {}
+        for variant in variants:
+            params.update(self.values[variant])
+        request = Request(APIRequestFactory().get('/products/products_viewsets/', params))
+        view = ProductViewSet(request=request)
+        queryset = view.get_list_queryset(request, view.get_list_filters(request))
+
+        yield 'page', queryset[:CustomPagination.page_size]
+        # COUNT(*) needs the matching rows but none of their columns, an index covering the filters is enough
+        yield 'count', queryset.order_by().values('pk')
+
+        # A page past the first one in cursor mode, positioned after the first product
+        paginator = KeysetPagination()
+        paginator.ordering = tuple(queryset.query.order_by)
+        first = queryset.first()
+        if first is not None:
+            position = paginator.build_position_filter(paginator.get_key(first), reverse=False)
+            yield 'cursor', queryset.filter(position)[:paginator.page_size + 1]
+
+    def explain(self, queryset):
+        if connection.vendor == 'mysql':
+            return queryset.explain(format='json')
+        return queryset.explain()
+
+    def report(self, name, issues, plan):
+        if issues:
+            self.stdout.write(self.style.WARNING(f"{name}: {', '.join(issues)}"))
+        elif self.options['verbose']:
+            self.stdout.write(f'{name}: ok')
+        if self.options['verbose'] or (issues and self.options['verbosity'] > 1):
+            self.stdout.write(plan)
+
+
+def find_issues(plan, vendor):
+    """
+    Finds the full table scans and filesorts in an EXPLAIN output.
+
+    Args:
+    - plan (str): The output of QuerySet.explain(), in JSON format for MySQL and the default text format otherwise.
+    - vendor (str): connection.vendor of the database that produced the plan.
+
+    Returns:
+    - list of str: "full scan of <table>" for every scanned table (Django aliases subquery tables U0, U1...)
+    and "filesort" for every sort the database has to do itself.
+    """
+    scanned = []
+    filesorts = 0
+
+    if vendor == 'mysql':
+        def walk(node):
+            nonlocal filesorts
+            if isinstance(node, dict):
+                if node.get('access_type') == 'ALL':
+                    scanned.append(node.get('table_name'))
+                if node.get('using_filesort'):
+                    filesorts += 1
+                for value in node.values():
+                    walk(value)
+            elif isinstance(node, list):
+                for value in node:
+                    walk(value)
+        walk(json.loads(plan))
+    elif vendor == 'postgresql':
+        scanned = re.findall(r'Seq Scan on (\w+)', plan)
+        # "Incremental Sort" only sorts rows within groups already read in index order
+        filesorts = len(re.findall(r'^\s*(?:->\s*)?Sort\b', plan, re.MULTILINE))
+    else:
+        # "SCAN table USING (COVERING) INDEX" walks an index in order, only a bare "SCAN table" reads the table
+        scanned = re.findall(r'\bSCAN (\w+)\b(?! USING)', plan)
+        filesorts = plan.count('USE TEMP B-TREE FOR ORDER BY')
+
+    issues = [f'full scan of {table}' for table in dict.fromkeys(scanned) if table not in SMALL_TABLES]
+    return issues + ['filesort'] * filesorts
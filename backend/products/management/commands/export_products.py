@@ -0,0 +1,51 @@
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.catalog_io import EXPORT_VALUES, FIELDS, FORMATS, export_row, guess_format
+from products.models import Product
+
+class Command(BaseCommand):
+    """
+    Writes the whole catalog to a CSV or JSON Lines file that import_products can read back
+    (see products/catalog_io.py for the format).
+
+    Products are streamed from the database --chunk-size rows at a time with QuerySet.iterator(), so memory does
+    not depend on the catalog size.
+
+    Usage: python manage.py export_products [--output products.csv] [--format csv|jsonl] [--chunk-size 2000]
+    """
+    help = 'Exports every product to a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='-', help="File to write, '-' for standard output (the default)")
+        parser.add_argument('--format', choices=FORMATS, help='File format, guessed from the extension by default')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Products fetched from the database at once')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or guess_format(options['output'])
+        if options['output'] == '-':
+            exported = self.export(self.stdout, file_format, options['chunk_size'])
+        else:
+            try:
+                with open(options['output'], 'w', newline='', encoding='utf-8') as output:
+                    exported = self.export(output, file_format, options['chunk_size'])
+            except OSError as e:
+                raise CommandError(f"Cannot write {options['output']}: {e}")
+            self.stdout.write(self.style.SUCCESS(f"Exported {exported} products to {options['output']}"))
+
+    def export(self, output, file_format, chunk_size):
+        products = Product.objects.order_by('pk').values(*EXPORT_VALUES).iterator(chunk_size=chunk_size)
+        if file_format == 'csv':
+            writer = csv.DictWriter(output, fieldnames=FIELDS)
+            writer.writeheader()
+            write = writer.writerow
+        else:
+            write = lambda row: output.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+        exported = 0
+        for values in products:
+            write(export_row(values, file_format))
+            exported += 1
+        return exported
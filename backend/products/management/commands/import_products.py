@@ -0,0 +1,150 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from products.cache import bump_catalog_version
+from products.homepage import schedule_rebuild
+from products.catalog_io import FORMATS, PRODUCT_FIELDS, RowError, clean_row, guess_format, read_rows
+from products.models import Category, Product
+from products.search import index_products, tag_values
+from products.tags import sync_tags
+
+class Command(BaseCommand):
+    """
+    Creates or updates products in bulk from a CSV or JSON Lines file (see products/catalog_io.py for the format).
+
+    Rows are read and validated one at a time and written --batch-size at a time: products are upserted on
+    product_identifier with one INSERT ... ON CONFLICT / ON DUPLICATE KEY UPDATE statement per batch, so memory
+    stays flat and a 100,000 row file takes seconds. Missing categories are created on the way. Every batch is
+    committed on its own: an invalid row is reported (with its line number) and skipped, it does not stop the
+    import. Rows repeating a product_identifier already seen in the same batch are reported and skipped too.
+
+    bulk_create does not send post_save signals: the search index and tag table are refreshed for the products of
+    every batch whose indexed fields changed, the catalog version is bumped and the homepage payload rebuilt once
+    at the end.
+
+    Usage: python manage.py import_products <path or -> [--format csv|jsonl] [--batch-size 1000] [--dry-run]
+    """
+    help = 'Creates or updates products from a CSV or JSON Lines file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="File to import, '-' for standard input")
+        parser.add_argument('--format', choices=FORMATS, help='File format, guessed from the extension by default')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Products written per statement')
+        parser.add_argument('--dry-run', action='store_true', help='Only validate the file, write nothing')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1')
+        self.options = options
+        self.categories = dict(Category.objects.values_list('name', 'pk'))
+        self.counts = {'created': 0, 'updated': 0, 'errors': 0}
+
+        file_format = options['format'] or guess_format(options['path'])
+        started = time.perf_counter()
+        if options['path'] == '-':
+            self.import_file(sys.stdin, file_format)
+        else:
+            try:
+                # utf-8-sig: spreadsheet exports often start with a byte order mark
+                with open(options['path'], newline='', encoding='utf-8-sig') as file:
+                    self.import_file(file, file_format)
+            except OSError as e:
+                raise CommandError(f"Cannot read {options['path']}: {e}")
+
+        if not options['dry_run'] and self.counts['created'] + self.counts['updated']:
+            bump_catalog_version()
+            schedule_rebuild()
+
+        summary = '{} products created, {} updated, {} rows with errors in {:.1f}s{}'.format(
+            self.counts['created'], self.counts['updated'], self.counts['errors'], time.perf_counter() - started,
+            ' (dry run, nothing written)' if options['dry_run'] else '',
+        )
+        self.stdout.write(self.style.WARNING(summary) if self.counts['errors'] else self.style.SUCCESS(summary))
+
+    def import_file(self, file, file_format):
+        batch = {}
+        try:
+            for line_number, row in read_rows(file, file_format):
+                try:
+                    if isinstance(row, RowError):
+                        raise row
+                    product = clean_row(row)
+                    if product['product_identifier'] in batch:
+                        raise RowError(f"product_identifier: {product['product_identifier']} repeated in the file")
+                except RowError as e:
+                    self.report_error(line_number, e)
+                    continue
+
+                batch[product['product_identifier']] = product
+                if len(batch) >= self.options['batch_size']:
+                    self.write_batch(list(batch.values()))
+                    batch = {}
+        except RowError as e:  # The file itself is unusable, e.g. a CSV header without the expected columns
+            raise CommandError(str(e))
+        except UnicodeDecodeError as e:
+            raise CommandError(f'The file is not UTF-8 encoded: {e}')
+        if batch:
+            self.write_batch(list(batch.values()))
+
+    def report_error(self, line_number, error):
+        self.counts['errors'] += 1
+        self.stderr.write(f'Line {line_number}: {error}')
+
+    def write_batch(self, rows):
+        identifiers = [row['product_identifier'] for row in rows]
+        # What the search index and tag table were built from, to only refresh them for the products that changed
+        existing = {
+            pk: (name, description, tag_values(tags), category_id)
+            for pk, name, description, tags, category_id in Product.objects.filter(pk__in=identifiers).values_list(
+                'pk', 'name', 'description', 'tags', 'category_id'
+            )
+        }
+        self.counts['created'] += len(rows) - len(existing)
+        self.counts['updated'] += len(existing)
+        if self.options['dry_run']:
+            return
+
+        with transaction.atomic():
+            self.create_missing_categories({row['category'] for row in rows})
+            products = [
+                Product(category_id=self.categories[row['category']], **{field: row[field] for field in PRODUCT_FIELDS})
+                for row in rows
+            ]
+            # One upsert statement per batch. image_renditions is left alone on update: the renditions of a
+            # product only change through its image pipeline.
+            Product.objects.bulk_create(
+                products,
+                update_conflicts=True,
+                # MySQL's ON DUPLICATE KEY UPDATE takes no conflict target, it applies to every unique key
+                unique_fields=['product_identifier'] if connection.features.supports_update_conflicts_with_target else None,
+                update_fields=[field for field in PRODUCT_FIELDS if field != 'product_identifier'] + ['category'],
+            )
+
+            reindexed = []
+            retagged = []
+            for product in products:
+                indexed = (product.name, product.description, product.tags, product.category_id)
+                before = existing.get(product.pk)
+                if indexed != before:
+                    reindexed.append(product.pk)
+                if before is None or product.tags != before[2]:
+                    retagged.append(product.pk)
+            # A typical catalog refresh only changes prices and stock: nothing to reindex then
+            if reindexed:
+                index_products(Product.objects.filter(pk__in=reindexed), batch_size=len(reindexed))
+            if retagged:
+                sync_tags(Product.objects.filter(pk__in=retagged), batch_size=len(retagged))
+
+    def create_missing_categories(self, names):
+        missing = names - self.categories.keys()
+        if not missing:
+            return
+        # ignore_conflicts: another process may create the same category concurrently
+        Category.objects.bulk_create([Category(name=name) for name in missing], ignore_conflicts=True)
+        self.categories.update(Category.objects.filter(name__in=missing).values_list('name', 'pk'))
+        for name in missing - self.categories.keys():
+            # A case insensitive collation (MySQL) matched an existing category spelled differently
+            self.categories[name] = Category.objects.get(name=name).pk
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from products.cache import bump_catalog_version
+from products.search import index_products
+from products.tags import sync_tags
+
+class Command(BaseCommand):
+    """
+    Rebuilds the product search index and the ProductTag table from scratch.
+
+    The index is normally kept up to date by signals, so this is only needed after operations
+    that bypass them (QuerySet.update(), bulk_create(), raw SQL, restoring a database dump...).
+
+    Usage: python manage.py rebuild_search_index [--batch-size 500] [--tags-only]
+    """
+    help = 'Rebuilds the product search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of products indexed per batch')
+        parser.add_argument('--tags-only', action='store_true', help='Only resync the ProductTag table')
+
+    def handle(self, *args, **options):
+        if not options['tags_only']:
+            indexed = index_products(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Indexed {indexed} products'))
+        synced = sync_tags(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Synced the tags of {synced} products'))
+        # Cached search results and tag facets were built from the old index
+        bump_catalog_version()
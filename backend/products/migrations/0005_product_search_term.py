@@ -0,0 +1,108 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:27
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# A copy of products/search.py as it was when the index was introduced: a migration must not depend on code that
+# keeps changing. Index changes made since are applied by the rebuild_search_index command.
+FIELD_WEIGHTS = {
+    'name': 10,
+    'category': 5,
+    'tags': 3,
+    'description': 1,
+}
+
+MAX_TERM_LENGTH = 64
+
+STOP_WORDS = frozenset({
+    'a', 'an', 'and', 'for', 'in', 'of', 'the', 'to', 'with',
+    'au', 'aux', 'd', 'de', 'des', 'du', 'en', 'et', 'l', 'la', 'le', 'les', 'pour', 'un', 'une',
+})
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# Products indexed per batch, so that a large catalog is never held in memory at once
+BATCH_SIZE = 500
+
+
+def normalize(text):
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+
+def tokenize(text):
+    if not text:
+        return []
+    tokens = [token[:MAX_TERM_LENGTH] for token in TOKEN_PATTERN.findall(normalize(str(text)))]
+    return [token for token in tokens if token not in STOP_WORDS]
+
+
+def tag_values(tags):
+    if not tags:
+        return []
+    if isinstance(tags, str):
+        return [tags]
+    if isinstance(tags, dict):
+        return [str(value) for value in tags.values()]
+    return [str(tag) for tag in tags]
+
+
+def build_terms(product):
+    fields = {
+        'name': product.name,
+        'category': product.category.name if product.category_id else '',
+        'tags': ' '.join(tag for tag in tag_values(product.tags) if tag.upper() != 'NONE'),
+        'description': product.description,
+    }
+
+    terms = {}
+    for field, text in fields.items():
+        for term in set(tokenize(text)):
+            terms[term] = terms.get(term, 0) + FIELD_WEIGHTS[field]
+    return terms
+
+
+def build_search_index(apps, schema_editor):
+    """
+    Indexes the products that existed before the search index was introduced.
+    """
+    Product = apps.get_model('products', 'Product')
+    ProductSearchTerm = apps.get_model('products', 'ProductSearchTerm')
+
+    entries = []
+    for index, product in enumerate(Product.objects.select_related('category').iterator(chunk_size=BATCH_SIZE), 1):
+        entries.extend(
+            ProductSearchTerm(term=term, product_id=product.pk, weight=weight)
+            for term, weight in build_terms(product).items()
+        )
+        if index % BATCH_SIZE == 0:
+            ProductSearchTerm.objects.bulk_create(entries)
+            entries = []
+    ProductSearchTerm.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_alter_product_image_url_alter_product_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.PositiveIntegerField(default=1)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='products.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='productsearchterm',
+            constraint=models.UniqueConstraint(fields=('term', 'product'), name='unique_search_term_per_product'),
+        ),
+        migrations.RunPython(build_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# A copy of products/tags.py as it was when the tag table was introduced: a migration must not depend on code that
+# keeps changing. Tag changes made since are applied by the rebuild_search_index command.
+MAX_TAG_LENGTH = 32
+
+# Products copied per batch, so that a large catalog is never held in memory at once
+BATCH_SIZE = 500
+
+
+def tag_values(tags):
+    if not tags:
+        return []
+    if isinstance(tags, str):
+        return [tags]
+    if isinstance(tags, dict):
+        return [str(value) for value in tags.values()]
+    return [str(tag) for tag in tags]
+
+
+def normalize_tag(tag):
+    tag = str(tag).strip().upper()[:MAX_TAG_LENGTH]
+    if not tag or tag == 'NONE':
+        return None
+    return tag
+
+
+def product_tags(tags):
+    return {tag for tag in map(normalize_tag, tag_values(tags)) if tag}
+
+
+def backfill_product_tags(apps, schema_editor):
+    """
+    Copies the tags of the products that existed before the tag table was introduced.
+    """
+    Product = apps.get_model('products', 'Product')
+    ProductTag = apps.get_model('products', 'ProductTag')
+
+    entries = []
+    rows = Product.objects.values_list('pk', 'tags').iterator(chunk_size=BATCH_SIZE)
+    for index, (pk, tags) in enumerate(rows, 1):
+        entries.extend(ProductTag(tag=tag, product_id=pk) for tag in product_tags(tags))
+        if index % BATCH_SIZE == 0:
+            ProductTag.objects.bulk_create(entries)
+            entries = []
+    ProductTag.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_search_term'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tag', models.CharField(max_length=32)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tag_entries', to='products.product')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='producttag',
+            constraint=models.UniqueConstraint(fields=('tag', 'product'), name='unique_tag_per_product'),
+        ),
+        migrations.RunPython(backfill_product_tags, migrations.RunPython.noop),
+    ]
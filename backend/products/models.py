@@ -31,6 +31,8 @@ class Product(models.Model):
     - stock (IntegerField): The available stock quantity of the product. For admin control
     - tags (JSONField): Additional tags for the product, such as 'HOT', 'NEW'. Optional. Controlled by the admin and used by the frontend to display to the user
     - category (ForeignKey): A reference to the Category the product belongs to.
+    - image_renditions (JSONField): URLs of the resized copies of the image by rendition name ("thumbnail",
+    "grid", "detail") plus the uploaded "original". Filled in by the process_product_image task, empty until then.
     """
     TAG_CHOICES = [
         ('HOT', 'Hot'),
@@ -49,6 +51,70 @@ class Product(models.Model):
     stock = models.IntegerField(default=1)
     tags = models.JSONField(blank=True)
     category = models.ForeignKey(Category, related_name='products', on_delete=models.PROTECT)
+    image_renditions = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        # Indexes for the catalog access patterns of ProductViewSet.list, checked with the
+        # explain_catalog_queries management command:
+        # - (category, name): a category page ordered by name, read in index order without a sort,
+        # - (category, price): a price range within a category,
+        # - (price): a price range across the catalog,
+        # - (name): the unfiltered catalog ordered by name (and its keyset pagination).
+        # Secondary indexes implicitly end with the primary key, which matches the "name, product_identifier"
+        # ordering of the list.
+        indexes = [
+            models.Index(fields=['category', 'name'], name='product_category_name_idx'),
+            models.Index(fields=['category', 'price'], name='product_category_price_idx'),
+            models.Index(fields=['price'], name='product_price_idx'),
+            models.Index(fields=['name'], name='product_name_idx'),
+        ]
 
     def __str__(self):
         return self.name
+
+class ProductSearchTerm(models.Model):
+    """
+    A single entry of the product search inverted index. Maintained by the signals in products/signals.py
+    and queried by products/search.py instead of scanning the product table with a leading-wildcard LIKE.
+
+    Attributes:
+    - term (CharField): A normalized (lowercased, accent folded) token taken from the product's name,
+    description, category name or tags.
+    - product (ForeignKey): The product the term was extracted from.
+    - weight (PositiveIntegerField): Relevance weight of the term for this product. A term found in the name
+    weighs more than one only found in the description. See FIELD_WEIGHTS in products/search.py.
+    """
+    term = models.CharField(max_length=64)
+    product = models.ForeignKey(Product, related_name='search_terms', on_delete=models.CASCADE, to_field='product_identifier')
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        # The unique index starts with "term" so exact and prefix lookups ("term >= 'abc' AND term < 'abd'") are index range scans.
+        constraints = [
+            models.UniqueConstraint(fields=['term', 'product'], name='unique_search_term_per_product'),
+        ]
+
+    def __str__(self):
+        return f'{self.term} -> {self.product_id}'
+
+class ProductTag(models.Model):
+    """
+    One tag of a product, a normalized copy of Product.tags kept in sync by the signals in products/signals.py.
+    Filtering products by tag queries this table instead of the JSON field, which cannot be indexed portably.
+
+    Attributes:
+    - tag (CharField): The normalized (uppercased, trimmed) tag, e.g. 'HOT'. The 'NONE' placeholder is never stored.
+    - product (ForeignKey): The tagged product.
+    """
+    tag = models.CharField(max_length=32)
+    product = models.ForeignKey(Product, related_name='tag_entries', on_delete=models.CASCADE, to_field='product_identifier')
+
+    class Meta:
+        # The unique index starts with "tag": filtering by one or several tags is an index range scan that
+        # yields the product identifiers directly.
+        constraints = [
+            models.UniqueConstraint(fields=['tag', 'product'], name='unique_tag_per_product'),
+        ]
+
+    def __str__(self):
+        return f'{self.tag} -> {self.product_id}'
@@ -0,0 +1,177 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import reduce
+from operator import and_, or_
+from urllib import parse
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(pagination.BasePagination):
+    """
+    Cursor (keyset) pagination for the product catalog, used for infinite scroll.
+
+    Instead of "COUNT(*)" plus "OFFSET n", every page is fetched with a "WHERE (name, product_identifier) > (...)"
+    condition built from the last product of the previous page. The cost of a page therefore does not depend on
+    how deep the customer has scrolled, and no total count is computed.
+
+    The ordering is taken from the queryset and must end with a unique field (product_identifier) so that the
+    position is never ambiguous. The default is name then product_identifier. Search results, which are ordered
+    by relevance first, work the same way since "search_rank" is simply part of the key.
+
+    Cursors are opaque to the client: base64 encoded JSON holding the key of the boundary product and the
+    direction. Responses contain "next", "previous" and "results".
+    """
+    page_size = 9
+    cursor_query_param = 'cursor'
+    ordering = ('name', 'product_identifier')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.ordering = tuple(queryset.query.order_by) or self.ordering
+        queryset = queryset.order_by(*self.ordering)
+
+        self.cursor = self.decode_cursor(request, queryset)
+        reverse = bool(self.cursor and self.cursor['reverse'])
+
+        if reverse:
+            # Walk backwards from the cursor, then flip the page back into display order.
+            queryset = queryset.reverse()
+        if self.cursor:
+            queryset = queryset.filter(self.build_position_filter(self.cursor['key'], reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        return self.page
+
+    def build_position_filter(self, key, reverse):
+        """
+        Builds the condition selecting the rows strictly after (or before when reverse is True) the given key.
+
+        For an ordering (a, b, c) this is: a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z),
+        with "<" for descending fields.
+        """
+        conditions = []
+        for index, field in enumerate(self.ordering):
+            equal = [Q(**{name.lstrip('-'): value}) for name, value in zip(self.ordering[:index], key[:index])]
+            descending = field.startswith('-')
+            lookup = 'lt' if descending != reverse else 'gt'
+            conditions.append(reduce(and_, equal + [Q(**{f'{field.lstrip("-")}__{lookup}': key[index]})]))
+        return reduce(or_, conditions)
+
+    def get_key(self, instance):
+        return [getattr(instance, field.lstrip('-')) for field in self.ordering]
+
+    def encode_cursor(self, key, reverse):
+        cursor = {'key': key, 'reverse': reverse}
+        encoded = urlsafe_b64encode(json.dumps(cursor, separators=(',', ':'), default=str).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request, queryset):
+        """
+        Returns the cursor of the request as a dict with "key" and "reverse", or None on the first page.
+        The values of the key are converted to the types of the ordering fields.
+        Raises NotFound if the cursor was tampered with or does not match the current ordering.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode()).decode())
+            if not isinstance(cursor['key'], list) or len(cursor['key']) != len(self.ordering):
+                raise ValueError
+            # Otherwise a value of the wrong type ("abc" for a product identifier) only fails in the query, with a 500
+            key = [self.get_field(queryset, name).to_python(value) for name, value in zip(self.ordering, cursor['key'])]
+            if None in key:
+                raise ValueError
+            return {'key': key, 'reverse': bool(cursor['reverse'])}
+        except (TypeError, KeyError, ValueError, UnicodeDecodeError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def get_field(queryset, name):
+        """
+        Returns the model field or annotation ("search_rank") the queryset is ordered by.
+        """
+        name = name.lstrip('-')
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        return queryset.model._meta.get_field(name)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.get_key(self.page[-1]), reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            # Went past the end, the previous page is whatever comes before the cursor we were given.
+            return self.encode_cursor(self.cursor['key'], reverse=True)
+        return self.encode_cursor(self.get_key(self.page[0]), reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+def rebase_links(data, url):
+    """
+    Points the "next" and "previous" links of a paginated response at another URL of the same list.
+
+    Cached list responses are shared by every URL with the same filters (see ProductViewSet.list), but their links
+    were built from the URL of the request that computed them. Only the page or cursor of each link is kept.
+
+    Args:
+    - data (dict): The paginated response, with "next" and "previous" links.
+    - url (str): The absolute URL of the current request.
+
+    Returns:
+    - dict: A copy of the response with its links rebuilt from url.
+    """
+    links = {}
+    for name in ('next', 'previous'):
+        link = data.get(name)
+        if link is None:
+            continue
+        query = parse.parse_qs(parse.urlsplit(link).query)
+        for param in (KeysetPagination.cursor_query_param, 'page'):
+            if param in query:
+                links[name] = replace_query_param(url, param, query[param][0])
+                break
+        else:
+            # The link to the first page has no page number
+            links[name] = remove_query_param(url, 'page')
+    return dict(data, **links)
+
@@ -0,0 +1,61 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Product, Category
+from .search import index_product, index_products
+from .tags import sync_product_tags
+from .cache import bump_catalog_version
+from .homepage import schedule_rebuild
+
+# Signal receivers keeping derived catalog data in sync with Product and Category changes.
+# Deleting a product needs no receiver here, its search terms and tags are removed by the cascade.
+
+# Product fields whose text ends up in the search index
+INDEXED_FIELDS = {'name', 'description', 'tags', 'category', 'category_id'}
+
+@receiver(post_save, sender=Product)
+def reindex_product(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Refreshes the search index entries of a product after it is created or updated.
+    Saves limited to fields that are not indexed (save(update_fields=['image_url']) for example) are skipped.
+    """
+    if raw:  # Fixture loading, related rows may not exist yet
+        return
+    if update_fields is not None and not INDEXED_FIELDS & set(update_fields):
+        return
+    index_product(instance)
+
+@receiver(post_save, sender=Product)
+def sync_tags_of_product(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Copies the tags of a product to the ProductTag table after it is created or its tags are updated.
+    """
+    if raw:
+        return
+    if update_fields is not None and 'tags' not in update_fields:
+        return
+    sync_product_tags(instance)
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created=False, raw=False, **kwargs):
+    """
+    Refreshes the search index entries of every product in a category after the category is updated,
+    since the category name is part of each product's indexed text.
+    """
+    if raw or created:  # A new category has no products yet
+        return
+    index_products(instance.products.all())
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    """
+    Moves to a new catalog version so that cached catalog responses are rebuilt, and schedules the rebuild of
+    the homepage payload, which is refreshed rather than invalidated.
+
+    Done on commit: bumping earlier would let a concurrent request cache the old rows under the new version.
+    """
+    transaction.on_commit(bump_catalog_version)
+    schedule_rebuild()
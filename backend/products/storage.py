@@ -0,0 +1,19 @@
+"""
+Storage backend of the product images in production (see PRODUCT_IMAGE_STORAGE).
+"""
+from storages.backends.s3boto3 import S3Boto3Storage
+
+# Product images are stored under the hash of their content (see products.images.content_name) and never change:
+# browsers and CDNs may keep them for a year without revalidating
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+class ProductImageStorage(S3Boto3Storage):
+    """
+    S3Boto3Storage serving its objects as immutable. Only content-addressed, write-once files may be stored here:
+    everything else goes to DEFAULT_FILE_STORAGE, which keeps the bucket's default caching.
+    """
+    def get_object_parameters(self, name):
+        parameters = super().get_object_parameters(name)
+        parameters['CacheControl'] = IMMUTABLE_CACHE_CONTROL
+        return parameters
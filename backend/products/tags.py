@@ -0,0 +1,122 @@
+"""
+Tag filtering backed by the ProductTag table.
+
+Product.tags is a free form JSONField ("HOT", ["HOT", "NEW"], ...) that cannot be indexed portably. Every tag
+of a product is copied, normalized, into ProductTag, whose unique (tag, product) index turns tag filters into
+index lookups: "any of these tags" is one range scan per tag, "all of these tags" the same scan grouped per
+product.
+
+The table is kept up to date by the save signals in products/signals.py. Use the "rebuild_search_index"
+management command after bulk operations that bypass signals.
+"""
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Product, ProductTag
+from .search import tag_values
+
+# Must match ProductTag.tag max_length.
+MAX_TAG_LENGTH = 32
+
+# Ways of combining several tags in a filter: products carrying at least one of them, or every one of them
+TAG_MODES = ('any', 'all')
+
+
+def normalize_tag(tag):
+    """
+    Normalizes a tag the way it is stored in ProductTag: trimmed and uppercased.
+
+    Args:
+    - tag (str): Raw tag, e.g. " hot".
+
+    Returns:
+    - str: The normalized tag ("HOT"), or None for an empty tag or the 'NONE' placeholder.
+    """
+    tag = str(tag).strip().upper()[:MAX_TAG_LENGTH]
+    if not tag or tag == 'NONE':
+        return None
+    return tag
+
+
+def product_tags(tags):
+    """
+    Returns the normalized tags of a Product.tags value.
+
+    Args:
+    - tags: A Product.tags value (list, string, dict or None).
+
+    Returns:
+    - set of str: The normalized tags.
+    """
+    return {tag for tag in map(normalize_tag, tag_values(tags)) if tag}
+
+
+def sync_product_tags(product):
+    """
+    Replaces the ProductTag rows of a single product.
+
+    Args:
+    - product (Product): The product whose tags changed.
+    """
+    entries = [ProductTag(tag=tag, product_id=product.pk) for tag in product_tags(product.tags)]
+    with transaction.atomic():
+        ProductTag.objects.filter(product_id=product.pk).delete()
+        ProductTag.objects.bulk_create(entries)
+
+
+def sync_tags(queryset=None, batch_size=500):
+    """
+    Rebuilds the ProductTag rows of many products in batches.
+
+    Args:
+    - queryset (QuerySet): Products to resync. Defaults to the whole catalog.
+    - batch_size (int): Number of products handled per batch.
+
+    Returns:
+    - int: The number of products synced.
+    """
+    if queryset is None:
+        queryset = Product.objects.all()
+    rows = queryset.order_by('pk').values_list('pk', 'tags')
+
+    synced = 0
+    batch = []
+    for row in rows.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            synced += _sync_batch(batch)
+            batch = []
+    if batch:
+        synced += _sync_batch(batch)
+    return synced
+
+
+def _sync_batch(rows):
+    entries = [ProductTag(tag=tag, product_id=pk) for pk, tags in rows for tag in product_tags(tags)]
+    with transaction.atomic():
+        ProductTag.objects.filter(product_id__in=[pk for pk, _ in rows]).delete()
+        ProductTag.objects.bulk_create(entries, batch_size=1000)
+    return len(rows)
+
+
+def filter_by_tags(queryset, tags, mode='any'):
+    """
+    Filters a product queryset down to the products carrying the given tags.
+
+    Args:
+    - queryset (QuerySet): The product queryset to filter.
+    - tags (iterable of str): The tags, normalized or not.
+    - mode (str): 'any' keeps products carrying at least one of the tags, 'all' those carrying every one.
+
+    Returns:
+    - QuerySet: The filtered products. Empty if no tag is valid.
+    """
+    tags = sorted({tag for tag in map(normalize_tag, tags) if tag})
+    if not tags:
+        return queryset.none()
+
+    # A subquery rather than a join: the join would repeat a product once per matched tag
+    matches = ProductTag.objects.filter(tag__in=tags)
+    if mode == 'all' and len(tags) > 1:
+        matches = matches.values('product_id').annotate(matched=Count('tag')).filter(matched=len(tags))
+    return queryset.filter(pk__in=matches.values('product_id'))
@@ -0,0 +1,36 @@
+from celery import shared_task
+
+from .homepage import rebuild_if_stale
+from .images import process_image
+from .models import Product
+
+@shared_task
+def process_product_image(product_id, original_name):
+    """
+    Generates the resized renditions of a product image uploaded through ProductViewSet.update_image,
+    uploads them and points the product to them.
+
+    Args:
+    - product_id: Identifier of the product.
+    - original_name: Name of the uploaded original in the image storage (see products.images.store_original).
+    """
+    try:
+        product = Product.objects.get(pk=product_id)
+    except Product.DoesNotExist:
+        return  # Deleted while the image was waiting, nothing to update
+
+    urls = process_image(original_name)
+
+    # The largest rendition replaces the original as the product's main image. Saved rather than updated
+    # through the queryset so that the signals refresh the catalog cache.
+    product.image_url = urls['detail']
+    product.image_renditions = urls
+    product.save(update_fields=['image_url', 'image_renditions'])
+
+@shared_task
+def rebuild_homepage():
+    """
+    Rebuilds the precomputed homepage payload after a catalog change (see products/homepage.py).
+    Skipped when an earlier task of the same burst of changes already built it for the current catalog version.
+    """
+    rebuild_if_stale()
@@ -1,3 +1,586 @@
-from django.test import TestCase
+import hashlib
+import importlib
+import json
+import os
+from base64 import urlsafe_b64encode
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.urls import reverse
+from kombu.exceptions import OperationalError
+from PIL import Image
+
+from custom_admin.testing import QueryBudgetTestCase, create_user
+from .cache import get_catalog_version
+from .catalog_io import FIELDS
+from .images import content_name, get_storage
+from .management.commands.explain_catalog_queries import find_issues
+from .models import Product, Category, ProductSearchTerm, ProductTag
+from .homepage import HOMEPAGE_KEY, HOMEPAGE_LOCK_KEY
+from .urls import router, urlpatterns
+from .async_urls import urlpatterns as async_urlpatterns
+
+
+def make_image(width=2000, height=1500, image_format='PNG', name='new.png'):
+    """
+    Returns an uploadable image file.
+    """
+    output = BytesIO()
+    Image.new('RGBA', (width, height), (200, 80, 20, 255)).save(output, image_format)
+    return SimpleUploadedFile(name, output.getvalue(), content_type=f'image/{image_format.lower()}')
+
+
+def create_products(count, start=1):
+    """
+    Seeds products, each in its own category so that a missing select_related shows up as one query per row.
+    """
+    for identifier in range(start, start + count):
+        category = Category.objects.create(name=f'Category {identifier}')
+        Product.objects.create(
+            product_identifier=identifier, image_url=f'https://example.com/{identifier}.jpg', name=f'Palm oil {identifier}',
+            price=identifier, description='Red palm oil', weight_kg=1, weight_lbs=2.2, default_quantity=1,
+            tags=['HOT'], category=category,
+        )
+
+
+class ProductQueryBudgetTests(QueryBudgetTestCase):
+    """
+    Query budgets of the product and category endpoints.
+    """
+    query_budgets = {
+        'product-list': 2,  # page + count
+        'product-detail': 1,
+        'product-star-eight': 1,
+        'product-update-image': 1,
+        'category-list': 1,
+        'category-detail': 1,
+        'homepage': 4,  # star products + categories + count + page, when the payload is missing
+    }
+
+    def setUp(self):
+        create_products(3)
+        # Categories are only listed to signed in users
+        self.user = create_user('shopper@example.com')
+
+    def test_every_route_has_a_budget(self):
+        self.assertEveryRouteBudgeted(router.urls + urlpatterns)
+
+    def test_list(self):
+        self.assertQueriesDoNotGrow(
+            'product-list', lambda: self.client.get(reverse('product-list')), lambda: create_products(6, start=100)
+        )
+
+    def test_list_with_search(self):
+        self.assertQueriesDoNotGrow(
+            'product-list', lambda: self.client.get(reverse('product-list'), {'search': 'palm oil'}),
+            lambda: create_products(6, start=100)
+        )
+
+    def test_list_with_cursor_pagination(self):
+        # No count query in cursor mode
+        self.query_budgets = dict(self.query_budgets, **{'product-list': 1})
+        self.assertQueriesDoNotGrow(
+            'product-list', lambda: self.client.get(reverse('product-list'), {'pagination': 'cursor'}),
+            lambda: create_products(6, start=100)
+        )
+
+    def test_detail(self):
+        self.assertWithinBudget('product-detail', lambda: self.client.get(reverse('product-detail', args=[1])))
+
+    def test_star_eight(self):
+        self.assertQueriesDoNotGrow(
+            'product-star-eight', lambda: self.client.get(reverse('product-star-eight')),
+            lambda: create_products(6, start=100)
+        )
+
+    @mock.patch('products.viewsets.process_product_image.delay')
+    def test_update_image(self, delay):
+        # The renditions are generated by a task, outside of the request
+        self.assertWithinBudget(
+            'product-update-image', lambda: self.client.post(reverse('product-update-image', args=[1]), {'image': make_image()})
+        )
+        delay.assert_called_once()
+
+    def test_category_list(self):
+        self.client.force_authenticate(self.user)
+        self.assertQueriesDoNotGrow(
+            'category-list', lambda: self.client.get(reverse('category-list')), lambda: create_products(6, start=100)
+        )
+
+    def test_category_detail(self):
+        self.client.force_authenticate(self.user)
+        category = Category.objects.first()
+        self.assertWithinBudget('category-detail', lambda: self.client.get(reverse('category-detail', args=[category.pk])))
+
+    def test_list_with_tags(self):
+        # The tag filter is a subquery on ProductTag, not an extra query
+        self.assertQueriesDoNotGrow(
+            'product-list', lambda: self.client.get(reverse('product-list'), {'tags': 'HOT,NEW', 'tag_mode': 'all'}),
+            lambda: create_products(6, start=100)
+        )
+
+    def test_list_with_facets(self):
+        # One more query for the facets
+        self.query_budgets = dict(self.query_budgets, **{'product-list': 3})
+        self.assertQueriesDoNotGrow(
+            'product-list', lambda: self.client.get(reverse('product-list'), {'search': 'palm', 'facets': 'true'}),
+            lambda: create_products(6, start=100)
+        )
+
+
+    def test_homepage(self):
+        self.assertQueriesDoNotGrow(
+            'homepage', lambda: self.client.get(reverse('homepage')), lambda: create_products(6, start=100)
+        )
+
+
+class HomepageTests(QueryBudgetTestCase):
+    """
+    The precomputed homepage payload.
+    """
+    def setUp(self):
+        cache.clear()
+        create_products(3)
+
+    def test_payload_is_served_from_the_cache(self):
+        response = self.client.get(reverse('homepage'))
+        data = json.loads(response.content)
+        self.assertEqual([product['product_identifier'] for product in data['star_eight']], [1, 2, 3])
+        self.assertEqual(len(data['categories']), 3)
+        self.assertEqual(data['products']['count'], 3)
+
+        with self.assertNumQueries(0):
+            cached = self.client.get(reverse('homepage'))
+        self.assertEqual(cached.content, response.content)
+
+        with self.assertNumQueries(0):
+            not_modified = self.client.get(reverse('homepage'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], response['ETag'])
+
+    def test_rebuilt_when_the_catalog_changes(self):
+        etag = self.client.get(reverse('homepage'))['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=1).get().delete()
+
+        # Rebuilt by the task, not by the request
+        self.assertNotEqual(cache.get(HOMEPAGE_KEY)[1], etag)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('homepage'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['products']['count'], 2)
+
+    def test_missing_payload_is_built_once(self):
+        # Another request holds the lock and stores the payload while this one waits
+        cache.add(HOMEPAGE_LOCK_KEY, 1)
+        stored = (1, '"etag"', b'{}')
+        with mock.patch('products.homepage.time.sleep', side_effect=lambda seconds: cache.set(HOMEPAGE_KEY, stored)):
+            with self.assertNumQueries(0):
+                response = self.client.get(reverse('homepage'))
+        self.assertEqual(response['ETag'], '"etag"')
+        self.assertEqual(response.content, b'{}')
+
+    @mock.patch('products.tasks.rebuild_homepage.delay', side_effect=ConnectionError)
+    def test_dropped_when_the_rebuild_cannot_be_scheduled(self, delay):
+        self.client.get(reverse('homepage'))
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(pk=1).save()
+        self.assertIsNone(cache.get(HOMEPAGE_KEY))
+
+
+class AsyncProductViewTests(QueryBudgetTestCase):
+    """
+    The async variants of the product endpoints answer like the synchronous ones, within the same budgets.
+    """
+    query_budgets = {
+        'async-product-list': 2,  # page + count
+        'async-product-detail': 1,
+        'async-product-star-eight': 1,
+    }
+
+    def setUp(self):
+        create_products(12)
+
+    def assertSameResponse(self, route_name, async_route_name, args=(), params=None):
+        response = self.client.get(reverse(route_name, args=args), params)
+        async_response = self.client.get(reverse(async_route_name, args=args), params)
+        self.assertEqual(async_response.status_code, response.status_code)
+        # Pagination links point to the endpoint that was called
+        self.assertEqual(async_response.content, response.content.replace(b'/products/', b'/async/products/'))
+
+    def test_every_route_has_a_budget(self):
+        self.assertEveryRouteBudgeted(async_urlpatterns)
+
+    def test_list(self):
+        self.assertQueriesDoNotGrow(
+            'async-product-list', lambda: self.client.get(reverse('async-product-list')), lambda: create_products(6, start=100)
+        )
+        self.assertSameResponse('product-list', 'async-product-list')
+        self.assertSameResponse('product-list', 'async-product-list', params={'page': 2})
+        self.assertSameResponse('product-list', 'async-product-list', params={'page': 'last', 'search': 'palm'})
+        self.assertSameResponse('product-list', 'async-product-list', params={'pagination': 'cursor'})
+        self.assertSameResponse('product-list', 'async-product-list', params={'tags': 'HOT', 'facets': 'true'})
+
+    def test_list_errors(self):
+        self.assertSameResponse('product-list', 'async-product-list', params={'page': 3})
+        self.assertSameResponse('product-list', 'async-product-list', params={'min_price': 'abc'})
+        self.assertEqual(self.client.post(reverse('async-product-list')).status_code, 405)
+
+    def test_detail(self):
+        self.assertWithinBudget('async-product-detail', lambda: self.client.get(reverse('async-product-detail', args=[1])))
+        self.assertSameResponse('product-detail', 'async-product-detail', args=[1])
+        self.assertEqual(self.client.get(reverse('async-product-detail', args=[999])).status_code, 404)
+
+    def test_star_eight(self):
+        self.assertQueriesDoNotGrow(
+            'async-product-star-eight', lambda: self.client.get(reverse('async-product-star-eight')),
+            lambda: create_products(6, start=100)
+        )
+        self.assertSameResponse('product-star-eight', 'async-product-star-eight')
+
+    def test_cache_is_shared_with_the_synchronous_views(self):
+        self.client.get(reverse('product-detail', args=[1]))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('async-product-detail', args=[1]))
+
+
+class ProductListFilterTests(QueryBudgetTestCase):
+    """
+    Filters and facets of the product list.
+    """
+    def setUp(self):
+        cache.clear()
+        create_products(4)  # Priced 1 to 4, one category each
+
+    def test_one_sided_price_filters(self):
+        response = self.client.get(reverse('product-list'), {'min_price': '3'})
+        self.assertEqual([product['price'] for product in response.data['results']], ['3.00', '4.00'])
+        response = self.client.get(reverse('product-list'), {'max_price': '2'})
+        self.assertEqual([product['price'] for product in response.data['results']], ['1.00', '2.00'])
+        response = self.client.get(reverse('product-list'), {'min_price': 'cheap'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_facets(self):
+        Product.objects.filter(product_identifier=4).update(category=Category.objects.get(name='Category 1'), tags=['NEW'])
+        response = self.client.get(reverse('product-list'), {'facets': 'true', 'min_price': '1'})
+        facets = response.data['facets']
+        self.assertEqual(facets['categories'][0], {'name': 'Category 1', 'count': 2})
+        self.assertEqual(facets['tags'], [{'tag': 'HOT', 'count': 3}, {'tag': 'NEW', 'count': 1}])
+        self.assertEqual(facets['price'][0], {'min': 0, 'max': 5, 'count': 4})
+        self.assertNotIn('facets', self.client.get(reverse('product-list')).data)
+
+    def tag(self, identifier, tags):
+        product = Product.objects.get(product_identifier=identifier)
+        product.tags = tags
+        product.save()
+
+    def list_identifiers(self, params):
+        response = self.client.get(reverse('product-list'), params)
+        return sorted(product['product_identifier'] for product in response.data['results'])
+
+    def test_tags_are_synced(self):
+        self.tag(1, ['new', ' Hot ', 'NONE'])
+        self.assertEqual(set(ProductTag.objects.filter(product_id=1).values_list('tag', flat=True)), {'HOT', 'NEW'})
+        # Saves that leave the tags alone do not touch the table
+        product = Product.objects.get(product_identifier=1)
+        product.stock = 5
+        with self.assertNumQueries(1):
+            product.save(update_fields=['stock'])
+
+    def test_tag_filters(self):
+        self.tag(1, ['HOT', 'NEW'])
+        self.tag(2, ['NEW'])
+        self.tag(3, 'NONE')
+        self.assertEqual(self.list_identifiers({'tags': 'hot'}), [1, 4])
+        self.assertEqual(self.list_identifiers({'tags': 'HOT,NEW'}), [1, 2, 4])
+        self.assertEqual(self.list_identifiers([('tags', 'HOT'), ('tags', 'NEW'), ('tag_mode', 'all')]), [1])
+        self.assertEqual(self.list_identifiers({'tags': 'SALE'}), [])
+        response = self.client.get(reverse('product-list'), {'tags': 'HOT', 'tag_mode': 'some'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_categories_filter(self):
+        self.assertEqual(self.list_identifiers({'categories': 'Category 1,Category 3'}), [1, 3])
+
+    def test_equivalent_lists_share_a_cache_entry(self):
+        create_products(8, start=10)
+        self.client.get(reverse('product-list'), [('tags', 'hot'), ('min_price', '1')])
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                reverse('product-list'), [('page', '1'), ('min_price', '1'), ('tags', ' HOT '), ('utm_source', 'mail')]
+            )
+        # The links are those of the URL that was requested
+        self.assertIn('utm_source=mail', response.data['next'])
+        self.assertIn('page=2', response.data['next'])
+
+        with self.assertNumQueries(2):
+            self.client.get(reverse('product-list'), [('tags', 'hot'), ('min_price', '1'), ('page', '2')])
+
+
+class ProductSearchTests(QueryBudgetTestCase):
+    """
+    Ranking and matching of the product search (see products/search.py).
+    """
+    def setUp(self):
+        cache.clear()
+        cosmetics = Category.objects.create(name='Cosmetics')
+        for identifier, name, description in [
+            (1, 'Crème de karité', 'Shea butter'),
+            (2, 'Shea soap', 'With karite'),
+            (3, 'Palm oil', 'Red palm oil'),
+        ]:
+            Product.objects.create(
+                product_identifier=identifier, image_url='https://example.com/p.jpg', name=name, price=1,
+                description=description, weight_kg=1, weight_lbs=2.2, default_quantity=1, tags=['NONE'],
+                category=cosmetics,
+            )
+
+    def search(self, query):
+        response = self.client.get(reverse('product-list'), {'search': query})
+        return [product['product_identifier'] for product in response.data['results']]
+
+    def test_ranking(self):
+        # In the name (10) before in the description (1)
+        self.assertEqual(self.search('shea'), [2, 1])
+        self.assertEqual(self.search('karite'), [1, 2])
+
+    def test_accents_are_folded(self):
+        self.assertEqual(self.search('creme'), [1])
+        self.assertEqual(self.search('KARITÉ'), [1, 2])
+
+    def test_prefix_matching(self):
+        self.assertEqual(self.search('kar'), [1, 2])
+        self.assertEqual(self.search('palm oi'), [3])
+        # Only the last word is a prefix, from two characters
+        self.assertEqual(self.search('palm o'), [])
+        self.assertEqual(self.search('pal oil'), [])
+
+    def test_rebuilding_the_index_moves_the_catalog_version(self):
+        version = get_catalog_version()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertNotEqual(get_catalog_version(), version)
+        self.assertEqual(self.search('kar'), [1, 2])
+
+    def test_migration_builds_the_same_index(self):
+        migration = importlib.import_module('products.migrations.0005_product_search_term')
+        entries = set(ProductSearchTerm.objects.values_list('term', 'product_id', 'weight'))
+        ProductSearchTerm.objects.all().delete()
+        with mock.patch.object(migration, 'BATCH_SIZE', 2):
+            migration.build_search_index(apps, None)
+        self.assertEqual(set(ProductSearchTerm.objects.values_list('term', 'product_id', 'weight')), entries)
+
+    def test_tag_migration_builds_the_same_table(self):
+        migration = importlib.import_module('products.migrations.0006_product_tag')
+        Product.objects.filter(pk=2).update(tags=[' new', 'Hot', 'NONE'])
+        Product.objects.filter(pk=3).update(tags='SALE')
+        ProductTag.objects.all().delete()
+        with mock.patch.object(migration, 'BATCH_SIZE', 2):
+            migration.backfill_product_tags(apps, None)
+        self.assertEqual(
+            set(ProductTag.objects.values_list('tag', 'product_id')), {('NEW', 2), ('HOT', 2), ('SALE', 3)}
+        )
+
+
+class CursorPaginationTests(QueryBudgetTestCase):
+    """
+    Keyset ("?pagination=cursor") pagination of the product list.
+    """
+    def setUp(self):
+        cache.clear()
+        create_products(12)
+        # Ties on name across the page boundary, broken by product_identifier
+        Product.objects.filter(product_identifier__gte=5).update(name='Palm oil')
+
+    def get_page(self, params):
+        response = self.client.get(reverse('product-list'), dict(params, pagination='cursor'))
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def follow(self, link):
+        response = self.client.get(link)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    @staticmethod
+    def identifiers(page):
+        return [product['product_identifier'] for product in page['results']]
+
+    def test_forward_and_backward(self):
+        first = self.get_page({})
+        # 'Palm oil' sorts before 'Palm oil 1'...
+        self.assertEqual(self.identifiers(first), [5, 6, 7, 8, 9, 10, 11, 12, 1])
+        self.assertIsNone(first['previous'])
+
+        second = self.follow(first['next'])
+        self.assertEqual(self.identifiers(second), [2, 3, 4])
+        self.assertIsNone(second['next'])
+
+        self.assertEqual(self.identifiers(self.follow(second['previous'])), self.identifiers(first))
+
+    def test_search_results(self):
+        # Ordered by rank first, an annotation
+        first = self.get_page({'search': 'palm'})
+        second = self.follow(first['next'])
+        self.assertEqual(len(first['results']) + len(second['results']), 12)
+        self.assertFalse(set(self.identifiers(first)) & set(self.identifiers(second)))
+
+    def test_tampered_cursors(self):
+        cursors = [
+            'not base64!',
+            urlsafe_b64encode(b'not json').decode(),
+            urlsafe_b64encode(b'{"key": "Palm oil", "reverse": false}').decode(),
+            urlsafe_b64encode(b'{"key": ["Palm oil"], "reverse": false}').decode(),
+            urlsafe_b64encode(b'{"key": ["Palm oil", "abc"], "reverse": false}').decode(),
+            urlsafe_b64encode(b'{"key": ["Palm oil", [1]], "reverse": false}').decode(),
+            urlsafe_b64encode(b'{"key": [null, 5], "reverse": false}').decode(),
+            urlsafe_b64encode(b'{"key": ["Palm oil", 5]}').decode(),
+        ]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                response = self.client.get(reverse('product-list'), {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+class ExplainCatalogQueriesTests(SimpleTestCase):
+    """
+    Plan parsing of the explain_catalog_queries command.
+    """
+    def test_sqlite(self):
+        plan = ('6 0 0 SCAN products_product\n9 0 0 SCAN products_category\n'
+                '11 0 0 SCAN U0 USING COVERING INDEX tag_idx\n52 0 0 USE TEMP B-TREE FOR ORDER BY')
+        self.assertEqual(find_issues(plan, 'sqlite'), ['full scan of products_product', 'filesort'])
+        self.assertEqual(find_issues('2 0 0 SCAN products_product USING INDEX product_name_idx', 'sqlite'), [])
+
+    def test_postgresql(self):
+        plan = ('Limit\n  ->  Sort\n        ->  Seq Scan on products_product\n'
+                '  ->  Incremental Sort\n        ->  Index Scan using product_name_idx on products_product')
+        self.assertEqual(find_issues(plan, 'postgresql'), ['full scan of products_product', 'filesort'])
+
+    def test_mysql(self):
+        plan = {'query_block': {'ordering_operation': {'using_filesort': True, 'nested_loop': [
+            {'table': {'table_name': 'products_product', 'access_type': 'ALL'}},
+            {'table': {'table_name': 'products_category', 'access_type': 'eq_ref'}},
+        ]}}}
+        self.assertEqual(find_issues(json.dumps(plan), 'mysql'), ['full scan of products_product', 'filesort'])
+
+
+class ExplainCatalogQueriesCommandTests(QueryBudgetTestCase):
+    def test_every_combination_is_explained(self):
+        create_products(3)
+        output = StringIO()
+        call_command('explain_catalog_queries', '--verbose', stdout=output)
+        self.assertIn('search+categories+price_range+all_tags [page]', output.getvalue())
+        self.assertIn('unfiltered [count]', output.getvalue())
+
+
+class ProductImageTests(QueryBudgetTestCase):
+    """
+    The image pipeline, run inline (CELERY_TASK_ALWAYS_EAGER) against the local filesystem storage.
+    """
+    def setUp(self):
+        create_products(2)
+
+    def test_renditions(self):
+        response = self.client.post(reverse('product-update-image', args=[1]), {'image': make_image()})
+        self.assertEqual(response.status_code, 202)
+
+        product = Product.objects.get(pk=1)
+        self.assertEqual(set(product.image_renditions), {'thumbnail', 'grid', 'detail', 'original'})
+        self.assertEqual(product.image_url, product.image_renditions['detail'])
+
+        storage = get_storage()
+        for name, (width, height) in settings.PRODUCT_IMAGE_RENDITIONS.items():
+            path = storage.path(product.image_renditions[name].removeprefix(settings.MEDIA_URL))
+            with Image.open(path) as image:
+                # Resized within the bounding box, aspect ratio kept
+                self.assertEqual(image.size, (width, width * 3 // 4))
+
+    def test_identical_uploads_are_stored_once(self):
+        self.client.post(reverse('product-update-image', args=[1]), {'image': make_image(name='first.png')})
+        storage = get_storage()
+        with mock.patch.object(storage, 'save', wraps=storage.save) as save:
+            self.client.post(reverse('product-update-image', args=[2]), {'image': make_image(name='second.png')})
+        save.assert_not_called()
+
+        first, second = (Product.objects.get(pk=pk).image_renditions for pk in (1, 2))
+        self.assertEqual(first, second)
+        # Named after the SHA-256 of the content, not after the uploaded file
+        self.assertRegex(second['original'], r'/products/([0-9a-f]{2})/\1[0-9a-f]{62}\.png$')
+
+    def test_upload_is_discarded_when_the_broker_is_down(self):
+        storage = get_storage()
+        broker_down = mock.patch('products.viewsets.process_product_image.delay', side_effect=OperationalError('Connection refused'))
+        with broker_down:
+            response = self.client.post(reverse('product-update-image', args=[1]), {'image': make_image(name='first.png')})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(Product.objects.get(pk=1).image_renditions, {})
+        digest = hashlib.sha256(make_image().read()).hexdigest()
+        self.assertFalse(storage.exists(content_name(digest, 'png')))
+
+        # A file some product already shows is kept
+        self.client.post(reverse('product-update-image', args=[1]), {'image': make_image(name='first.png')})
+        with broker_down:
+            self.client.post(reverse('product-update-image', args=[2]), {'image': make_image(name='second.png')})
+        original = Product.objects.get(pk=1).image_renditions['original']
+        self.assertTrue(storage.exists(original.removeprefix(settings.MEDIA_URL)))
+
+    def test_invalid_uploads(self):
+        not_an_image = SimpleUploadedFile('new.png', b'not an image', content_type='image/png')
+        response = self.client.post(reverse('product-update-image', args=[1]), {'image': not_an_image})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('product-update-image', args=[1]), {'image': make_image(image_format='BMP')})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Product.objects.get(pk=1).image_renditions, {})
+
+
+class CatalogImportExportTests(QueryBudgetTestCase):
+    """
+    The import_products and export_products commands.
+    """
+    def setUp(self):
+        create_products(2)
+
+    def import_file(self, content, suffix, *args):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as file:
+            file.write(content)
+        self.addCleanup(os.remove, file.name)
+        output, errors = StringIO(), StringIO()
+        call_command('import_products', file.name, *args, stdout=output, stderr=errors)
+        return output.getvalue(), errors.getvalue()
+
+    def test_round_trip(self):
+        for file_format in ('csv', 'jsonl'):
+            exported = StringIO()
+            call_command('export_products', '--format', file_format, stdout=exported)
+            output, errors = self.import_file(exported.getvalue(), f'.{file_format}')
+            self.assertIn('0 products created, 2 updated, 0 rows with errors', output)
+            self.assertEqual(Product.objects.get(pk=2).tags, ['HOT'])
+
+    def test_import(self):
+        header = ','.join(FIELDS)
+        content = '\n'.join([
+            header,
+            '1,Palm oil 1,Category 1,9.50,Red palm oil,1,2.2,1,40,HOT,https://example.com/1.jpg',
+            '3,Shea butter,Cosmetics,12,Raw shea butter,0.5,1.1,1,,NEW|hot,https://example.com/3.jpg',
+            '4,Broken,Cosmetics,cheap,,1,2.2,1,5,,not a url',
+            '3,Shea butter again,Cosmetics,12,Raw shea butter,0.5,1.1,1,5,,https://example.com/3.jpg',
+        ])
+        output, errors = self.import_file(content, '.csv', '--batch-size', '10')
+
+        self.assertIn('1 products created, 1 updated, 2 rows with errors', output)
+        self.assertIn('Line 4: price:', errors)
+        self.assertIn('description: This field is required.', errors)
+        self.assertIn('Line 5: product_identifier: 3 repeated', errors)
+
+        self.assertEqual(Product.objects.get(pk=1).price, 9.5)
+        created = Product.objects.get(pk=3)
+        self.assertEqual((created.category.name, created.stock, created.tags), ('Cosmetics', 1, ['NEW', 'hot']))
+        # Bulk writes skip the signals: the command refreshes the search index and tags itself
+        self.assertEqual(self.client.get(reverse('product-list'), {'search': 'shea'}).data['count'], 1)
+        self.assertEqual(set(ProductTag.objects.filter(product_id=3).values_list('tag', flat=True)), {'HOT', 'NEW'})
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import viewsets
+from . import views, viewsets
 
 router = DefaultRouter()
 # Registers the ProductViewSet for handling requests related to products
@@ -11,4 +11,6 @@ router.register(r'categories', viewsets.CategoryViewSet)
 urlpatterns = [
     # Includes the URL patterns from the registered viewsets.
     path('', include(router.urls)),
+    # Precomputed homepage data: star products, categories and the first page of products in one response
+    path('homepage/', views.homepage, name='homepage'),
 ]
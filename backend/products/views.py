@@ -0,0 +1,25 @@
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_safe
+
+from .homepage import get_homepage
+
+@require_safe
+def homepage(request):
+    """
+    Serves the precomputed homepage payload (see products/homepage.py): "star_eight", "categories" and
+    "products" (first page of the product list) in one response.
+
+    A plain Django view rather than a DRF one: the payload is public and already rendered, so the request is
+    served with one cache GET, without authentication, serialization or content negotiation. Clients sending
+    back the ETag get a 304 while the catalog is unchanged.
+    """
+    etag, body = get_homepage()
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    # Browsers may keep the payload but must check it is current before using it
+    response['Cache-Control'] = 'no-cache'
+    return response
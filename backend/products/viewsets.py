@@ -1,12 +1,23 @@
 # ACTIVELY IMPLEMENTING THIS VIEWSET SO PLEASE KEEP THAT IN MIND.
+import json
+
 from rest_framework import viewsets, status
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from .models import Product, Category  
 from .serializers import ProductSerializer, CategorySerializer 
-from custom_admin.AWS.ProductImageUpload import upload_to_s3
+from .search import search_products
+from .pagination import KeysetPagination, rebase_links
+from .cache import build_catalog_key, get_or_build
+from .facets import get_facets
+from .images import InvalidImage, discard_original, store_original
+from .tasks import process_product_image
+from .tags import TAG_MODES, filter_by_tags, normalize_tag
 from rest_framework.decorators import action
-from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from decimal import Decimal, InvalidOperation
+from kombu.exceptions import OperationalError
+from custom_admin.AWS.cloudwatch_error_logging import log_critical_error
 from rest_framework import viewsets, status, pagination
 
 class CustomPagination(pagination.PageNumberPagination):
@@ -27,70 +38,219 @@ class ProductViewSet(viewsets.ModelViewSet):
     - queryset: The initial queryset used for listing and filtering products.
     - serializer_class: The serializer class used for product instances.
     - pagination_class: The pagination class applied to list responses.
+    - cursor_pagination_class: The pagination class used instead when the client asks for cursor pagination
+    (infinite scroll) with "?pagination=cursor" or by sending a cursor.
     """
     permission_classes = [AllowAny]
-    queryset = Product.objects.all().order_by('name')
+    # ProductSerializer reads category.name: join the category instead of one extra query per product
+    queryset = Product.objects.select_related('category').order_by('name')
     serializer_class = ProductSerializer
     pagination_class = CustomPagination
+    cursor_pagination_class = KeysetPagination
+
+    @property
+    def paginator(self):
+        """
+        Page number pagination by default, cursor pagination when requested.
+        """
+        if not hasattr(self, '_paginator'):
+            if self.is_cursor_paginated(self.request.query_params):
+                self._paginator = self.cursor_pagination_class()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
 
     def list(self, request, *args, **kwargs):
         """
         ACTIVELY IMPLEMENTING THIS
         Custom list view to handle various filtering and searching parameters such as:
-        - search_query: For text-based search.
-        - category_query: To filter products based on category.
-        - price range: To filter products within a specified price range.
-        - tags: To filter products based on specific tags.
-        """
-        search_query = request.query_params.get('search', None)
-        category_query = request.query_params.get('category', None)
-        min_price = request.query_params.get('min_price', None)
-        max_price = request.query_params.get('max_price', None)
-        tags = request.query_params.getlist('tags', None)  # For tag-based filtering
-
-        # Base queryset
-        queryset = Product.objects.all()
-
-        # Filter by search query and category
-        if search_query:
-            if category_query and category_query != 'all':
-                queryset = queryset.filter(Q(name__icontains=search_query), Q(category__name=category_query))
+        - search: For text-based search. Uses the product search index (see products/search.py) and
+        orders the results by relevance.
+        - category: To filter products based on category ('all' means no filter).
+        - min_price / max_price: To filter products within a price range. Either bound can be given alone.
+        - categories: To filter products in any of several categories (repeatable or comma separated).
+        - tags: To filter products carrying specific tags such as 'HOT' or 'NEW' (repeatable or comma separated,
+        case insensitive). Uses the ProductTag table (see products/tags.py).
+        - tag_mode: 'any' (default) keeps products with at least one of the tags, 'all' those with every one.
+        - facets: "true" adds a "facets" block with the category, tag and price range counts of the matching
+        products (see products/facets.py).
+
+        Any combination of these filters can be used. Responses are paginated by page number ("?page=2") unless
+        "?pagination=cursor" is given, in which case they contain opaque "next"/"previous" cursors and no total
+        count. Filters work the same in both modes.
+
+        Responses are cached per normalized filters and page until the catalog changes (see products/cache.py).
+        """
+        filters = self.get_list_filters(request)
+
+        def build():
+            queryset = self.get_list_queryset(request, filters)
+
+            # Apply pagination
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                serializer = ProductSerializer(page, many=True)
+                data = self.get_paginated_response(serializer.data).data
             else:
-                queryset = queryset.filter(name__icontains=search_query)
+                # Fallback if pagination is not applicable
+                data = {'results': ProductSerializer(queryset, many=True).data}
+
+            if request.query_params.get('facets', '').lower() in ('true', '1'):
+                data['facets'] = get_facets(queryset, filters)
+            elif page is None:
+                data = data['results']
+            return data
+
+        data = get_or_build(build_catalog_key('products:list', *self.get_list_cache_parts(request, filters)), build)
+        if isinstance(data, dict) and 'next' in data:
+            data = rebase_links(data, request.build_absolute_uri())
+        return Response(data)
+
+    @staticmethod
+    def is_cursor_paginated(params):
+        """
+        Whether the list is paginated with cursors ("?pagination=cursor", or a cursor was sent) or page numbers.
+        """
+        return params.get('pagination') == 'cursor' or 'cursor' in params
+
+    def get_list_cache_parts(self, request, filters):
+        """
+        Identifies a list response for the catalog cache: the normalized filters, the pagination mode with the page
+        number or cursor, and whether facets are included. Other query parameters (tracking parameters, a
+        different order or spelling of the same filters) do not make a new cache entry.
+
+        Args:
+        - request (Request): The list request.
+        - filters (dict): The request's filters, from get_list_filters().
+
+        Returns:
+        - tuple: The parts of the key, for build_catalog_key().
+        """
+        params = request.query_params
+        if self.is_cursor_paginated(params):
+            position = ('cursor', params.get('cursor', ''))
+        else:
+            position = ('page', params.get('page', '1'))
+        facets = params.get('facets', '').lower() in ('true', '1')
+        return (json.dumps(filters, sort_keys=True, default=str), *position, facets)
+
+    def get_list_filters(self, request):
+        """
+        Reads the list filters from the query parameters, in a normalized form: two requests filtering the same
+        products give the same dict whatever the parameter order, case or spacing.
+
+        Raises:
+        - ValidationError: If a price bound is not a number or tag_mode is unknown (400 response).
+
+        Returns:
+        - dict: "search", "category", "categories" (sorted list), "min_price", "max_price", "tags" (sorted list
+        of normalized tags) and "tag_mode", None when not filtered.
+        """
+        params = request.query_params
+        search_query = ' '.join(params.get('search', '').lower().split())
+        category_query = params.get('category', '').strip()
+
+        prices = {}
+        for bound in ('min_price', 'max_price'):
+            value = params.get(bound, '').strip()
+            try:
+                prices[bound] = Decimal(value) if value else None
+            except InvalidOperation:
+                raise ValidationError({bound: 'A valid number is required.'})
+            if prices[bound] is not None and not prices[bound].is_finite():
+                raise ValidationError({bound: 'A valid number is required.'})
 
-        # Filter by category tags
-        if tags:
-            queryset = queryset.filter(category__name__in=tags)
+        tag_mode = params.get('tag_mode', 'any').strip().lower() or 'any'
+        if tag_mode not in TAG_MODES:
+            raise ValidationError({'tag_mode': f"Must be one of: {', '.join(TAG_MODES)}."})
 
-        # Filter by price range
-        if min_price and max_price:
-            queryset = queryset.filter(price__gte=min_price, price__lte=max_price)
+        # The storefront sends lists comma separated ("tags=HOT,NEW"), other clients may repeat the parameter
+        categories = self.get_list_values(params, 'categories')
+        tags = {normalize_tag(tag) for tag in self.get_list_values(params, 'tags')} - {None}
 
-        # Apply pagination
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = ProductSerializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
+        return {
+            'search': search_query or None,
+            'category': category_query if category_query and category_query != 'all' else None,
+            'categories': sorted(categories) or None,
+            'min_price': prices['min_price'],
+            'max_price': prices['max_price'],
+            'tags': sorted(tags) or None,
+            # Only meaningful with several tags: keeping it out otherwise lets equivalent requests share facets
+            'tag_mode': tag_mode if len(tags) > 1 else None,
+        }
 
-        # Fallback if pagination is not applicable
-        serializer = ProductSerializer(queryset, many=True)
-        return Response(serializer.data)
+    @staticmethod
+    def get_list_values(params, name):
+        """
+        Returns the set of non empty values of a repeatable, comma separated query parameter.
+        """
+        return {value.strip() for param in params.getlist(name) for value in param.split(',') if value.strip()}
+
+    def get_list_queryset(self, request, filters=None):
+        """
+        Builds the filtered (but not paginated) queryset behind the list view from the request's query parameters.
+        """
+        if filters is None:
+            filters = self.get_list_filters(request)
+
+        # Base queryset. Ends with product_identifier so the order is stable for both pagination modes.
+        queryset = Product.objects.select_related('category').order_by('name', 'product_identifier')
+
+        # Filter by search query
+        if filters['search']:
+            queryset = search_products(queryset, filters['search'])
+
+        # Filter by category
+        if filters['category']:
+            queryset = queryset.filter(category__name=filters['category'])
+
+        # Filter by several categories
+        if filters['categories']:
+            queryset = queryset.filter(category__name__in=filters['categories'])
+
+        # Filter by tags, through the ProductTag index
+        if filters['tags']:
+            queryset = filter_by_tags(queryset, filters['tags'], filters['tag_mode'] or 'any')
+
+        # Filter by price range, either bound may be given alone
+        if filters['min_price'] is not None:
+            queryset = queryset.filter(price__gte=filters['min_price'])
+        if filters['max_price'] is not None:
+            queryset = queryset.filter(price__lte=filters['max_price'])
+
+        return queryset
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Retrieves a single product. Cached until the catalog changes.
+        """
+        def build():
+            return self.get_serializer(self.get_object()).data
+
+        data = get_or_build(build_catalog_key('products:retrieve', kwargs.get('pk')), build)
+        return Response(data)
 
     @action(detail=False, methods=['GET'])
     def star_eight(self, request):
         """
         Custom view to retrieve eight 'star' products.
-        Used to showcase top products, typically on the homepage.
+        Used to showcase top products, typically on the homepage. Cached until the catalog changes.
         """
-        queryset = Product.objects.all().order_by('product_identifier')[:8]
-        serializer = ProductSerializer(queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        def build():
+            queryset = Product.objects.select_related('category').order_by('product_identifier')[:8]
+            return ProductSerializer(queryset, many=True).data
+
+        data = get_or_build(build_catalog_key('products:star_eight'), build)
+        return Response(data, status=status.HTTP_200_OK)
     
     @action(detail=True, methods=['POST'])
     def update_image(self, request, pk=None):
         """
         Custom view to update the image of a specific product.
-        Uploads the new image to S3 and updates the product's image URL.
+        Stores the uploaded original and hands it to the process_product_image task, which generates the resized
+        renditions and updates the product's image URLs (see products/images.py). Responds 202 right away, the
+        product keeps its previous image until the renditions are ready. Responds 503 when the task cannot be
+        queued (broker unavailable): the upload is discarded and has to be sent again.
         """
         try:
             product = Product.objects.get(pk=pk)
@@ -98,13 +258,21 @@ class ProductViewSet(viewsets.ModelViewSet):
             return Response({'error': 'Product not found'}, status=status.HTTP_404_NOT_FOUND)
         
         image_file = request.FILES.get('image', None)
-        if image_file:
-            s3_url = upload_to_s3(image_file, f'products/{image_file.name}')
-            product.image_url = s3_url
-            product.save()
-            return Response({'image_url': s3_url}, status=status.HTTP_200_OK)
-        else:
+        if not image_file:
             return Response({'error': 'No image provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            original_name = store_original(image_file)
+        except InvalidImage as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            process_product_image.delay(product.pk, original_name)
+        except OperationalError as e:  # Broker unavailable
+            discard_original(original_name)
+            log_critical_error('Could not schedule the processing of a product image', exc_info=e)
+            return Response({'error': 'Image processing is unavailable, try again later'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response({'status': 'processing'}, status=status.HTTP_202_ACCEPTED)
     
 class CategoryViewSet(viewsets.ModelViewSet):
     """
@@ -113,4 +281,15 @@ class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.all().order_by('name')
     serializer_class = CategorySerializer
 
+    def list(self, request, *args, **kwargs):
+        """
+        Lists every category. Cached until the catalog changes.
+        """
+        def build():
+            return super(CategoryViewSet, self).list(request, *args, **kwargs).data
+
+        # Not paginated nor filtered: one entry whatever the query string
+        data = get_or_build(build_catalog_key('categories:list'), build)
+        return Response(data)
+
  
\ No newline at end of file
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class UserConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'user'
+
+    def ready(self):
+        # Connects the receivers invalidating the cached user details
+        from . import signals  # noqa: F401
@@ -0,0 +1,7 @@
+from django.urls import path
+from . import async_views
+
+# Async variant of the login endpoint under /async/user/
+urlpatterns = [
+    path('login/', async_views.login, name='async-user-login'), # Endpoint for user login
+]
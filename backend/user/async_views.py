@@ -0,0 +1,96 @@
+"""
+Async variant of the login endpoint, for the ASGI deployment (see backend/asgi.py). Mounted under /async/user/
+(see user/async_urls.py).
+"""
+import traceback
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import MultipleObjectsReturned, ObjectDoesNotExist
+from django.db import DatabaseError
+from django.http import HttpResponse
+from django_ratelimit.core import is_ratelimited
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from custom_admin.AWS.cloudwatch_activity_logging import log_admin_actions
+from custom_admin.AWS.cloudwatch_error_logging import log_authentication_issue
+from custom_admin.utils import async_api_view, cache_user_details, json_response, set_token_cookies
+from .models import User
+from .serializers import UserLoginSerializer
+from .views import CustomLogin
+
+
+@async_api_view(['POST'])
+async def login(request):
+    """
+    Async variant of CustomLogin: same credentials, rate limit, response and cookies.
+
+    The password hash is checked in a thread of its own (thread_sensitive=False): it is the slow part of a login,
+    and hashing releases the GIL, so concurrent logins are checked in parallel without blocking the event loop.
+    """
+    # Same rate limit group as CustomLogin.post, so that both endpoints count towards the same limit
+    if await sync_to_async(is_ratelimited)(request=request, fn=CustomLogin().post, key='ip', rate='10/m', method='POST', increment=True):
+        raise exceptions.PermissionDenied()
+
+    try:
+        data = Request(request, parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES]).data
+        serializer = UserLoginSerializer(data=data)
+        if not serializer.is_valid():
+            return json_response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        email = serializer.validated_data.get('email')
+        password = serializer.validated_data.get('password')
+
+        try:
+            user = await User.objects.aget(email=email)
+        except MultipleObjectsReturned:
+            log_authentication_issue("Multiple users with the same email", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, custom_tags='user authentication views', details={'email': email}, request=request)
+            return json_response({"error": "An unexpected error occurred."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        except ObjectDoesNotExist:
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+        except DatabaseError:
+            log_authentication_issue("Database Error occurred while fetching user", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, custom_tags='user authentication views', details={'email': email}, request=request)
+            return json_response({"error": "An unexpected error occurred."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        if not await sync_to_async(user.check_password, thread_sensitive=False)(password):
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+
+        # Issuing the tokens may record them in the database
+        access_token_str, refresh_token_str = await sync_to_async(issue_tokens)(user)
+
+        if user.is_superuser:
+            log_admin_actions(admin_user=user, action_type='Admin Login', level='INFO', details={'email': email, 'is_successful': True}, request=request)
+
+        response = json_response({
+            'access_token': access_token_str,
+            'refresh_token': refresh_token_str,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'is_admin': user.roles == 'admin',
+        })
+        set_token_cookies(response, access_token_str, refresh_token_str)
+        return response
+
+    except Exception as e:
+        details = {
+            "error": str(e),
+            "traceback": traceback.format_exc()
+        }
+        log_authentication_issue("An unexpected error occurred in the async login.", status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, custom_tags='user authentication views', details=details, request=request, exc_info=e)
+        return json_response({"error": "An unexpected error occurred."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def issue_tokens(user):
+    """
+    Generates the JWT tokens of a user who just logged in, and caches their details like CustomLogin does.
+
+    Returns:
+    - tuple: (access token, refresh token) as strings.
+    """
+    token_instance = RefreshToken.for_user(user)
+    for key, value in user.token_payload.items():
+        token_instance[key] = value
+    cache_user_details(user)
+    return str(token_instance.access_token), str(token_instance)
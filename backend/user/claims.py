@@ -0,0 +1,68 @@
+"""
+Authentication without a user query: the user is identified by the user_id claim of their token and built from
+their cached details (see custom_admin.utils.get_cached_user). The database is only read on a cache miss, and the
+details are cached for the next requests.
+
+Only the user ID is taken from the token. Roles and flags come from the cached details, which are invalidated
+whenever the user is saved (see user/signals.py): a role change, locking or deactivating a user applies to tokens
+issued before it.
+"""
+from asgiref.sync import sync_to_async
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from custom_admin.utils import cache_user_details, get_cached_user
+from .revocation import RevocationAwareAuthentication
+
+
+class ClaimsAuthentication(RevocationAwareAuthentication):
+    """
+    RevocationAwareAuthentication loading the user from the cache rather than the database.
+    """
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = get_cached_user(user_id)
+        if user is None:
+            # Loaded by CustomAuthentication as usual, then cached
+            user = super().get_user(validated_token)
+            cache_user_details(user)
+        check_user(user)
+        return user
+
+
+def check_user(user):
+    """
+    Rejects the users who may not authenticate, whether they were built from the cache or loaded from the database.
+
+    Args:
+    - user (User): The user identified by the token.
+
+    Raises:
+    - AuthenticationFailed: If the user is inactive or locked.
+    """
+    if not user.is_active:
+        raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+    if user.is_locked:
+        raise AuthenticationFailed(_('User is locked'), code='user_locked')
+
+
+async def aauthenticate(request):
+    """
+    Authenticates a request to an async view (see custom_admin.utils.async_api_view) like ClaimsAuthentication.
+
+    Token validation runs in a worker thread: besides checking the signature, CustomAuthentication may read the
+    database, which is not allowed from the event loop.
+
+    Returns:
+    - User or None: The authenticated user, None when the request carries no token.
+
+    Raises:
+    - AuthenticationFailed: If the token is invalid or revoked, or its user inactive or locked.
+    """
+    result = await sync_to_async(ClaimsAuthentication().authenticate)(request)
+    return result[0] if result else None
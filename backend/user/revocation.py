@@ -0,0 +1,197 @@
+"""
+Revoked token checks answered in-process.
+
+Logging out revokes the user's tokens with revoke(): they are blacklisted in TokenBlacklist as before, and their
+JTI is also added, with the token's expiry as score, to the REVOKED_JTIS_KEY Redis sorted set and announced on
+the REVOCATIONS_CHANNEL pub/sub channel (see custom_admin/redis_pubsub.py).
+
+Every process keeps the JTIs of the revoked, not yet expired tokens in a RevocationFilter, loaded from the sorted
+set when it subscribes and kept up to date by the channel. A token whose JTI is not in it is known not to be
+revoked without asking Redis, which is the case of nearly every request. Only a JTI found in the filter is
+confirmed in Redis. Expired JTIs are pruned from the filter and from the sorted set as time goes by: an expired
+token is refused by its signature check anyway.
+
+Authenticating a request therefore reads neither the database nor Redis: RevocationAwareAuthentication checks
+revocations with is_revoked() in place of CustomAuthentication's TokenBlacklist lookup.
+
+Whenever the filter may be incomplete (the process has not subscribed yet, or lost its subscription), every check
+asks Redis. Without Redis (tests, development on the local memory cache) revocations are kept in the Django cache
+and every check reads it.
+"""
+import os
+import threading
+import time
+
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from custom_admin import redis_pubsub
+from .authenticate import CustomAuthentication
+from .models import TokenBlacklist
+
+REVOKED_JTIS_KEY = 'auth:revoked_jtis'
+REVOCATIONS_CHANNEL = 'auth:revocations'
+# Expired JTIs are pruned from the filter at most this often, in seconds
+PRUNE_INTERVAL = 60
+
+_filter = None
+_filter_pid = None
+_filter_lock = threading.Lock()
+
+
+class RevocationFilter:
+    """
+    JTIs of the revoked tokens that have not expired yet, with their expiry.
+
+    Attributes:
+    - loaded (bool): Whether the filter holds every revocation. False until the sorted set has been read, and
+    again from a lost subscription until it is read anew.
+    """
+    def __init__(self):
+        self.loaded = False
+        self._expiries = {}  # JTI -> expiry (epoch seconds)
+        self._next_prune = 0
+        self._lock = threading.Lock()
+
+    def __contains__(self, jti):
+        now = time.time()
+        if now >= self._next_prune:
+            self.prune(now)
+        return jti in self._expiries
+
+    def __len__(self):
+        return len(self._expiries)
+
+    def add(self, jti, expires_at):
+        with self._lock:
+            self._expiries[jti] = expires_at
+
+    def prune(self, now=None):
+        """
+        Forgets the JTIs of the tokens expired by now.
+        """
+        now = now or time.time()
+        with self._lock:
+            self._expiries = {jti: expires_at for jti, expires_at in self._expiries.items() if expires_at > now}
+            self._next_prune = now + PRUNE_INTERVAL
+
+    def handle_message(self, message):
+        """
+        Records a revocation announced on REVOCATIONS_CHANNEL as "<jti> <expiry>".
+        """
+        jti, expires_at = message.split(' ')
+        self.add(jti, float(expires_at))
+
+    def reload(self):
+        """
+        Replaces the filter's content with the sorted set. Called on every (re)subscription.
+        """
+        self.loaded = False
+        connection = get_redis()
+        now = time.time()
+        entries = connection.zrangebyscore(REVOKED_JTIS_KEY, now, '+inf', withscores=True)
+        with self._lock:
+            self._expiries = {jti.decode() if isinstance(jti, bytes) else jti: score for jti, score in entries}
+            self._next_prune = now + PRUNE_INTERVAL
+        self.loaded = True
+
+    def reset(self):
+        self.loaded = False
+        try:
+            self.reload()
+        except Exception as e:  # Still unreachable, the next subscription tries again
+            print(f'Could not load the revoked tokens: {e!r}')
+
+
+def get_redis():
+    """
+    Returns the Redis client of the default cache, None when the default cache is not Redis.
+    """
+    try:
+        return redis_pubsub.get_connection()
+    except NotImplementedError:  # Raised by django_redis for any other cache backend
+        return None
+
+
+def get_filter():
+    """
+    Returns the revocation filter of this process, created and subscribed to REVOCATIONS_CHANNEL on first use in
+    every process (a filter inherited through a fork receives no messages). None without Redis.
+    """
+    global _filter, _filter_pid
+    if _filter is None or _filter_pid != os.getpid():
+        with _filter_lock:
+            if _filter is None or _filter_pid != os.getpid():
+                if get_redis() is None:
+                    return None
+                revocations = RevocationFilter()
+                redis_pubsub.subscribe(REVOCATIONS_CHANNEL, revocations.handle_message, on_reset=revocations.reset)
+                _filter = revocations
+                _filter_pid = os.getpid()
+    return _filter
+
+
+def revoke(token):
+    """
+    Revokes a validated token until it expires.
+
+    Args:
+    - token (Token): The validated access or refresh token.
+    """
+    TokenBlacklist.blacklist(token)
+    jti = token['jti']
+    expires_at = token['exp']
+    now = time.time()
+
+    connection = get_redis()
+    if connection is None:
+        cache.set(f'revoked_jti_{jti}', 1, timeout=max(int(expires_at - now), 1))
+        return
+
+    pipeline = connection.pipeline()
+    pipeline.zadd(REVOKED_JTIS_KEY, {jti: expires_at})
+    pipeline.zremrangebyscore(REVOKED_JTIS_KEY, '-inf', now)
+    pipeline.publish(REVOCATIONS_CHANNEL, f'{jti} {expires_at}')
+    pipeline.execute()
+
+    revocations = get_filter()
+    if revocations is not None:
+        # Effective in this process right away, before the message comes back
+        revocations.add(jti, expires_at)
+
+
+def is_revoked(token):
+    """
+    Returns whether a validated token was revoked, without a network round trip for the tokens that were not.
+
+    Args:
+    - token (Token): The validated token.
+
+    Returns:
+    - bool: True if the token was revoked.
+    """
+    jti = token['jti']
+    revocations = get_filter()
+    if revocations is not None and revocations.loaded and redis_pubsub.is_listening():
+        if jti not in revocations:
+            return False
+
+    connection = get_redis()
+    if connection is None:
+        return cache.get(f'revoked_jti_{jti}') is not None
+    return connection.zscore(REVOKED_JTIS_KEY, jti) is not None
+
+
+class RevocationAwareAuthentication(CustomAuthentication):
+    """
+    CustomAuthentication refusing the tokens revoked with revoke(), checked with the in-process filter before
+    the user is loaded.
+    """
+    def get_validated_token(self, raw_token):
+        # Signature, expiry and token type only. The TokenBlacklist lookup of CustomAuthentication is skipped:
+        # revoke() records every blacklisted token where is_revoked() finds it
+        validated_token = JWTAuthentication.get_validated_token(self, raw_token)
+        if is_revoked(validated_token):
+            raise InvalidToken('Token has been revoked')
+        return validated_token
@@ -0,0 +1,24 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from custom_admin.utils import USER_DETAIL_FIELDS, delete_cached_user_details
+from .models import User
+
+# Signal receivers keeping the cached user details (see custom_admin/utils.py) in sync with the User table.
+# QuerySet.update() sends no signal: call delete_cached_user_details() after updating users that way.
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_details(sender, instance, update_fields=None, **kwargs):
+    """
+    Drops the cached details of a user after they are saved or deleted, so that the next authenticated request
+    reloads them. Saves limited to fields that are not cached (save(update_fields=['last_login']) for example)
+    are skipped.
+
+    Dropped again on commit: a request reading the user before the commit could cache the old row in between.
+    """
+    if update_fields is not None and not set(USER_DETAIL_FIELDS) & set(update_fields):
+        return
+    delete_cached_user_details(instance.pk)
+    transaction.on_commit(lambda: delete_cached_user_details(instance.pk))
@@ -1,3 +1,190 @@
-from django.test import TestCase
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from custom_admin.testing import QueryBudgetTestCase, create_user
+from custom_admin.utils import cache_user_details, get_cached_user, get_cached_user_details
+from . import revocation
+from .models import TokenBlacklist
+from .urls import urlpatterns
+from .async_urls import urlpatterns as async_urlpatterns
+
+
+class UserQueryBudgetTests(QueryBudgetTestCase):
+    """
+    Query budgets of the login, registration and logout endpoints.
+    """
+    query_budgets = {
+        'user-login': 1,
+        'user-register': 4,  # email and phone number uniqueness checks + insert
+        'user-logout': 1,
+    }
+
+    def setUp(self):
+        self.user = create_user('shopper@example.com')
+
+    def login(self):
+        return self.client.post(reverse('user-login'), {'email': 'shopper@example.com', 'password': 'Passw0rd!'}, format='json')
+
+    def test_every_route_has_a_budget(self):
+        self.assertEveryRouteBudgeted(urlpatterns)
+
+    def test_login(self):
+        self.assertWithinBudget('user-login', self.login)
+
+    def test_register(self):
+        data = {
+            'first_name': 'Kofi', 'last_name': 'Boateng', 'email': 'kofi@example.com', 'password': 'Passw0rd!',
+            'phone_number': '555-123-4567', 'preferred_language': 'en',
+        }
+        self.assertWithinBudget('user-register', lambda: self.client.post(reverse('user-register'), data, format='json'))
+
+    def test_logout(self):
+        # Logging in sets the token cookies that logout reads
+        self.login()
+        self.assertWithinBudget('user-logout', lambda: self.client.post(reverse('user-logout')))
+
+    def test_logout_revokes_the_access_token(self):
+        self.login()
+        access_token = self.client.cookies[settings.SIMPLE_JWT['AUTH_COOKIE']].value
+        self.assertEqual(self.client.post(reverse('user-logout')).status_code, 204)
+
+        # The cookie is gone, replay the token as a stolen copy would be
+        self.client.cookies[settings.SIMPLE_JWT['AUTH_COOKIE']] = access_token
+        self.assertEqual(self.client.post(reverse('user-logout')).status_code, 401)
+
+
+class AsyncLoginTests(QueryBudgetTestCase):
+    query_budgets = {
+        'async-user-login': 1,
+    }
+
+    def setUp(self):
+        self.user = create_user('shopper@example.com', roles='admin')
+        # Login attempts are rate limited per IP address, with the counters kept in the cache
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def login(self, password='Passw0rd!'):
+        return self.client.post(reverse('async-user-login'), {'email': 'shopper@example.com', 'password': password}, format='json')
+
+    def test_every_route_has_a_budget(self):
+        self.assertEveryRouteBudgeted(async_urlpatterns)
+
+    def test_login(self):
+        response = self.assertWithinBudget('async-user-login', self.login)
+        self.assertEqual(
+            {key: value for key, value in response.json().items() if not key.endswith('_token')},
+            {'first_name': 'Ama', 'last_name': 'Mensah', 'is_admin': True},
+        )
+        self.assertIn(settings.SIMPLE_JWT['AUTH_COOKIE'], response.cookies)
+        self.assertIsNotNone(get_cached_user_details(self.user.pk))
+
+    def test_wrong_credentials(self):
+        self.assertEqual(self.login('Wr0ngPassword').status_code, 401)
+        self.assertEqual(self.login('short').status_code, 400)
+
+    def test_rate_limit_is_shared_with_the_synchronous_login(self):
+        for _ in range(10):
+            self.client.post(reverse('user-login'), {'email': 'shopper@example.com', 'password': 'Passw0rd!'}, format='json')
+        self.assertEqual(self.login().status_code, 403)
+
+
+class CachedUserTests(QueryBudgetTestCase):
+    def setUp(self):
+        self.user = create_user('shopper@example.com', roles='admin')
+        self.client.post(reverse('user-login'), {'email': 'shopper@example.com', 'password': 'Passw0rd!'}, format='json')
+
+    def test_login_caches_the_user_details(self):
+        with self.assertNumQueries(0):
+            user = get_cached_user(self.user.pk)
+            self.assertEqual((user.pk, user.email, user.roles, user.is_active), (self.user.pk, self.user.email, 'admin', True))
+        # Fields that are not cached are loaded on access
+        self.assertTrue(user.check_password('Passw0rd!'))
+
+    def test_role_change_invalidates_the_details(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.roles = 'user'
+            self.user.save()
+        self.assertIsNone(get_cached_user_details(self.user.pk))
+        self.assertEqual(self.client.post(reverse('admin-action-checker')).status_code, 403)
+
+    def test_locked_user_is_rejected_from_the_cached_details(self):
+        self.assertEqual(self.client.get(reverse('cartitem-list')).status_code, 200)
+        # Cached details of a user locked by a write that went around the signals
+        self.user.is_locked = True
+        cache_user_details(self.user)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('cartitem-list'))
+        self.assertEqual((response.status_code, response.data['detail']), (403, 'User is locked'))
+
+    def test_locking_or_deactivating_invalidates_the_details(self):
+        for field in ('is_locked', 'is_active'):
+            with self.subTest(field=field):
+                cache_user_details(self.user)
+                with self.captureOnCommitCallbacks(execute=True):
+                    setattr(self.user, field, field == 'is_locked')
+                    self.user.save(update_fields=[field])
+                self.assertIsNone(get_cached_user_details(self.user.pk))
+                self.assertEqual(self.client.get(reverse('cartitem-list')).status_code, 403)
+                setattr(self.user, field, field != 'is_locked')
+                self.user.save(update_fields=[field])
+
+    def test_saves_of_other_fields_keep_the_details(self):
+        self.user.save(update_fields=['last_login'])
+        self.assertIsNotNone(get_cached_user_details(self.user.pk))
+
+
+class RevocationFilterTests(SimpleTestCase):
+    def test_messages_and_pruning(self):
+        revocations = revocation.RevocationFilter()
+        revocations.handle_message(f'abc {time.time() + 60}')
+        revocations.handle_message(f'def {time.time() - 1}')
+        self.assertIn('abc', revocations)
+        self.assertNotIn('def', revocations)
+        self.assertEqual(len(revocations), 1)
+
+    def test_redis_only_asked_on_a_hit(self):
+        revocations = revocation.RevocationFilter()
+        revocations.loaded = True
+        revocations.add('abc', time.time() + 60)
+        redis = mock.Mock()
+        redis.zscore.return_value = time.time() + 60
+        with mock.patch.object(revocation, 'get_filter', return_value=revocations), \
+                mock.patch.object(revocation, 'get_redis', return_value=redis), \
+                mock.patch('custom_admin.redis_pubsub.is_listening', return_value=True):
+            self.assertFalse(revocation.is_revoked({'jti': 'xyz'}))
+            redis.zscore.assert_not_called()
+            self.assertTrue(revocation.is_revoked({'jti': 'abc'}))
+            redis.zscore.assert_called_once_with(revocation.REVOKED_JTIS_KEY, 'abc')
+
+    def test_token_that_was_not_revoked_needs_no_lookup(self):
+        revocations = revocation.RevocationFilter()
+        revocations.loaded = True
+        redis = mock.Mock()
+        token = AccessToken()
+        token['user_id'] = 1
+        # SimpleTestCase refuses database queries
+        with mock.patch.object(revocation, 'get_filter', return_value=revocations), \
+                mock.patch.object(revocation, 'get_redis', return_value=redis), \
+                mock.patch('custom_admin.redis_pubsub.is_listening', return_value=True), \
+                mock.patch.object(TokenBlacklist, 'is_blacklisted') as is_blacklisted:
+            validated_token = revocation.RevocationAwareAuthentication().get_validated_token(str(token))
+        self.assertEqual(validated_token['jti'], token['jti'])
+        self.assertEqual(redis.method_calls, [])
+        is_blacklisted.assert_not_called()
+
+    def test_redis_asked_while_not_in_sync(self):
+        revocations = revocation.RevocationFilter()  # Not loaded yet
+        redis = mock.Mock()
+        redis.zscore.return_value = None
+        with mock.patch.object(revocation, 'get_filter', return_value=revocations), \
+                mock.patch.object(revocation, 'get_redis', return_value=redis), \
+                mock.patch('custom_admin.redis_pubsub.is_listening', return_value=True):
+            self.assertFalse(revocation.is_revoked({'jti': 'xyz'}))
+        redis.zscore.assert_called_once()
@@ -2,7 +2,7 @@ from rest_framework import status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from .models import TokenBlacklist, User
+from .models import User
 from .serializers import UserLoginSerializer, UserRegistrationSerializer
 from django_ratelimit.decorators import ratelimit
 from rest_framework_simplejwt.tokens import RefreshToken
@@ -10,7 +10,9 @@ from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
 from django.db import DatabaseError
 from django.conf import settings
 from .authenticate import CustomAuthentication, AllowAll
-from custom_admin.utils import set_token_cookies
+from .claims import ClaimsAuthentication
+from .revocation import revoke
+from custom_admin.utils import cache_user_details, set_token_cookies
 from django.utils.decorators import method_decorator
 from custom_admin.AWS.cloudwatch_activity_logging import log_admin_actions, log_user_creation
 from custom_admin.AWS.cloudwatch_error_logging import log_authentication_issue
@@ -108,6 +110,9 @@ class CustomLogin(APIView):
                 'is_admin': user.roles == 'admin'  
                 }
 
+                # Authenticated requests build the user from these details instead of loading it (see user/claims.py)
+                cache_user_details(user)
+
                 response = JsonResponse(response_data, status=status.HTTP_200_OK)
                 set_token_cookies(response, access_token_str, refresh_token_str)  
 
@@ -131,7 +136,8 @@ class CustomLogout(APIView):
     Attributes:
     -----------
     - permission_classes: Permissions required to access this view. Set to IsAuthenticated to permit only authenticated users.
-    - authentication_classes: Authentication classes used for this view. Set to CustomAuthentication for this endpoint.
+    - authentication_classes: Authentication classes used for this view. Set to ClaimsAuthentication
+    (CustomAuthentication refusing revoked tokens, without a user query) for this endpoint.
 
     Methods:
     --------
@@ -143,11 +149,11 @@ class CustomLogout(APIView):
     """
     
     permission_classes = [IsAuthenticated]
-    authentication_classes = [CustomAuthentication]
+    authentication_classes = [ClaimsAuthentication]
 
     def post(self, request):
         """
-        Logs out a user by blacklisting their tokens.
+        Logs out a user by revoking their tokens, in every process at once (see user/revocation.py).
 
         Parameters:
         -----------
@@ -168,7 +174,7 @@ class CustomLogout(APIView):
             try:
                 # Verify the access token first
                 validated_access_token = custom_auth.get_validated_token(access_token)
-                TokenBlacklist.blacklist(validated_access_token)
+                revoke(validated_access_token)
             except exceptions.AuthenticationFailed:
                 # Token was invalid, but we can still proceed with logout
                 pass
@@ -180,7 +186,7 @@ class CustomLogout(APIView):
             try:
                 # Verify the refresh token first
                 validated_refresh_token = custom_auth.get_validated_token(refresh_token)
-                TokenBlacklist.blacklist(validated_refresh_token)
+                revoke(validated_refresh_token)
             except exceptions.AuthenticationFailed:
                 # Token was invalid, but we can still proceed with logout
                 pass
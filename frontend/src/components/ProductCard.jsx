@@ -17,6 +17,8 @@ import { addCartItem } from '../hub/slices/CartSlice';
  * Props:
  * - product_identifier, name, image_url, price, description, stock, tags, weight_kg, weight_lbs,
  *   default_quantity, category, category_name: These props are used to display the product information.
+ * - image_renditions: Resized copies of the image generated by the backend. The card shows the small "grid"
+ *   rendition when it exists instead of the full size image_url.
  *
  * State:
  * - selectedNum: The selected quantity of the product.
@@ -27,6 +29,7 @@ const ProductCard = ({
   product_identifier,
   name,
   image_url: image,
+  image_renditions,
   price,
   description,
   stock,
@@ -78,7 +81,7 @@ const ProductCard = ({
           {tags?.includes('HOT') && <span className={styles.hotTag}>HOT</span>}
           {tags?.includes('NEW') && <span className={styles.newTag}>NEW</span>}
           <Link to={`/products/${name}`}>
-            <img alt={name} src={image} className={styles.productImage} />
+            <img alt={name} src={image_renditions?.grid || image} className={styles.productImage} />
           </Link>
         </div>
         <div>
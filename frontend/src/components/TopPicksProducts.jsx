@@ -3,7 +3,7 @@ import { Link } from 'react-router-dom';
 import styles from './TopPicksProducts.module.css';
 import ProductCard from './ProductCard';
 import { useSelector, useDispatch } from 'react-redux';
-import { fetchStarEightProducts } from '../hub/slices/ProductSlice';
+import { fetchHomepage } from '../hub/slices/ProductSlice';
 
 /**
  * TopPicksProducts Component
@@ -13,6 +13,9 @@ import { fetchStarEightProducts } from '../hub/slices/ProductSlice';
  * The component uses ProductCard to individually render each product. See the ProductCard component
  * if you need more info on it.
  * 
+ * The home page data (star products, categories and first page of products) comes from the single
+ * precomputed homepage endpoint, which also fills the slice for the products page.
+ * 
  */
 
 const TopPicksProducts = () => {
@@ -21,7 +24,7 @@ const TopPicksProducts = () => {
   const products = starEightProducts || [];
 
   useEffect(() => {
-    dispatch(fetchStarEightProducts());
+    dispatch(fetchHomepage());
   }, [dispatch]);
 
   const top8Products = products.slice(0, 8);
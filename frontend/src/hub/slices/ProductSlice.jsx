@@ -12,6 +12,8 @@ import { ProductsAPI } from '../api/ProductAPI';
  * - fetchProducts: Fetches a list of products with optional filters, sorting, and pagination.
  * - fetchCategories: Retrieves all product categories.
  * - fetchStarEightProducts: Fetches a special selection of star-rated products.
+ * - fetchHomepage: Fetches the star-rated products, the categories and the first page of products in one
+ *   precomputed response, for the home page.
  * 
  * State:
  * - products: Array of product objects.
@@ -55,6 +57,14 @@ export const fetchStarEightProducts = createAsyncThunk(
   }
 );
 
+export const fetchHomepage = createAsyncThunk(
+  'products/fetchHomepage',
+  async () => {
+    const response = await ProductsAPI({ endpoint: 'homepage' });
+    return response.data;
+  }
+);
+
 const initialState = {
   products: [],
   totalCount: 0,
@@ -78,6 +88,12 @@ const productSlice = createSlice({
     .addCase(fetchCategories.fulfilled, (state, action) => {
       state.categories = action.payload;
     })
+    .addCase(fetchHomepage.fulfilled, (state, action) => {
+      state.starEight = action.payload.star_eight;
+      state.categories = action.payload.categories;
+      state.products = action.payload.products.results;
+      state.totalCount = action.payload.products.count;
+    })
   },
 });
 
@@ -23,7 +23,7 @@ const Sidebar = () => {
   const debouncedUpdate = debounce(() => {
     const filters = {
       category: selectedCategory,
-      tags: Array.from(selectedTags),
+      categories: Array.from(selectedTags),
       priceRange,
       ratings: Array.from(selectedRatings),
       search: searchTerm